@@ -0,0 +1,243 @@
+# app/analysis/anomalies.py
+"""
+Поиск аномальных каталогов по всему дереву снимка.
+
+Каждый каталог оценивается по нескольким метрикам: размер, число
+файлов, средний размер файла и рост с прошлого снимка. Метрики
+сравниваются в логарифмической шкале с базой — соседями по родителю,
+а если соседей мало — каталогами той же глубины. База считается
+без самого каталога (leave-one-out), иначе крупный выброс сам
+раздувает разброс своей группы.
+
+Всё считается колонками NumPy через bincount, без сортировок
+по группам и без цикла Python по узлам: суммы групп — по всем узлам,
+оценки — только для достаточно крупных каталогов, пути — только
+для попавших в отчёт.
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from app.analysis.snapshot_diff import match_nodes
+from app.snapshot import Snapshot
+
+# порог оценки (во сколько «разбросов» каталог выше базы)
+DEFAULT_THRESHOLD = 3.5
+
+# меньшие каталоги (и меньший рост) не считаются аномалиями
+DEFAULT_MIN_SIZE = 1 << 20
+
+# с меньшим числом соседей база берётся по глубине, а не по родителю
+DEFAULT_MIN_SIBLINGS = 4
+
+DEFAULT_ANOMALY_LIMIT = 200
+
+# нижняя граница разброса в логарифмической шкале: в группе
+# одинаковых каталогов иначе выбросом был бы любой лишний байт
+_STD_FLOOR = 0.25
+
+METRICS = ("size", "files", "avg_file_size", "growth")
+
+METRIC_TITLES = {
+    "size": "Размер",
+    "files": "Число файлов",
+    "avg_file_size": "Средний размер файла",
+    "growth": "Рост с прошлого сканирования",
+}
+
+
+@dataclass
+class Anomaly:
+    path: Path
+    # какая метрика дала наибольшую оценку (см. METRICS)
+    metric: str
+    score: float
+    # значение метрики: байты, файлы, байты на файл, прирост в байтах
+    value: int
+    # во сколько раз метрика выше базы
+    ratio: float
+    # parent / depth
+    baseline: str
+
+
+@dataclass
+class AnomalyReport:
+    # по убыванию оценки
+    anomalies: list[Anomaly] = field(default_factory=list)
+
+    def by_path(self) -> dict[Path, Anomaly]:
+        return {a.path: a for a in self.anomalies}
+
+
+def _depths(snapshot: Snapshot) -> np.ndarray:
+    """Глубина каждого узла (у корня 0)."""
+    depths = np.zeros(len(snapshot.tree), dtype=np.int64)
+    for level, nodes in enumerate(snapshot.levels()):
+        depths[nodes] = level
+    return depths
+
+
+class _Groups:
+    """
+    Разбиение узлов на группы (по родителю или по глубине) и номера
+    групп оцениваемых узлов.
+    """
+
+    def __init__(self, groups: np.ndarray, nodes: np.ndarray) -> None:
+        self.groups = groups
+        self.count = int(groups.max(initial=0)) + 1
+        self.of_nodes = groups[nodes]
+        # размеры групп по маске valid (маски у метрик часто общие)
+        self._counts: dict[int, np.ndarray] = {}
+
+    def baseline(
+        self,
+        values: np.ndarray,
+        valid: np.ndarray,
+        x: np.ndarray,
+        weight: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Число, среднее и разброс остальных членов группы для каждого
+        оцениваемого узла: сам узел (значение x, вес weight)
+        вычитается из сумм своей группы (leave-one-out).
+        """
+        v = np.where(valid, values, 0.0)
+        groups = self.groups
+        of_nodes = self.of_nodes
+
+        counts = self._counts.get(id(valid))
+        if counts is None:
+            counts = np.bincount(groups[valid], minlength=self.count)[of_nodes]
+            self._counts[id(valid)] = counts
+
+        n = counts - weight
+        s1 = np.bincount(groups, weights=v, minlength=self.count)[of_nodes] - x
+        s2 = np.bincount(groups, weights=v * v, minlength=self.count)[of_nodes] - x * x
+
+        safe = np.maximum(n, 1.0)
+        mean = s1 / safe
+        std = np.sqrt(np.maximum(s2 / safe - mean * mean, 0.0))
+        return n, mean, std
+
+
+def _scores(
+    values: np.ndarray,
+    valid: np.ndarray,
+    nodes: np.ndarray,
+    by_parent: _Groups,
+    by_depth: _Groups,
+    min_siblings: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Оценка узлов nodes, превышение базы (в логарифмах) и тип базы.
+    Суммы групп — по всем узлам, остальное — только по nodes:
+    кандидатов (достаточно крупных каталогов) обычно немного.
+    """
+    weight = valid[nodes]
+    x = np.where(weight, values[nodes], 0.0)
+    weight = weight.astype(np.float64)
+
+    n_parent, mean_parent, std_parent = by_parent.baseline(values, valid, x, weight)
+    use_parent = n_parent >= min_siblings
+
+    # базу по глубине считаем, только если без неё не обойтись
+    if use_parent.all():
+        n, mean, std = n_parent, mean_parent, std_parent
+    else:
+        n_depth, mean_depth, std_depth = by_depth.baseline(values, valid, x, weight)
+        n = np.where(use_parent, n_parent, n_depth)
+        mean = np.where(use_parent, mean_parent, mean_depth)
+        std = np.where(use_parent, std_parent, std_depth)
+
+    excess = values[nodes] - mean
+    scores = excess / np.maximum(std, _STD_FLOOR)
+    scores[(weight == 0) | (n < 1)] = -np.inf
+    return scores, excess, use_parent
+
+
+def detect_anomalies(
+    snapshot: Snapshot,
+    previous: Snapshot | None = None,
+    threshold: float = DEFAULT_THRESHOLD,
+    min_size: int = DEFAULT_MIN_SIZE,
+    min_siblings: int = DEFAULT_MIN_SIBLINGS,
+    limit: int = DEFAULT_ANOMALY_LIMIT,
+) -> AnomalyReport:
+    """
+    Каталоги снимка, аномально большие хотя бы по одной метрике.
+    Рост считается, только если передан previous (прошлый снимок
+    того же корня). Отмечаются только выбросы вверх.
+    """
+    tree = snapshot.tree
+    size = np.frombuffer(tree.size, dtype=np.int64)
+    files = np.frombuffer(tree.files, dtype=np.int64)
+    parent = np.frombuffer(tree.parent, dtype=np.int64)
+
+    not_root = np.ones(len(size), dtype=bool)
+    not_root[0] = False
+    large = not_root & (size >= min_size)
+
+    log_size = np.log1p(size.astype(np.float64))
+    has_files = files > 0
+    average = np.log1p(size / np.maximum(files, 1))
+
+    # (значения, кто входит в базу, кого можно отметить, значение для отчёта)
+    metrics = [
+        (log_size, not_root, large, size),
+        (np.log1p(files.astype(np.float64)), not_root, large, files),
+        (average, not_root & has_files, large & has_files, size // np.maximum(files, 1)),
+    ]
+
+    if previous is not None:
+        old_of_new = match_nodes(previous, snapshot)
+        old_size = np.frombuffer(previous.tree.size, dtype=np.int64)
+
+        matched = not_root & (old_of_new >= 0)
+        before = np.where(matched, old_size[np.maximum(old_of_new, 0)], 0)
+        growth = log_size - np.log1p(before.astype(np.float64))
+        delta = size - before
+        metrics.append((growth, matched, matched & (delta >= min_size), delta))
+
+    # оцениваем только тех, кого вообще можно отметить
+    nodes = np.flatnonzero(np.logical_or.reduce([m[2] for m in metrics]))
+
+    scores = np.full((len(metrics), len(nodes)), -np.inf)
+    excess = np.zeros((len(metrics), len(nodes)))
+    use_parent = np.zeros((len(metrics), len(nodes)), dtype=bool)
+
+    by_parent = _Groups(np.maximum(parent, 0), nodes)
+    by_depth = _Groups(_depths(snapshot), nodes)
+
+    for row, (values, valid, candidates, _) in enumerate(metrics):
+        scores[row], excess[row], use_parent[row] = _scores(
+            values, valid, nodes, by_parent, by_depth, min_siblings
+        )
+        scores[row][~candidates[nodes]] = -np.inf
+
+    best = np.argmax(scores, axis=0) if len(nodes) else np.zeros(0, dtype=np.int64)
+    columns = np.arange(len(nodes))
+    best_score = scores[best, columns]
+
+    flagged = np.flatnonzero(best_score >= threshold)
+    if len(flagged) > limit:
+        flagged = flagged[np.argpartition(-best_score[flagged], limit - 1)[:limit]]
+    flagged = flagged[np.argsort(-best_score[flagged], kind="stable")]
+
+    report = AnomalyReport()
+    for i in flagged.tolist():
+        node = int(nodes[i])
+        row = int(best[i])
+        report.anomalies.append(
+            Anomaly(
+                path=tree.path(node),
+                metric=METRICS[row],
+                score=float(best_score[i]),
+                value=int(metrics[row][3][node]),
+                ratio=float(np.exp(excess[row, i])),
+                baseline="parent" if use_parent[row, i] else "depth",
+            )
+        )
+
+    return report
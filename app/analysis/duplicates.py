@@ -0,0 +1,354 @@
+# app/analysis/duplicates.py
+"""
+Поиск дубликатов файлов по содержимому.
+
+Кандидаты собирает обычный обход (ScanOptions.duplicate_min_size):
+путь, размер, ключ inode и mtime каждого достаточно большого файла.
+Дальше файлы отсеиваются ступенями, и каждая следующая дороже:
+
+1. по размеру — файлы уникального размера дубликатами быть не могут;
+   жёсткие ссылки на один inode тоже не дубликаты (это один файл);
+2. по хешу первого и последнего блока — отсекает почти всё, читая
+   по 128 КБ на файл;
+3. по полному хешу — только для тех, кто совпал на краях.
+
+Хеширование идёт в пуле потоков: чтение и hashlib отпускают GIL.
+Края читаются readinto в буфер потока, файл целиком — через mmap,
+в обоих случаях без копирования в новые bytes. Хеши запоминаются
+в ScanCache по (inode, размер, mtime_ns), так что повторный поиск
+читает только изменившиеся файлы.
+"""
+import hashlib
+import mmap
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable
+
+import numpy as np
+
+from app.core.logger import logger
+from app.utils.inode_set import inode_key
+
+if TYPE_CHECKING:
+    from app.cache import ScanCache
+
+# файлы меньше этого размера не ищем: на мелочи много чтений, а места мало
+DEFAULT_MIN_SIZE = 1 << 20
+
+# сколько байт читается с каждого края файла на второй ступени
+EDGE_BLOCK = 64 * 1024
+
+# порция полного хеширования: между порциями проверяется отмена
+HASH_SLICE = 4 * 1024 * 1024
+
+DEFAULT_HASH_WORKERS = 8
+
+_DIGEST_SIZE = 16
+
+# доля прогресса на хеширование краёв, остальное — полные хеши
+_EDGE_SHARE = 10
+
+_HAS_SEQUENTIAL = hasattr(mmap, "MADV_SEQUENTIAL")
+
+
+@dataclass
+class FileCandidates:
+    """Файлы для поиска дубликатов, собранные при обходе."""
+    min_size: int = DEFAULT_MIN_SIZE
+    # (путь, размер, ключ inode или 0, st_mtime_ns)
+    files: list[tuple[str, int, int, int]] = field(default_factory=list)
+
+    def merge(self, files: Iterable[tuple[str, int, int, int]]) -> None:
+        self.files.extend(files)
+
+
+@dataclass
+class DuplicateGroup:
+    size: int
+    # копии одного содержимого; первая — та, что остаётся
+    # (с самым коротким путём), остальные можно удалить
+    paths: list[Path]
+
+    @property
+    def reclaimable(self) -> int:
+        return self.size * (len(self.paths) - 1)
+
+
+@dataclass
+class DuplicateReport:
+    # корни сканирования, среди файлов которых искали копии
+    roots: list[Path]
+    # по убыванию освобождаемого места
+    groups: list[DuplicateGroup] = field(default_factory=list)
+    # сколько байт прочитано для хешей и сколько файлов взято из кеша
+    hashed_bytes: int = 0
+    cached_files: int = 0
+
+    @property
+    def reclaimable(self) -> int:
+        return sum(group.reclaimable for group in self.groups)
+
+    def reclaimable_by_dir(self) -> dict[Path, int]:
+        """
+        Сколько места освободит удаление лишних копий в каждом каталоге
+        (вместе с подкаталогами), от каталога копии до её корня.
+        """
+        roots = set(self.roots)
+        totals: dict[Path, int] = {}
+        for group in self.groups:
+            for path in group.paths[1:]:
+                for parent in path.parents:
+                    totals[parent] = totals.get(parent, 0) + group.size
+                    if parent in roots:
+                        break
+        return totals
+
+
+class _File:
+    __slots__ = ("path", "size", "inode", "mtime", "partial", "full")
+
+    def __init__(self, path: str, size: int, inode: int, mtime: int) -> None:
+        self.path = path
+        self.size = size
+        self.inode = inode
+        self.mtime = mtime
+        self.partial: bytes | None = None
+        self.full: bytes | None = None
+
+    @property
+    def key(self) -> tuple[int, int, int]:
+        return self.inode, self.size, self.mtime
+
+
+def _by_size(files: list[tuple[str, int, int, int]]) -> list[list[_File]]:
+    """Группы файлов одного размера, в которых хотя бы два разных inode."""
+    if not files:
+        return []
+
+    sizes = np.fromiter((f[1] for f in files), dtype=np.int64, count=len(files))
+    order = np.argsort(sizes, kind="stable")
+    sorted_sizes = sizes[order]
+
+    # границы серий одинаковых размеров, берём серии длиной от двух
+    starts = np.flatnonzero(np.r_[True, sorted_sizes[1:] != sorted_sizes[:-1]])
+    ends = np.r_[starts[1:], len(sorted_sizes)]
+    keep = ends - starts >= 2
+
+    groups = []
+    for start, end in zip(starts[keep].tolist(), ends[keep].tolist()):
+        group = []
+        inodes: set[int] = set()
+
+        for i in order[start:end].tolist():
+            path, size, inode, mtime = files[i]
+            if not inode:
+                # DirEntry в Windows не даёт st_ino — спрашиваем только
+                # у тех, кто прошёл отбор по размеру
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                inode = inode_key(st.st_dev, st.st_ino)
+
+            if inode in inodes:
+                continue
+            inodes.add(inode)
+            group.append(_File(path, size, inode, mtime))
+
+        if len(group) >= 2:
+            groups.append(group)
+
+    return groups
+
+
+def _split(groups: list[list[_File]], attr: str) -> list[list[_File]]:
+    """Делит группы по значению хеша, отбрасывая одиночек и нечитаемые файлы."""
+    result = []
+    for group in groups:
+        by_hash: dict[bytes, list[_File]] = {}
+        for f in group:
+            digest = getattr(f, attr)
+            if digest is not None:
+                by_hash.setdefault(digest, []).append(f)
+        result.extend(same for same in by_hash.values() if len(same) >= 2)
+    return result
+
+
+class _Hasher:
+    """Хеширование файлов в потоках пула, по буферу на поток."""
+
+    def __init__(self, is_cancelled: Callable[[], bool]) -> None:
+        self.is_cancelled = is_cancelled
+        self._local = threading.local()
+
+    def _buffer(self) -> memoryview:
+        view = getattr(self._local, "view", None)
+        if view is None:
+            view = self._local.view = memoryview(bytearray(max(2 * EDGE_BLOCK, HASH_SLICE)))
+        return view
+
+    def _read(self, f, digest, length: int) -> int:
+        """Дочитывает length байт из f в хеш через буфер потока."""
+        view = self._buffer()
+        done = 0
+        while done < length:
+            n = f.readinto(view[: min(len(view), length - done)])
+            if not n:
+                break
+            digest.update(view[:n])
+            done += n
+        return done
+
+    def edges(self, f: _File) -> bytes | None:
+        """
+        Хеш первого и последнего EDGE_BLOCK. Файл не больше двух блоков
+        читается целиком — его хеш краёв и есть полный хеш.
+        """
+        if self.is_cancelled():
+            return None
+
+        digest = hashlib.blake2b(digest_size=_DIGEST_SIZE)
+        try:
+            with open(f.path, "rb", buffering=0) as fh:
+                if f.size <= 2 * EDGE_BLOCK:
+                    done = self._read(fh, digest, f.size)
+                else:
+                    done = self._read(fh, digest, EDGE_BLOCK)
+                    fh.seek(f.size - EDGE_BLOCK)
+                    done += self._read(fh, digest, EDGE_BLOCK)
+                    done += f.size - 2 * EDGE_BLOCK
+        except OSError as e:
+            logger.debug(f"Cannot hash {f.path}: {e}")
+            return None
+
+        # файл изменился после обхода
+        if done != f.size:
+            return None
+        return digest.digest()
+
+    def full(self, f: _File) -> bytes | None:
+        """Хеш всего файла через mmap; если mmap недоступен — readinto."""
+        if self.is_cancelled():
+            return None
+
+        try:
+            with open(f.path, "rb", buffering=0) as fh:
+                try:
+                    mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    # некоторые сетевые ФС не умеют mmap
+                    digest = hashlib.blake2b(digest_size=_DIGEST_SIZE)
+                    done = 0
+                    while done < f.size:
+                        if self.is_cancelled():
+                            return None
+                        step = self._read(fh, digest, min(HASH_SLICE, f.size - done))
+                        if not step:
+                            break
+                        done += step
+                    return digest.digest() if done == f.size else None
+
+                with mapped:
+                    return self._hash_mapped(mapped, f.size)
+        except OSError as e:
+            logger.debug(f"Cannot hash {f.path}: {e}")
+            return None
+
+    def _hash_mapped(self, mapped: mmap.mmap, size: int) -> bytes | None:
+        if len(mapped) != size:
+            return None
+        if _HAS_SEQUENTIAL:
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+
+        digest = hashlib.blake2b(digest_size=_DIGEST_SIZE)
+        view = memoryview(mapped)
+        try:
+            for offset in range(0, size, HASH_SLICE):
+                if self.is_cancelled():
+                    return None
+                digest.update(view[offset : offset + HASH_SLICE])
+        finally:
+            # mmap нельзя закрыть, пока на него есть memoryview
+            view.release()
+        return digest.digest()
+
+
+def find_duplicates(
+    roots: list[Path],
+    candidates: FileCandidates,
+    cache: "ScanCache | None" = None,
+    is_cancelled: Callable[[], bool] = lambda: False,
+    on_progress: Callable[[int], None] | None = None,
+    workers: int = DEFAULT_HASH_WORKERS,
+) -> DuplicateReport:
+    """
+    Группы одинаковых файлов среди кандидатов обхода корней roots
+    (копии ищутся и между корнями, например на разных дисках).
+    cache — хранилище хешей (ScanCache), без него всё хешируется заново.
+    При отмене возвращает то, что успело подтвердиться полным хешем.
+    """
+    report = DuplicateReport(roots=list(roots))
+    groups = _by_size(candidates.files)
+    files = [f for group in groups for f in group]
+    if not files:
+        if on_progress is not None:
+            on_progress(100)
+        return report
+
+    known = cache.get_file_hashes(f.key for f in files) if cache is not None else {}
+    for f in files:
+        hashes = known.get(f.key)
+        if hashes is not None:
+            f.partial, f.full = hashes
+            report.cached_files += 1
+
+    hasher = _Hasher(is_cancelled)
+    fresh: dict[tuple[int, int, int], _File] = {}
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hash") as pool:
+        todo = [f for f in files if f.partial is None]
+        for f, digest in zip(todo, pool.map(hasher.edges, todo)):
+            f.partial = digest
+            if digest is None:
+                continue
+            if f.size <= 2 * EDGE_BLOCK:
+                f.full = digest
+            report.hashed_bytes += min(f.size, 2 * EDGE_BLOCK)
+            fresh[f.key] = f
+
+        if on_progress is not None:
+            on_progress(_EDGE_SHARE)
+
+        groups = _split(groups, "partial")
+        todo = [f for group in groups for f in group if f.full is None]
+        total = sum(f.size for f in todo) or 1
+        done = 0
+
+        for f, digest in zip(todo, pool.map(hasher.full, todo)):
+            f.full = digest
+            if digest is None:
+                continue
+            report.hashed_bytes += f.size
+            fresh[f.key] = f
+
+            done += f.size
+            if on_progress is not None:
+                on_progress(_EDGE_SHARE + (100 - _EDGE_SHARE) * done // total)
+
+    if cache is not None:
+        cache.save_file_hashes(
+            (f.inode, f.size, f.mtime, f.partial, f.full) for f in fresh.values()
+        )
+
+    for group in _split(groups, "full"):
+        paths = sorted((Path(f.path) for f in group), key=lambda p: (len(p.parts), str(p)))
+        report.groups.append(DuplicateGroup(size=group[0].size, paths=paths))
+
+    report.groups.sort(key=lambda g: g.reclaimable, reverse=True)
+
+    if on_progress is not None:
+        on_progress(100)
+    return report
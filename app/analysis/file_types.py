@@ -0,0 +1,240 @@
+# app/analysis/file_types.py
+"""
+Разбивка размера по типам файлов: по расширениям и по категориям
+(видео, архивы, логи, каталоги зависимостей вроде node_modules).
+
+Ключ типа — расширение в нижнем регистре с точкой ("" — без
+расширения). Все файлы внутри каталога зависимостей получают ключ
+"[имя каталога]": в разбивке это одна строка «node_modules», а не
+тысячи .js.
+
+Сканер не обновляет словарь на каждый файл: в горячем цикле он
+копит номер ключа и размер в массивах, а группировка по каталогам
+делается одной операцией NumPy на порцию (group_by_dir).
+"""
+import os
+from array import array
+from typing import Iterable
+
+from app.utils.np import numpy
+
+# (имя, заголовок, расширения)
+CATEGORIES = (
+    ("video", "Видео", ".mp4 .mkv .avi .mov .wmv .webm .m4v .mpg .mpeg .flv .ts .vob"),
+    ("audio", "Аудио", ".mp3 .flac .wav .aac .ogg .m4a .wma .opus .aiff"),
+    ("images", "Изображения", ".jpg .jpeg .png .gif .bmp .tif .tiff .webp .heic .raw .cr2 .nef .arw .psd .svg"),
+    ("archives", "Архивы", ".zip .rar .7z .tar .gz .tgz .bz2 .xz .zst .lz4 .cab .deb .rpm .jar .whl"),
+    ("disk_images", "Образы дисков", ".iso .img .dmg .vhd .vhdx .vmdk .qcow2 .vdi .wim"),
+    ("documents", "Документы", ".pdf .doc .docx .xls .xlsx .ppt .pptx .odt .ods .odp .rtf .txt .md .epub .djvu .csv"),
+    ("logs", "Логи", ".log .out .err .trace .journal"),
+    ("code", "Исходники", ".py .js .ts .jsx .tsx .c .h .cpp .hpp .cs .java .kt .go .rs .rb .php .swift .html .css .json .yaml .yml .toml .xml .sql .sh"),
+    ("binaries", "Программы и библиотеки", ".exe .dll .so .dylib .a .lib .o .obj .pyc .class .bin .msi .apk"),
+    ("databases", "Базы данных", ".db .sqlite .sqlite3 .mdb .accdb .dbf .ldf .mdf .bak"),
+    ("dependencies", "Зависимости и кеши", ""),
+    ("other", "Прочее", ""),
+)
+
+CATEGORY_NAMES = tuple(name for name, _, _ in CATEGORIES)
+CATEGORY_TITLES = {name: title for name, title, _ in CATEGORIES}
+
+_DEPENDENCIES = CATEGORY_NAMES.index("dependencies")
+_OTHER = CATEGORY_NAMES.index("other")
+
+_EXTENSION_CATEGORY = {
+    ext: number
+    for number, (_, _, extensions) in enumerate(CATEGORIES)
+    for ext in extensions.split()
+}
+
+# каталоги, содержимое которых считается одним типом «зависимости»
+DEPENDENCY_DIRS = frozenset(
+    {
+        "node_modules",
+        "bower_components",
+        ".git",
+        ".hg",
+        ".svn",
+        "__pycache__",
+        ".venv",
+        "venv",
+        ".tox",
+        ".mypy_cache",
+        ".pytest_cache",
+        ".gradle",
+        ".m2",
+        ".cargo",
+        ".npm",
+        ".yarn",
+        ".cache",
+    }
+)
+
+# меньше стольких файлов в порции группируем без NumPy: накладные
+# расходы вызовов дороже самой работы (движок asyncio отдаёт порции
+# по одному каталогу)
+_VECTOR_MIN = 512
+
+# разделители в закодированной разбивке: "ключ:байты:файлы/ключ:..."
+# (в расширении не бывает "/", а ":" снимается rsplit-ом справа)
+_ENTRY_SEP = "/"
+_FIELD_SEP = ":"
+
+
+def dependency_key(path: str) -> str | None:
+    """Ключ каталога зависимостей, если path лежит внутри него."""
+    for part in path.split(os.sep):
+        if part in DEPENDENCY_DIRS:
+            return f"[{part}]"
+    return None
+
+
+def category_of(key: str) -> int:
+    """Номер категории для ключа типа."""
+    if key.startswith("["):
+        return _DEPENDENCIES
+    return _EXTENSION_CATEGORY.get(key, _OTHER)
+
+
+class TypeBreakdown:
+    """
+    Байты и число файлов по ключам типа.
+    Счётчики — массивы array, ключи нумеруются при первом появлении.
+    """
+
+    __slots__ = ("keys", "sizes", "counts", "_ids")
+
+    def __init__(self) -> None:
+        self.keys: list[str] = []
+        self.sizes = array("q")
+        self.counts = array("q")
+        self._ids: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: str, size: int, count: int) -> None:
+        number = self._ids.get(key)
+        if number is None:
+            number = self._ids[key] = len(self.keys)
+            self.keys.append(key)
+            self.sizes.append(size)
+            self.counts.append(count)
+        else:
+            self.sizes[number] += size
+            self.counts[number] += count
+
+    def merge(self, other: "TypeBreakdown") -> None:
+        for key, size, count in zip(other.keys, other.sizes, other.counts):
+            self.add(key, size, count)
+
+    def add_encoded(self, text: str) -> None:
+        if not text:
+            return
+        for part in text.split(_ENTRY_SEP):
+            key, size, count = part.rsplit(_FIELD_SEP, 2)
+            self.add(key, int(size), int(count))
+
+    def encode(self) -> str:
+        return _ENTRY_SEP.join(
+            f"{key}{_FIELD_SEP}{size}{_FIELD_SEP}{count}"
+            for key, size, count in zip(self.keys, self.sizes, self.counts)
+        )
+
+    @classmethod
+    def decode(cls, text: str) -> "TypeBreakdown":
+        breakdown = cls()
+        breakdown.add_encoded(text)
+        return breakdown
+
+    def by_category(self) -> list[tuple[str, int, int]]:
+        """(категория, байты, файлы) по убыванию байтов, без пустых."""
+        if not self.keys:
+            return []
+
+        np = numpy()
+
+        numbers = np.fromiter(map(category_of, self.keys), dtype=np.int64, count=len(self.keys))
+        sizes = np.zeros(len(CATEGORIES), dtype=np.int64)
+        counts = np.zeros(len(CATEGORIES), dtype=np.int64)
+        np.add.at(sizes, numbers, np.frombuffer(self.sizes, dtype=np.int64))
+        np.add.at(counts, numbers, np.frombuffer(self.counts, dtype=np.int64))
+
+        order = np.argsort(-sizes, kind="stable")
+        return [
+            (CATEGORY_NAMES[i], int(sizes[i]), int(counts[i]))
+            for i in order.tolist()
+            if counts[i]
+        ]
+
+    def top_keys(self, limit: int) -> list[tuple[str, int, int]]:
+        """limit крупнейших ключей: (ключ, байты, файлы)."""
+        np = numpy()
+
+        sizes = np.frombuffer(self.sizes, dtype=np.int64)
+        order = np.argsort(-sizes, kind="stable")[:limit]
+        return [(self.keys[i], int(self.sizes[i]), int(self.counts[i])) for i in order.tolist()]
+
+
+def group_by_dir(
+    keys: list[str],
+    numbers: array,
+    sizes: array,
+    bounds: list[int],
+) -> tuple[list[str], TypeBreakdown]:
+    """
+    Группирует файлы порции по (каталог, ключ).
+
+    keys — ключи типа по номеру, numbers и sizes — номер ключа и размер
+    каждого файла, bounds[i] — конец файлов i-го каталога в numbers.
+    Возвращает закодированную разбивку каждого каталога и итог порции.
+    """
+    total = TypeBreakdown()
+    count = len(numbers)
+    if not count:
+        return [""] * len(bounds), total
+
+    if count < _VECTOR_MIN:
+        per_dir = []
+        start = 0
+        for end in bounds:
+            own = TypeBreakdown()
+            for i in range(start, end):
+                own.add(keys[numbers[i]], sizes[i], 1)
+            per_dir.append(own.encode())
+            total.merge(own)
+            start = end
+        return per_dir, total
+
+    np = numpy()
+
+    dirs = np.repeat(
+        np.arange(len(bounds), dtype=np.int64),
+        np.diff(np.asarray([0] + bounds, dtype=np.int64)),
+    )
+    combined = dirs * len(keys) + np.frombuffer(numbers, dtype=np.int64)
+
+    order = np.argsort(combined, kind="stable")
+    combined = combined[order]
+    starts = np.flatnonzero(np.r_[True, combined[1:] != combined[:-1]])
+
+    group_sizes = np.add.reduceat(np.frombuffer(sizes, dtype=np.int64)[order], starts)
+    group_counts = np.diff(np.r_[starts, count])
+    group_keys = combined[starts]
+
+    parts: list[list[str]] = [[] for _ in bounds]
+    for code, size, files in zip(group_keys.tolist(), group_sizes.tolist(), group_counts.tolist()):
+        d, number = divmod(code, len(keys))
+        key = keys[number]
+        parts[d].append(f"{key}{_FIELD_SEP}{size}{_FIELD_SEP}{files}")
+        total.add(key, size, files)
+
+    return [_ENTRY_SEP.join(p) for p in parts], total
+
+
+def merge_breakdowns(items: Iterable[TypeBreakdown | None]) -> TypeBreakdown:
+    """Общая разбивка нескольких папок."""
+    total = TypeBreakdown()
+    for item in items:
+        if item is not None:
+            total.merge(item)
+    return total
@@ -0,0 +1,287 @@
+# app/analysis/snapshot_diff.py
+"""
+Сравнение двух снимков сканирования: что выросло, что уменьшилось,
+какие каталоги появились и исчезли.
+
+Каталоги сопоставляются по хешу относительного пути. Хеши считаются
+векторно (NumPy) прямо по таблице строк снимка и по уровням дерева,
+поэтому на снимках в миллионы узлов нет цикла Python по узлам —
+в Python строятся только пути попавших в отчёт каталогов.
+
+Папки, записанные в снимок без дерева (Snapshot.opaque), сравниваются
+только итогами: их подкаталоги с другой стороны не считаются ни
+новыми, ни удалёнными.
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from app.snapshot import Snapshot
+
+# сколько строк каждой категории попадает в отчёт по умолчанию
+DEFAULT_DIFF_TOP = 50
+
+# match_nodes: пары нет
+UNMATCHED = -1
+# match_nodes: узел внутри папки, у которой в старом снимке нет дерева
+OPAQUE = -2
+
+# имена хешируются порциями, чтобы не держать в памяти uint64
+# на каждый байт всей таблицы строк
+_NAME_CHUNK = 1 << 18
+
+# сколько снимков держать в кеше хешей путей (по 16 байт на узел)
+_HASH_CACHE_SIZE = 2
+_hash_cache: dict[tuple[Path, float], tuple[np.ndarray, np.ndarray]] = {}
+
+_PRIME = np.uint64(0x100000001B3)
+_PRIME_INV = np.uint64(pow(0x100000001B3, -1, 1 << 64))
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_SHIFT = np.uint64(31)
+
+
+@dataclass
+class DiffEntry:
+    path: Path
+    # grown / shrunk / added / removed
+    status: str
+    old_size: int
+    new_size: int
+    old_files: int
+    new_files: int
+    # прирост в байтах в час (0, если время снимков совпадает)
+    rate: float = 0.0
+
+    @property
+    def delta(self) -> int:
+        return self.new_size - self.old_size
+
+
+def scan_kind(full: bool) -> str:
+    return "full" if full else "incremental"
+
+
+@dataclass
+class SnapshotDiff:
+    old_created: float
+    new_created: float
+    # изменение размера корня целиком
+    total_delta: int
+    # снимки полных обходов; в инкрементальном рост файлов внутри
+    # неизменённых каталогов не учтён, и «не выросло» значит «не перечитано»
+    old_full: bool = False
+    new_full: bool = False
+    grown: list[DiffEntry] = field(default_factory=list)
+    shrunk: list[DiffEntry] = field(default_factory=list)
+    added: list[DiffEntry] = field(default_factory=list)
+    removed: list[DiffEntry] = field(default_factory=list)
+
+    def entries(self) -> list[DiffEntry]:
+        return self.grown + self.shrunk + self.added + self.removed
+
+
+def _name_hashes(snapshot: Snapshot) -> np.ndarray:
+    """
+    Полиномиальный хеш каждого имени по модулю 2⁶⁴.
+    Сумма b[i]·P^i по сегменту делится на P^start — это умножение
+    на обратный элемент (P нечётно), так что хватает одного reduceat.
+    """
+    offsets = np.frombuffer(snapshot.name_offsets, dtype=np.int64)
+    blob = np.frombuffer(snapshot.name_bytes, dtype=np.uint8)
+    count = len(offsets) - 1
+    hashes = np.zeros(count, dtype=np.uint64)
+
+    bounds = list(range(0, count, _NAME_CHUNK)) + [count]
+    size = int(np.diff(offsets[bounds]).max(initial=0)) + 1
+
+    # степени P и P⁻¹ общие для всех порций
+    powers = np.ones(size, dtype=np.uint64)
+    np.cumprod(np.full(size - 1, _PRIME, dtype=np.uint64), out=powers[1:])
+    inverse = np.ones(size, dtype=np.uint64)
+    np.cumprod(np.full(size - 1, _PRIME_INV, dtype=np.uint64), out=inverse[1:])
+
+    for first, last in zip(bounds, bounds[1:]):
+        base = offsets[first]
+        starts = offsets[first:last] - base
+        lengths = offsets[first + 1 : last + 1] - offsets[first:last]
+        data = blob[base : offsets[last]].astype(np.uint64)
+
+        # лишний ноль в конце: reduceat не принимает индекс len(data)
+        weighted = np.append(data * powers[: len(data)], np.uint64(0))
+        sums = np.add.reduceat(weighted, starts)
+        sums[lengths == 0] = 0
+
+        hashes[first:last] = sums * inverse[starts] + lengths.astype(np.uint64) * _MIX
+
+    return hashes
+
+
+def _path_hashes(snapshot: Snapshot) -> np.ndarray:
+    """
+    Хеш относительного пути каждого узла (у корня — 0), по уровням
+    дерева: весь уровень обрабатывается одной операцией.
+    """
+    parent = np.frombuffer(snapshot.tree.parent, dtype=np.int64)
+    names = _name_hashes(snapshot)
+    hashes = np.zeros(len(names), dtype=np.uint64)
+
+    for level in snapshot.levels()[1:]:
+        mixed = hashes[parent[level]] * _MIX + names[level]
+        hashes[level] = mixed ^ (mixed >> _SHIFT)
+
+    return hashes
+
+
+def _sorted_hashes(snapshot: Snapshot) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Отсортированные хеши путей и номера их узлов.
+    Последние снимки запоминаются: при сравнении очередной пары
+    старый снимок обычно был новым в прошлый раз.
+    """
+    key = (snapshot.path, snapshot.created)
+    cached = _hash_cache.get(key)
+    if cached is not None:
+        return cached
+
+    hashes = _path_hashes(snapshot)
+    order = np.argsort(hashes)
+    cached = hashes[order], order
+
+    _hash_cache[key] = cached
+    while len(_hash_cache) > _HASH_CACHE_SIZE:
+        del _hash_cache[next(iter(_hash_cache))]
+    return cached
+
+
+def opaque_mask(snapshot: Snapshot) -> np.ndarray:
+    """Узлы снимка, записанные без поддерева."""
+    mask = np.zeros(len(snapshot.tree), dtype=bool)
+    mask[np.asarray(snapshot.opaque, dtype=np.int64)] = True
+    return mask
+
+
+def match_nodes(old: Snapshot, new: Snapshot) -> np.ndarray:
+    """
+    Для каждого узла new — узел old с тем же относительным путём,
+    UNMATCHED, если такого нет, или OPAQUE, если узел лежит внутри
+    папки, записанной в old без дерева: есть ли он там, неизвестно.
+    """
+    old_sorted, old_order = _sorted_hashes(old)
+    new_sorted, new_order = _sorted_hashes(new)
+
+    # ищем уже отсортированные ключи: бинарный поиск идёт
+    # по памяти почти последовательно
+    pos = np.minimum(np.searchsorted(old_sorted, new_sorted), len(old_sorted) - 1)
+    old_of_new = np.empty(len(new_order), dtype=np.int64)
+    old_of_new[new_order] = np.where(old_sorted[pos] == new_sorted, old_order[pos], UNMATCHED)
+
+    if len(old.opaque):
+        old_opaque = opaque_mask(old)
+        parent = np.frombuffer(new.tree.parent, dtype=np.int64)
+        # сверху вниз по уровням: под непрозрачным узлом или под
+        # уже помеченным всё содержимое тоже непрозрачно
+        for level in new.levels()[1:]:
+            above = old_of_new[parent[level]]
+            hidden = (above == OPAQUE) | ((above >= 0) & old_opaque[np.maximum(above, 0)])
+            old_of_new[level[hidden]] = OPAQUE
+
+    return old_of_new
+
+
+def _top(order_by: np.ndarray, limit: int) -> np.ndarray:
+    """Индексы limit наибольших значений по убыванию."""
+    if limit <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if len(order_by) > limit:
+        part = np.argpartition(-order_by, limit - 1)[:limit]
+    else:
+        part = np.arange(len(order_by))
+    return part[np.argsort(-order_by[part], kind="stable")]
+
+
+def diff_snapshots(
+    old: Snapshot,
+    new: Snapshot,
+    top: int = DEFAULT_DIFF_TOP,
+) -> SnapshotDiff:
+    """
+    Сравнивает два снимка одного корня.
+
+    grown / shrunk — каталоги, есть в обоих снимках, по убыванию
+    абсолютного изменения (итоги поддерева, так что в список попадают
+    и предки выросшего каталога).
+    added / removed — только верхние из новых или исчезнувших
+    каталогов (их родитель есть в обоих снимках), по размеру.
+    Подкаталоги папок, записанных в одном из снимков без дерева,
+    в added / removed не попадают.
+    """
+    old_tree = old.tree
+    new_tree = new.tree
+
+    old_size = np.frombuffer(old_tree.size, dtype=np.int64)
+    new_size = np.frombuffer(new_tree.size, dtype=np.int64)
+    old_parent = np.frombuffer(old_tree.parent, dtype=np.int64)
+    new_parent = np.frombuffer(new_tree.parent, dtype=np.int64)
+
+    old_of_new = match_nodes(old, new)
+
+    matched_old = np.zeros(len(old_size), dtype=bool)
+    matched_old[old_of_new[old_of_new >= 0]] = True
+
+    # узлы old, чья пара в new записана без дерева: их подкаталоги
+    # в new не видны, а не удалены
+    hidden_old = np.zeros(len(old_size), dtype=bool)
+    new_opaque = np.flatnonzero(opaque_mask(new))
+    hidden_old[old_of_new[new_opaque[old_of_new[new_opaque] >= 0]]] = True
+
+    hours = (new.created - old.created) / 3600
+
+    def entry(status: str, old_node: int, new_node: int) -> DiffEntry:
+        path = new_tree.path(new_node) if new_node >= 0 else old_tree.path(old_node)
+        result = DiffEntry(
+            path=path,
+            status=status,
+            old_size=old_tree.size[old_node] if old_node >= 0 else 0,
+            new_size=new_tree.size[new_node] if new_node >= 0 else 0,
+            old_files=old_tree.files[old_node] if old_node >= 0 else 0,
+            new_files=new_tree.files[new_node] if new_node >= 0 else 0,
+        )
+        if hours > 0:
+            result.rate = result.delta / hours
+        return result
+
+    diff = SnapshotDiff(
+        old_created=old.created,
+        new_created=new.created,
+        total_delta=int(new_size[0] - old_size[0]),
+        old_full=old.full,
+        new_full=new.full,
+    )
+
+    # корень не сравниваем: его изменение — total_delta
+    both = np.flatnonzero(old_of_new >= 0)
+    both = both[both > 0]
+    delta = new_size[both] - old_size[old_of_new[both]]
+
+    grown = both[delta > 0]
+    for i in _top(delta[delta > 0], top):
+        node = int(grown[i])
+        diff.grown.append(entry("grown", int(old_of_new[node]), node))
+
+    shrunk = both[delta < 0]
+    for i in _top(-delta[delta < 0], top):
+        node = int(shrunk[i])
+        diff.shrunk.append(entry("shrunk", int(old_of_new[node]), node))
+
+    added = np.flatnonzero(old_of_new == UNMATCHED)
+    added = added[old_of_new[new_parent[added]] >= 0]
+    for i in _top(new_size[added], top):
+        diff.added.append(entry("added", -1, int(added[i])))
+
+    removed = np.flatnonzero(~matched_old)
+    removed = removed[matched_old[old_parent[removed]] & ~hidden_old[old_parent[removed]]]
+    for i in _top(old_size[removed], top):
+        diff.removed.append(entry("removed", int(removed[i]), -1))
+
+    return diff
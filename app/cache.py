@@ -1,23 +1,71 @@
+import os
 import sqlite3
+import threading
 import time
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator
 
+from app.analysis.file_types import TypeBreakdown
 from app.core.logger import logger
-from app.models import ScanResult
+from app.core.metrics import ScanMetrics
+from app.models import PENDING_MTIME, DirIndex, DirIndexEntry, ScanResult
+from app.tree import DirRecord
 
 
 # версия логики сканирования
-CACHE_VERSION = 1
+# 2 — учёт жёстких ссылок один раз, allocated_bytes, без пересечения ФС
+# 3 — разбивка по типам файлов
+CACHE_VERSION = 4
+
+DEFAULT_CACHE_PATH = Path.cwd() / ".folder_size_cache.sqlite"
 
 # логический TTL кеша (например, 7 дней)
 MAX_CACHE_AGE = 7 * 24 * 60 * 60
 
+# путей в одном запросе IN (...): старые сборки SQLite ограничивают
+# число параметров 999
+LOOKUP_CHUNK = 900
+
+# если свободных страниц больше этой доли, обслуживание делает VACUUM
+VACUUM_FREE_RATIO = 0.25
+
+_PRAGMAS = (
+    # читатели не блокируют писателя, коммит без fsync журнала на каждую запись
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+def _int64(value: int) -> int:
+    """Беззнаковый 64-битный ключ (inode_key) как знаковый INTEGER SQLite."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
 
 class ScanCache:
+    """
+    Кеш итогов и индекс каталогов в SQLite.
+
+    Рассчитан на одно долгоживущее соединение на процесс: окно создаёт
+    кеш один раз и отдаёт его всем сканированиям. Вызовы из разных
+    потоков сериализуются блокировкой.
+    """
+
     def __init__(self, db_path: Path) -> None:
-        self._conn = sqlite3.connect(db_path)
-        self._conn.row_factory = sqlite3.Row
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = _connect(db_path)
         self._init_schema()
 
     def _init_schema(self) -> None:
@@ -34,38 +82,132 @@ class ScanCache:
                 )
                 """
             )
+            # индекс каталогов для инкрементального пересканирования:
+            # собственные итоги каждого каталога и его mtime
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dir_index (
+                    path TEXT PRIMARY KEY,
+                    root TEXT NOT NULL,
+                    parent TEXT,
+                    mtime REAL NOT NULL,
+                    own_bytes INTEGER NOT NULL,
+                    own_files INTEGER NOT NULL,
+                    own_errors INTEGER NOT NULL,
+                    version INTEGER NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS dir_index_root ON dir_index (root)"
+            )
+            # крупнейшие файлы корня сканирования: инкрементальный обход
+            # не читает неизменившиеся каталоги и сам их не увидит
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS top_files (
+                    root TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    version INTEGER NOT NULL,
+                    PRIMARY KEY (root, path)
+                )
+                """
+            )
+            # хеши содержимого файлов для поиска дубликатов: запись
+            # действительна, пока у inode прежние размер и mtime
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS file_hashes (
+                    inode INTEGER NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    partial BLOB,
+                    full BLOB,
+                    hashed_at REAL NOT NULL,
+                    PRIMARY KEY (inode, size_bytes, mtime_ns)
+                ) WITHOUT ROWID
+                """
+            )
+            # папки верхнего уровня с контрольной точкой прерванного обхода:
+            # их строки dir_index живут без записи в scan_cache
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS scan_checkpoints (
+                    root TEXT PRIMARY KEY,
+                    saved_at REAL NOT NULL,
+                    version INTEGER NOT NULL
+                )
+                """
+            )
+            # для чистки устаревших записей
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS scan_cache_expiry ON scan_cache (version, scan_time)"
+            )
+
+            # колонки, появившиеся после первой версии схемы
+            self._add_column("scan_cache", "allocated_bytes", "INTEGER NOT NULL DEFAULT 0")
+            self._add_column("dir_index", "own_alloc", "INTEGER NOT NULL DEFAULT 0")
+            self._add_column("scan_cache", "types", "TEXT NOT NULL DEFAULT ''")
+            self._add_column("dir_index", "own_types", "TEXT NOT NULL DEFAULT ''")
+            # отпечаток правил исключения (ScanRules.key): итоги
+            # с другими правилами — промах кеша
+            self._add_column("scan_cache", "rules", "TEXT NOT NULL DEFAULT ''")
+            self._add_column("dir_index", "rules", "TEXT NOT NULL DEFAULT ''")
+            self._add_column("top_files", "rules", "TEXT NOT NULL DEFAULT ''")
+
+    def _add_column(self, table: str, column: str, declaration: str) -> None:
+        columns = {
+            row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")
+        }
+        if column not in columns:
+            self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
 
     # ------------------------------------------------------------------
     # ЧТЕНИЕ КЕША
     # ------------------------------------------------------------------
 
-    def get_many(self, paths: Iterable[Path]) -> dict[Path, ScanResult]:
+    def get_many(
+        self,
+        paths: Iterable[Path],
+        metrics: ScanMetrics | None = None,
+        rules: str = "",
+    ) -> dict[Path, ScanResult]:
         """
         Возвращает только валидные кешированные результаты.
         Невалидные автоматически игнорируются.
+
+        rules — отпечаток правил исключения (ScanRules.key), с которыми
+        идёт сканирование; записи с другими правилами не подходят.
+
+        metrics — если передан, в него пишутся попадания, промахи
+        и отброшенные (устаревшие) записи.
         """
-        
-        logger.debug(f"Cache lookup for {len(paths)} paths")
-        
         now = time.time()
         paths = list(paths)
+        logger.debug(f"Cache lookup for {len(paths)} paths")
         if not paths:
             return {}
 
-        placeholders = ",".join("?" for _ in paths)
-        
+        rows = []
         try:
-            
-        
-            rows = self._conn.execute(
-                f"""
-                SELECT path, size_bytes, file_count, error_count, scan_time
-                FROM scan_cache
-                WHERE path IN ({placeholders})
-                AND version = ?
-                """,
-                [str(p) for p in paths] + [CACHE_VERSION],
-            ).fetchall()
+            with self._lock:
+                for start in range(0, len(paths), LOOKUP_CHUNK):
+                    chunk = paths[start : start + LOOKUP_CHUNK]
+                    placeholders = ",".join("?" for _ in chunk)
+                    rows.extend(
+                        self._conn.execute(
+                            f"""
+                            SELECT path, size_bytes, allocated_bytes, file_count,
+                                   error_count, scan_time, types
+                            FROM scan_cache
+                            WHERE path IN ({placeholders})
+                            AND version = ?
+                            AND rules = ?
+                            """,
+                            [str(p) for p in chunk] + [CACHE_VERSION, rules],
+                        )
+                    )
         except sqlite3.DatabaseError as de:
             logger.error(f"SQLite error during cache read: {de}")
             return {}
@@ -96,39 +238,132 @@ class ScanCache:
                 size_bytes=row["size_bytes"],
                 file_count=row["file_count"],
                 error_count=row["error_count"],
+                allocated_bytes=row["allocated_bytes"],
+                types=TypeBreakdown.decode(row["types"]),
             )
 
+        if metrics is not None:
+            metrics.cache_hits += len(valid)
+            metrics.cache_misses += len(paths) - len(rows)
+            metrics.cache_invalidations += len(rows) - len(valid)
+
         return valid
 
+    def get_estimates(self, paths: Iterable[Path], rules: str = "") -> dict[Path, ScanResult]:
+        """
+        Последние известные итоги папок без проверки актуальности —
+        оценки для первого экрана ленивого сканирования (без stat).
+        """
+        paths = list(paths)
+        estimates: dict[Path, ScanResult] = {}
+
+        try:
+            with self._lock:
+                for start in range(0, len(paths), LOOKUP_CHUNK):
+                    chunk = paths[start : start + LOOKUP_CHUNK]
+                    placeholders = ",".join("?" for _ in chunk)
+                    rows = self._conn.execute(
+                        f"""
+                        SELECT path, size_bytes, allocated_bytes, file_count, error_count
+                        FROM scan_cache
+                        WHERE path IN ({placeholders})
+                        AND rules = ?
+                        """,
+                        [str(p) for p in chunk] + [rules],
+                    ).fetchall()
+
+                    for row in rows:
+                        path = Path(row["path"])
+                        estimates[path] = ScanResult(
+                            path=path,
+                            size_bytes=row["size_bytes"],
+                            file_count=row["file_count"],
+                            error_count=row["error_count"],
+                            allocated_bytes=row["allocated_bytes"],
+                        )
+        except sqlite3.DatabaseError as de:
+            logger.error(f"SQLite error during estimate read: {de}")
+
+        return estimates
+
+    def get_children(self, root: Path, rules: str = "") -> tuple[list[ScanResult], float]:
+        """
+        Последние сохранённые итоги папок верхнего уровня root — без
+        листинга корня и без stat: первый кадр окна, а актуальность
+        проверит сканирование. Второе значение — время самой свежей
+        записи (0.0, если записей нет).
+        """
+        # все пути внутри root — диапазон по первичному ключу
+        prefix = os.path.join(str(root), "")
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    """
+                    SELECT path, size_bytes, allocated_bytes, file_count,
+                           error_count, scan_time, types
+                    FROM scan_cache
+                    WHERE path >= ? AND path < ?
+                    AND version = ?
+                    AND rules = ?
+                    """,
+                    (prefix, upper, CACHE_VERSION, rules),
+                ).fetchall()
+        except sqlite3.DatabaseError as de:
+            logger.error(f"SQLite error during cache read: {de}")
+            return [], 0.0
+
+        results = []
+        newest = 0.0
+        for row in rows:
+            path = Path(row["path"])
+            # вложенные корни прошлых сканирований не нужны
+            if path.parent != root:
+                continue
+
+            newest = max(newest, row["scan_time"])
+            results.append(
+                ScanResult(
+                    path=path,
+                    size_bytes=row["size_bytes"],
+                    file_count=row["file_count"],
+                    error_count=row["error_count"],
+                    allocated_bytes=row["allocated_bytes"],
+                    types=TypeBreakdown.decode(row["types"]),
+                )
+            )
+
+        return results, newest
+
     # ------------------------------------------------------------------
     # ЗАПИСЬ КЕША (BULK)
     # ------------------------------------------------------------------
 
-    def save_many(self, results: Iterable[ScanResult]) -> None:
+    def save_many(self, results: Iterable[ScanResult], rules: str = "") -> None:
         """
         Bulk-сохранение результатов сканирования в одной транзакции.
+        rules — отпечаток правил исключения, с которыми они получены.
         """
         now = time.time()
         
         logger.debug("Saving scan results to cache")
 
+        # папки только что прочитаны сканером, повторный stat не нужен:
+        # исчезнувшую папку отсеет проверка mtime при чтении
         rows = []
         for r in results:
-            # если папка исчезла или нет доступа — не кешируем
-            try:
-                r.path.stat()
-            except OSError as oe:
-                logger.warning(f"Cache save skipped (stat failed): {r.path} ({oe})")
-                continue
-
             rows.append(
                 (
                     str(r.path),
                     r.size_bytes,
+                    r.allocated_bytes,
                     r.file_count,
                     r.error_count,
                     now,
                     CACHE_VERSION,
+                    r.types.encode() if r.types is not None else "",
+                    rules,
                 )
             )
 
@@ -138,23 +373,482 @@ class ScanCache:
         try:
             
 
-            with self._conn:
+            with self._lock, self._conn:
                 self._conn.executemany(
                     """
                     INSERT OR REPLACE INTO scan_cache
-                    (path, size_bytes, file_count, error_count, scan_time, version)
-                    VALUES (?, ?, ?, ?, ?, ?)
+                    (path, size_bytes, allocated_bytes, file_count, error_count,
+                     scan_time, version, types, rules)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                     """,
                     rows,
                 )
         except sqlite3.DatabaseError as de:
             logger.error(f"SQLite error during cache write: {de}")
 
+    # ------------------------------------------------------------------
+    # ИНДЕКС КАТАЛОГОВ
+    # ------------------------------------------------------------------
+
+    def get_dir_index(self, roots: Iterable[Path], rules: str = "") -> DirIndex:
+        """
+        Загружает индекс каталогов для указанных папок верхнего уровня,
+        построенный с правилами исключения rules.
+        Списки подкаталогов восстанавливаются по колонке parent.
+        """
+        index: DirIndex = {}
+
+        try:
+            with self._lock:
+                rows = self._dir_index_rows(roots, rules)
+        except sqlite3.DatabaseError as de:
+            logger.error(f"SQLite error during dir index read: {de}")
+            return {}
+
+        for root_rows in rows:
+            parents: list[tuple[str, str]] = []
+
+            for row in root_rows:
+                index[row["path"]] = DirIndexEntry(
+                    mtime=row["mtime"],
+                    size_bytes=row["own_bytes"],
+                    allocated_bytes=row["own_alloc"],
+                    file_count=row["own_files"],
+                    error_count=row["own_errors"],
+                    types=row["own_types"],
+                )
+                if row["parent"] is not None:
+                    parents.append((row["path"], row["parent"]))
+
+            for path, parent in parents:
+                entry = index.get(parent)
+                if entry is not None:
+                    entry.children.append(path)
+
+        logger.debug(f"Dir index loaded: {len(index)} directories")
+        return index
+
+    def _dir_index_rows(self, roots: Iterable[Path], rules: str) -> list[list[sqlite3.Row]]:
+        return [
+            self._conn.execute(
+                """
+                SELECT path, parent, mtime, own_bytes, own_alloc, own_files, own_errors,
+                       own_types
+                FROM dir_index
+                WHERE root = ?
+                AND version = ?
+                AND rules = ?
+                """,
+                (str(root), CACHE_VERSION, rules),
+            ).fetchall()
+            for root in roots
+        ]
+
+    def save_dir_index(
+        self,
+        results: Iterable[ScanResult],
+        previous: DirIndex,
+        rules: str = "",
+    ) -> None:
+        """
+        Обновляет индекс каталогов по деревьям свежих результатов.
+        Пишутся только изменившиеся каталоги, исчезнувшие удаляются.
+        Записи тех же папок с другими правилами исключения удаляются
+        целиком: их списки подкаталогов с новыми не согласованы.
+        Контрольные точки этих папок больше не нужны и снимаются.
+        """
+        trees = [(str(r.path), r.tree) for r in results if r.tree is not None]
+        roots = {root for root, _ in trees}
+        if not roots:
+            return
+
+        # пути старого индекса, которые есть и в новом дереве (у первого
+        # сканирования множество пустое: на широких деревьях полного
+        # списка путей в памяти не держим)
+        seen: set[str] = set()
+        changed = 0
+
+        def upserts() -> Iterator[tuple]:
+            # строки идут в executemany по одной, без списка на всё дерево
+            nonlocal changed
+
+            for root, tree in trees:
+                for path, size, alloc, files, errors, mtime, types in tree.records():
+                    old = previous.get(path)
+                    if old is not None:
+                        seen.add(path)
+                        # записи с PENDING_MTIME удаляются ниже целиком
+                        # и пишутся заново, даже если не изменились
+                        if (
+                            old.mtime == mtime != PENDING_MTIME
+                            and old.size_bytes == size
+                            and old.allocated_bytes == alloc
+                            and old.file_count == files
+                            and old.error_count == errors
+                            and old.types == types
+                        ):
+                            continue
+
+                    changed += 1
+                    parent = os.path.dirname(path) if path != root else None
+                    yield (
+                        path,
+                        root,
+                        parent,
+                        mtime,
+                        size,
+                        alloc,
+                        files,
+                        errors,
+                        types,
+                        CACHE_VERSION,
+                        rules,
+                    )
+
+        def deletes() -> list[tuple[str]]:
+            # удаляем только исчезнувшие каталоги пересканированных папок:
+            # записи папок, до которых не дошло (отмена), не трогаем.
+            # Старое поддерево обходим по спискам детей индекса — сохранение
+            # идёт пачками, и полный проход по previous на каждую был бы
+            # квадратичным. Вызывается после записи upserts: seen к этому
+            # моменту заполнен, а удаляемые пути среди записанных не бывают
+            found = []
+            stack = list(roots)
+            while stack:
+                path = stack.pop()
+                entry = previous.get(path)
+                if entry is None:
+                    continue
+
+                if path not in seen:
+                    found.append((path,))
+                stack.extend(entry.children)
+            return found
+
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "DELETE FROM dir_index WHERE root = ? AND (rules != ? OR mtime = ?)",
+                    [(root, rules, PENDING_MTIME) for root in roots],
+                )
+                self._conn.executemany(
+                    "DELETE FROM scan_checkpoints WHERE root = ?",
+                    [(root,) for root in roots],
+                )
+                self._conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO dir_index
+                    (path, root, parent, mtime, own_bytes, own_alloc, own_files,
+                     own_errors, own_types, version, rules)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    upserts(),
+                )
+                removed = deletes()
+                self._conn.executemany(
+                    "DELETE FROM dir_index WHERE path = ?",
+                    removed,
+                )
+
+            logger.debug(f"Dir index update: {changed} changed, {len(removed)} removed")
+        except sqlite3.DatabaseError as de:
+            logger.error(f"SQLite error during dir index write: {de}")
+
+    def save_checkpoint(
+        self,
+        root: Path,
+        records: Iterable[DirRecord],
+        pending: Iterable[str],
+        previous: DirIndex,
+        rules: str = "",
+    ) -> None:
+        """
+        Контрольная точка прерванного (или ещё идущего) обхода папки root:
+        собственные итоги прочитанных с прошлой точки каталогов и
+        каталоги, до которых обход не дошёл. Вторые пишутся с mtime
+        PENDING_MTIME — в индексе они есть (и видны в списках детей),
+        но всегда перечитываются. Следующее инкрементальное сканирование
+        поэтому продолжит обход с места остановки.
+
+        У перечитанных каталогов старые записи детей удаляются: дети,
+        которые есть на диске, придут в этой или следующих точках
+        (или уже лежат в pending), а исчезнувшие иначе остались бы
+        в списках детей.
+        """
+        root_text = str(root)
+        upserts = []
+        stale: set[str] = set()
+        recorded: set[str] = set()
+
+        for path, size, alloc, files, errors, mtime, types in records:
+            recorded.add(path)
+            old = previous.get(path)
+            if (
+                old is not None
+                and old.mtime == mtime
+                and old.size_bytes == size
+                and old.allocated_bytes == alloc
+                and old.file_count == files
+                and old.error_count == errors
+                and old.types == types
+            ):
+                continue
+
+            if old is not None and old.mtime != mtime:
+                stale.update(old.children)
+
+            parent = os.path.dirname(path) if path != root_text else None
+            upserts.append(
+                (path, root_text, parent, mtime, size, alloc, files, errors, types, CACHE_VERSION, rules)
+            )
+
+        for path in pending:
+            parent = os.path.dirname(path) if path != root_text else None
+            old = previous.get(path)
+            if old is not None and old.mtime != PENDING_MTIME:
+                # запись прошлого сканирования остаётся: по ней каталог
+                # проверяется так же, как при обычном инкрементальном обходе
+                upserts.append(
+                    (
+                        path,
+                        root_text,
+                        parent,
+                        old.mtime,
+                        old.size_bytes,
+                        old.allocated_bytes,
+                        old.file_count,
+                        old.error_count,
+                        old.types,
+                        CACHE_VERSION,
+                        rules,
+                    )
+                )
+            else:
+                upserts.append(
+                    (path, root_text, parent, PENDING_MTIME, 0, 0, 0, 0, "", CACHE_VERSION, rules)
+                )
+
+        # неизменившиеся дети, прочитанные в эту же точку, не переписываются
+        deletes = [(path,) for path in stale - recorded]
+
+        logger.debug(f"Checkpoint {root}: {len(upserts)} index rows, {len(deletes)} removed")
+
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "DELETE FROM dir_index WHERE path = ?",
+                    deletes,
+                )
+                self._conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO dir_index
+                    (path, root, parent, mtime, own_bytes, own_alloc, own_files,
+                     own_errors, own_types, version, rules)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    upserts,
+                )
+                self._conn.execute(
+                    """
+                    INSERT OR REPLACE INTO scan_checkpoints (root, saved_at, version)
+                    VALUES (?, ?, ?)
+                    """,
+                    (root_text, time.time(), CACHE_VERSION),
+                )
+        except sqlite3.DatabaseError as de:
+            logger.error(f"SQLite error during checkpoint write: {de}")
+
+    # ------------------------------------------------------------------
+    # КРУПНЕЙШИЕ ФАЙЛЫ
+    # ------------------------------------------------------------------
+
+    def get_top_files(self, root: Path, rules: str = "") -> list[tuple[int, str]]:
+        """Сохранённые крупнейшие файлы корня: (размер, путь)."""
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    """
+                    SELECT size_bytes, path
+                    FROM top_files
+                    WHERE root = ?
+                    AND version = ?
+                    AND rules = ?
+                    """,
+                    (str(root), CACHE_VERSION, rules),
+                ).fetchall()
+        except sqlite3.DatabaseError as de:
+            logger.error(f"SQLite error during top files read: {de}")
+            return []
+
+        return [(row["size_bytes"], row["path"]) for row in rows]
+
+    def save_top_files(
+        self,
+        root: Path,
+        items: Iterable[tuple[int, str]],
+        rules: str = "",
+    ) -> None:
+        """Заменяет список крупнейших файлов корня целиком."""
+        rows = [(str(root), path, size, CACHE_VERSION, rules) for size, path in items]
+
+        try:
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM top_files WHERE root = ?", (str(root),))
+                self._conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO top_files (root, path, size_bytes, version, rules)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    rows,
+                )
+        except sqlite3.DatabaseError as de:
+            logger.error(f"SQLite error during top files write: {de}")
+
+    # ------------------------------------------------------------------
+    # ХЕШИ ФАЙЛОВ
+    # ------------------------------------------------------------------
+
+    def get_file_hashes(
+        self,
+        keys: Iterable[tuple[int, int, int]],
+    ) -> dict[tuple[int, int, int], tuple[bytes | None, bytes | None]]:
+        """
+        Сохранённые хеши файлов по ключам (inode, размер, mtime_ns):
+        (хеш краёв файла, полный хеш), любой из них может быть None.
+        """
+        keys = list(keys)
+        found: dict[tuple[int, int, int], tuple[bytes | None, bytes | None]] = {}
+        if not keys:
+            return found
+
+        # ключи ищем по inode, совпадение размера и mtime — уже здесь
+        wanted = {(_int64(key[0]), key[1], key[2]): key for key in keys}
+        inodes = sorted({key[0] for key in wanted})
+
+        try:
+            with self._lock:
+                for start in range(0, len(inodes), LOOKUP_CHUNK):
+                    chunk = inodes[start : start + LOOKUP_CHUNK]
+                    placeholders = ",".join("?" for _ in chunk)
+                    for row in self._conn.execute(
+                        f"""
+                        SELECT inode, size_bytes, mtime_ns, partial, full
+                        FROM file_hashes
+                        WHERE inode IN ({placeholders})
+                        """,
+                        chunk,
+                    ):
+                        key = wanted.get((row["inode"], row["size_bytes"], row["mtime_ns"]))
+                        if key is not None:
+                            found[key] = (row["partial"], row["full"])
+        except sqlite3.DatabaseError as de:
+            logger.error(f"SQLite error during file hashes read: {de}")
+            return {}
+
+        return found
+
+    def save_file_hashes(
+        self,
+        rows: Iterable[tuple[int, int, int, bytes | None, bytes | None]],
+    ) -> None:
+        """Сохраняет хеши файлов: (inode, размер, mtime_ns, хеш краёв, полный хеш)."""
+        now = time.time()
+        rows = [(_int64(inode), *rest, now) for inode, *rest in rows]
+        if not rows:
+            return
+
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO file_hashes
+                    (inode, size_bytes, mtime_ns, partial, full, hashed_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    rows,
+                )
+        except sqlite3.DatabaseError as de:
+            logger.error(f"SQLite error during file hashes write: {de}")
+
     # ------------------------------------------------------------------
     # СЛУЖЕБНОЕ
     # ------------------------------------------------------------------
 
+    def expire_in_background(self, max_age: float = MAX_CACHE_AGE) -> threading.Thread:
+        """
+        Удаляет устаревшие записи в фоновом потоке со своим соединением
+        (WAL позволяет сканированию читать кеш в это время).
+        """
+        thread = threading.Thread(
+            target=self._expire,
+            args=(max_age,),
+            name="cache-expiry",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def _expire(self, max_age: float) -> None:
+        try:
+            conn = _connect(self.db_path)
+        except sqlite3.DatabaseError as de:
+            logger.error(f"SQLite error during cache expiry: {de}")
+            return
+
+        try:
+            with conn:
+                expired = conn.execute(
+                    "DELETE FROM scan_cache WHERE version != ? OR scan_time < ?",
+                    (CACHE_VERSION, time.time() - max_age),
+                ).rowcount
+                conn.execute(
+                    "DELETE FROM scan_checkpoints WHERE version != ? OR saved_at < ?",
+                    (CACHE_VERSION, time.time() - max_age),
+                )
+                # индекс каталогов живёт, пока жива запись папки верхнего
+                # уровня или её контрольная точка
+                orphans = conn.execute(
+                    """
+                    DELETE FROM dir_index
+                    WHERE version != ?
+                    OR (
+                        root NOT IN (SELECT path FROM scan_cache)
+                        AND root NOT IN (SELECT root FROM scan_checkpoints)
+                    )
+                    """,
+                    (CACHE_VERSION,),
+                ).rowcount
+                conn.execute("DELETE FROM top_files WHERE version != ?", (CACHE_VERSION,))
+                conn.execute(
+                    "DELETE FROM file_hashes WHERE hashed_at < ?",
+                    (time.time() - max_age,),
+                )
+
+            pages = conn.execute("PRAGMA page_count").fetchone()[0]
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if pages and free / pages > VACUUM_FREE_RATIO:
+                conn.execute("VACUUM")
+
+            conn.execute("PRAGMA optimize")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+            logger.debug(
+                f"Cache expiry: {expired} folders, {orphans} index rows removed"
+            )
+        except sqlite3.DatabaseError as de:
+            logger.error(f"SQLite error during cache expiry: {de}")
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
     def clear(self) -> None:
         """Полная очистка кеша"""
-        with self._conn:
+        with self._lock, self._conn:
             self._conn.execute("DELETE FROM scan_cache")
+            self._conn.execute("DELETE FROM dir_index")
+            self._conn.execute("DELETE FROM scan_checkpoints")
+            self._conn.execute("DELETE FROM top_files")
+            self._conn.execute("DELETE FROM file_hashes")
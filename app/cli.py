@@ -0,0 +1,432 @@
+# app/cli.py
+"""
+Консольный (headless) режим: сканирование без Qt, вывод в JSON/CSV/NDJSON.
+
+    folder_size_viewer --cli <path> [<path> ...] [--all-mounts] [--per-device N]
+                       [--format json|csv|ndjson] [--depth N]
+                       [--top N] [--sort size|allocated|files|name] [--output FILE]
+                       [--metrics FILE] [--profile cprofile|sample]
+                       [--diff | --diff-from SNAPSHOT] [--types]
+                       [--duplicates [--duplicate-min-size BYTES]]
+                       [--exclude PATTERN ...] [--max-depth N] [--min-file-size BYTES]
+                       [--rules FILE] [--memory-limit MB]
+
+После каждого сканирования пишется снимок дерева (история по корню);
+--diff выводит вместо папок разницу с предыдущим снимком. Снимок
+помечается полным, только если обход перечитал все каталоги (--force,
+--duplicates или первый обход); колонки old_scan/new_scan в --diff —
+full или incremental.
+--types добавляет папкам верхнего уровня байты по категориям файлов.
+--duplicates ищет дубликаты файлов (обход тогда полный, без кеша)
+и добавляет каждой папке reclaimable_bytes — сколько освободит
+удаление лишних копий внутри неё.
+--exclude (шаблоны в стиле .gitignore), --max-depth и --min-file-size
+дополняют правила корня из файла --rules (см. app.scan_rules).
+
+Несколько корней (или --all-mounts — все смонтированные ФС) сканируются
+одним планировщиком с общим кешем; --per-device ограничивает число
+одновременных задач на один диск. Строки — папки всех корней, глубина
+считается от своего корня, снимок пишется для каждого корня.
+
+--memory-limit — примерно сколько мегабайт держать под очередь ещё
+не прочитанных каталогов; сверх этого она уходит во временный файл.
+NDJSON без сортировки, top-N и снимка (--no-snapshot) по одному корню
+не копит папки до конца обхода — память не растёт с шириной корня.
+"""
+import argparse
+import csv
+import json
+import sys
+from pathlib import Path
+from typing import IO, Iterable, Iterator
+
+from app.analysis.duplicates import DEFAULT_MIN_SIZE, FileCandidates, find_duplicates
+from app.analysis.file_types import CATEGORY_NAMES
+from app.analysis.snapshot_diff import DEFAULT_DIFF_TOP, SnapshotDiff, diff_snapshots, scan_kind
+from app.cache import DEFAULT_CACHE_PATH, ScanCache
+from app.core.metrics import ScanMetrics
+from app.core.profiling import PROFILE_MODES, profile_call
+from app.executors import DEFAULT_ENGINE, DEFAULT_MEMORY_LIMIT, create_executor
+from app.models import ScanResult
+from app.mounts import distinct_roots, list_mounts
+from app.scan_rules import DEFAULT_RULES_PATH, ScanRules, load_rules
+from app.scan_service import ScanService
+from app.snapshot import DEFAULT_SNAPSHOT_DIR, list_snapshots, open_snapshot, save_snapshot
+
+FIELDS = [
+    "path",
+    "name",
+    "depth",
+    "size_bytes",
+    "allocated_bytes",
+    "file_count",
+    "error_count",
+]
+
+# колонки --types: байты по категориям файлов
+TYPE_FIELDS = [f"{name}_bytes" for name in CATEGORY_NAMES]
+
+# колонка --duplicates
+DUPLICATE_FIELDS = ["reclaimable_bytes"]
+
+DIFF_FIELDS = [
+    "path",
+    "status",
+    "old_size",
+    "new_size",
+    "delta",
+    "old_files",
+    "new_files",
+    "rate_bytes_per_hour",
+    "old_scan",
+    "new_scan",
+]
+
+SORT_KEYS = {
+    "size": lambda r: -r.size_bytes,
+    "allocated": lambda r: -r.allocated_bytes,
+    "files": lambda r: -r.file_count,
+    "name": lambda r: r.path.name.lower(),
+}
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="folder_size_viewer --cli",
+        description="Scan folder sizes without GUI",
+    )
+    parser.add_argument("paths", type=Path, nargs="*", metavar="path")
+    parser.add_argument("--all-mounts", action="store_true", help="scan all mounted filesystems")
+    parser.add_argument(
+        "--per-device",
+        type=int,
+        default=None,
+        help="max concurrent scan tasks per disk",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["json", "csv", "ndjson"],
+        default="json",
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=1,
+        help="how many levels below the root to output (1 = direct children)",
+    )
+    parser.add_argument("--top", type=int, default=None, help="output only N largest rows")
+    parser.add_argument("--sort", choices=sorted(SORT_KEYS), default=None)
+    parser.add_argument("--output", "-o", default="-", help="output file ('-' = stdout)")
+    parser.add_argument("--engine", default=DEFAULT_ENGINE)
+    parser.add_argument(
+        "--memory-limit",
+        type=int,
+        default=DEFAULT_MEMORY_LIMIT >> 20,
+        metavar="MB",
+        help="memory for directories waiting to be read (the rest is spilled to a temp file)",
+    )
+    parser.add_argument("--force", action="store_true", help="ignore cache")
+    parser.add_argument(
+        "--cross-filesystems",
+        action="store_true",
+        help="descend into other mounted filesystems",
+    )
+    parser.add_argument("--cache", type=Path, default=DEFAULT_CACHE_PATH)
+    parser.add_argument("--metrics", type=Path, default=None, help="write scan metrics JSON to file")
+    parser.add_argument("--profile", choices=PROFILE_MODES, default=None)
+    parser.add_argument("--profile-output", type=Path, default=Path("scan.prof"))
+    parser.add_argument("--snapshot-dir", type=Path, default=DEFAULT_SNAPSHOT_DIR)
+    parser.add_argument("--no-snapshot", action="store_true", help="do not save a snapshot of this scan")
+    parser.add_argument(
+        "--types",
+        action="store_true",
+        help="add bytes per file category to top-level folders",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="PATTERN",
+        help="skip files and directories matching a gitignore-style pattern",
+    )
+    parser.add_argument("--max-depth", type=int, default=None, help="do not read directories deeper than N")
+    parser.add_argument("--min-file-size", type=int, default=0, help="ignore files smaller than BYTES")
+    parser.add_argument("--rules", type=Path, default=DEFAULT_RULES_PATH, help="per-root rules file (JSON)")
+    parser.add_argument(
+        "--duplicates",
+        action="store_true",
+        help="find duplicate files and add reclaimable bytes per folder",
+    )
+    parser.add_argument(
+        "--duplicate-min-size",
+        type=int,
+        default=DEFAULT_MIN_SIZE,
+        help="ignore smaller files when looking for duplicates",
+    )
+
+    diff = parser.add_mutually_exclusive_group()
+    diff.add_argument("--diff", action="store_true", help="output changes since the previous snapshot")
+    diff.add_argument("--diff-from", type=Path, default=None, help="output changes since the given snapshot file")
+    return parser
+
+
+def _expand(result: ScanResult, depth: int, level: int = 1) -> Iterator[tuple[int, ScanResult]]:
+    """Папка и её подкаталоги до заданной глубины (из DirTree, без диска)."""
+    yield level, result
+
+    if level < depth and result.tree is not None:
+        tree = result.tree
+        for node in tree.children(result.node):
+            yield from _expand(tree.result(node), depth, level + 1)
+
+
+def _row(
+    level: int,
+    result: ScanResult,
+    types: bool = False,
+    reclaimable: dict[Path, int] | None = None,
+) -> dict:
+    row = {
+        "path": str(result.path),
+        "name": result.path.name,
+        "depth": level,
+        "size_bytes": result.size_bytes,
+        "allocated_bytes": result.allocated_bytes,
+        "file_count": result.file_count,
+        "error_count": result.error_count,
+    }
+
+    if types:
+        # разбивка есть только у папок верхнего уровня
+        sizes = {}
+        if result.types is not None:
+            sizes = {name: size for name, size, _ in result.types.by_category()}
+        for name, field in zip(CATEGORY_NAMES, TYPE_FIELDS):
+            row[field] = sizes.get(name, 0) if result.types is not None else None
+
+    if reclaimable is not None:
+        row["reclaimable_bytes"] = reclaimable.get(result.path, 0)
+
+    return row
+
+
+def _diff_rows(diff: SnapshotDiff) -> Iterator[dict]:
+    for entry in diff.entries():
+        yield {
+            "path": str(entry.path),
+            "status": entry.status,
+            "old_size": entry.old_size,
+            "new_size": entry.new_size,
+            "delta": entry.delta,
+            "old_files": entry.old_files,
+            "new_files": entry.new_files,
+            "rate_bytes_per_hour": round(entry.rate),
+            "old_scan": scan_kind(diff.old_full),
+            "new_scan": scan_kind(diff.new_full),
+        }
+
+
+def _write_json(rows: Iterable[dict], out: IO[str]) -> None:
+    json.dump(list(rows), out, ensure_ascii=False, indent=2)
+    out.write("\n")
+
+
+def _write_csv(rows: Iterable[dict], out: IO[str], fields: list[str] = FIELDS) -> None:
+    writer = csv.DictWriter(out, fieldnames=fields)
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def _write_ndjson_row(row: dict, out: IO[str]) -> None:
+    out.write(json.dumps(row, ensure_ascii=False))
+    out.write("\n")
+
+
+def run(args: argparse.Namespace, out: IO[str]) -> int:
+    cache = ScanCache(args.cache)
+    cache.expire_in_background()
+
+    service = ScanService(
+        cache,
+        create_executor(
+            args.engine,
+            per_device=args.per_device,
+            memory_limit=args.memory_limit << 20,
+        ),
+        one_filesystem=not args.cross_filesystems,
+    )
+
+    roots = list(args.paths)
+    if args.all_mounts:
+        roots.extend(list_mounts())
+    roots = distinct_roots(roots, service.one_filesystem)
+
+    diffing = args.diff or args.diff_from is not None
+
+    # NDJSON без сортировки и top-N пишем сразу, по мере готовности папок
+    streaming = (
+        args.format == "ndjson"
+        and args.sort is None
+        and args.top is None
+        and not diffing
+        and not args.duplicates
+    )
+
+    def on_result(result: ScanResult) -> None:
+        for level, item in _expand(result, args.depth):
+            _write_ndjson_row(_row(level, item, args.types), out)
+        out.flush()
+
+    metrics = ScanMetrics() if args.metrics is not None else None
+    candidates = FileCandidates(args.duplicate_min_size) if args.duplicates else None
+    extra = ScanRules(tuple(args.exclude), args.max_depth, args.min_file_size)
+    rules = {root: load_rules(root, args.rules).merged(extra) for root in roots}
+
+    def scan() -> dict[Path, list[ScanResult]]:
+        """Папки верхнего уровня по корням."""
+        options = dict(
+            on_progress=lambda percent: None,
+            is_cancelled=lambda: False,
+            force_rescan=args.force,
+            on_result=on_result if streaming else None,
+            metrics=metrics,
+            files=candidates,
+        )
+        if len(roots) == 1:
+            # без снимка потоковому выводу папки после on_result не нужны
+            keep = not (streaming and args.no_snapshot)
+            return {
+                roots[0]: service.scan(
+                    root=roots[0], rules=rules[roots[0]], keep_results=keep, **options
+                )
+            }
+
+        return {
+            r.path: [r.tree.result(node) for node in r.tree.children(0)]
+            for r in service.scan_roots(roots, rules=rules, **options)
+        }
+
+    if args.profile is not None:
+        folders = profile_call(scan, args.profile, args.profile_output)
+    else:
+        folders = scan()
+
+    if metrics is not None:
+        args.metrics.write_text(metrics.to_json(), encoding="utf-8")
+
+    snapshot = None
+    if not args.no_snapshot:
+        for root, children in folders.items():
+            snapshot = save_snapshot(root, children, args.snapshot_dir, full=service.full_walk)
+
+    if diffing:
+        return _run_diff(args, roots[0], snapshot, out)
+
+    if streaming:
+        return 0
+
+    reclaimable = None
+    if candidates is not None:
+        report = find_duplicates(roots, candidates, cache)
+        reclaimable = report.reclaimable_by_dir()
+
+    results = [result for children in folders.values() for result in children]
+
+    items = [pair for result in results for pair in _expand(result, args.depth)]
+
+    if args.sort is not None or args.top is not None:
+        key = SORT_KEYS[args.sort or "size"]
+        items.sort(key=lambda pair: key(pair[1]))
+
+    if args.top is not None:
+        items = items[: args.top]
+
+    rows = (_row(level, item, args.types, reclaimable) for level, item in items)
+
+    if args.format == "json":
+        _write_json(rows, out)
+    elif args.format == "csv":
+        fields = FIELDS + (TYPE_FIELDS if args.types else [])
+        if reclaimable is not None:
+            fields += DUPLICATE_FIELDS
+        _write_csv(rows, out, fields)
+    else:
+        for row in rows:
+            _write_ndjson_row(row, out)
+
+    return 0
+
+
+def _run_diff(args: argparse.Namespace, root: Path, snapshot: Path | None, out: IO[str]) -> int:
+    if snapshot is None:
+        print("--diff needs the snapshot of this scan, drop --no-snapshot", file=sys.stderr)
+        return 2
+
+    if args.diff_from is not None:
+        previous = args.diff_from
+    else:
+        history = list_snapshots(root, args.snapshot_dir)
+        if len(history) < 2:
+            print("No previous snapshot to compare with", file=sys.stderr)
+            return 1
+        previous = history[-2]
+
+    try:
+        old = open_snapshot(previous)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    diff = diff_snapshots(old, open_snapshot(snapshot), top=args.top or DEFAULT_DIFF_TOP)
+    if not (diff.old_full and diff.new_full):
+        print(
+            "Note: an incremental snapshot is compared; files that grew in place "
+            "inside unchanged directories are not counted (use --force)",
+            file=sys.stderr,
+        )
+    rows = _diff_rows(diff)
+
+    if args.format == "json":
+        _write_json(rows, out)
+    elif args.format == "csv":
+        _write_csv(rows, out, DIFF_FIELDS)
+    else:
+        for row in rows:
+            _write_ndjson_row(row, out)
+
+    return 0
+
+
+def main(argv: list[str]) -> int:
+    args = _build_parser().parse_args(argv)
+
+    if args.depth < 1:
+        print("--depth must be >= 1", file=sys.stderr)
+        return 2
+
+    if not args.paths and not args.all_mounts:
+        print("Give at least one path or --all-mounts", file=sys.stderr)
+        return 2
+
+    if (args.diff or args.diff_from is not None) and (args.all_mounts or len(args.paths) > 1):
+        print("--diff compares snapshots of a single root", file=sys.stderr)
+        return 2
+
+    if args.per_device is not None and args.per_device < 1:
+        print("--per-device must be >= 1", file=sys.stderr)
+        return 2
+
+    if args.memory_limit < 1:
+        print("--memory-limit must be >= 1", file=sys.stderr)
+        return 2
+
+    try:
+        if args.output == "-":
+            return run(args, sys.stdout)
+
+        with open(args.output, "w", encoding="utf-8", newline="") as out:
+            return run(args, out)
+
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
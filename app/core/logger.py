@@ -1,29 +1,67 @@
-from loguru import logger
+"""
+Логгер приложения (loguru).
+
+loguru и его sink-и — консоль и файл с ротацией и сжатием — заводятся
+при первой записи в лог, а не при импорте: окно рисует первый кадр,
+не дожидаясь их.
+"""
 from pathlib import Path
 import sys
+import threading
 
 LOG_DIR = Path.cwd()
-LOG_DIR.mkdir(parents=True, exist_ok=True)
 
 LOG_FILE = LOG_DIR / "folder_size_scanner.log"
 
-logger.remove()
-
-# Консоль (для dev)
-logger.add(
-    sys.stderr,
-    level="INFO",
-    format="<green>{time:HH:mm:ss}</green> | <level>{level}</level> | {message}",
-)
-
-# Файл (всё подряд)
-logger.add(
-    LOG_FILE,
-    level="DEBUG",
-    rotation="5 MB",
-    retention="14 days",
-    compression="zip",
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {module}:{line} | {message}",
-)
+_lock = threading.Lock()
+_logger = None
+
+
+def _configure():
+    global _logger
+
+    with _lock:
+        if _logger is not None:
+            return _logger
+
+        from loguru import logger
+
+        logger.remove()
+
+        # Консоль (для dev)
+        logger.add(
+            sys.stderr,
+            level="INFO",
+            format="<green>{time:HH:mm:ss}</green> | <level>{level}</level> | {message}",
+        )
+
+        # Файл (всё подряд)
+        LOG_DIR.mkdir(parents=True, exist_ok=True)
+        logger.add(
+            LOG_FILE,
+            level="DEBUG",
+            rotation="5 MB",
+            retention="14 days",
+            compression="zip",
+            format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {module}:{line} | {message}",
+        )
+
+        _logger = logger
+        return logger
+
+
+class _LazyLogger:
+    """
+    Заместитель loguru.logger: первое обращение настраивает логгер,
+    дальше вызовы (logger.info и т.д.) уходят в него напрямую —
+    {module}:{line} в записи указывают на вызывающий код.
+    """
+
+    def __getattr__(self, name: str):
+        logger = _logger if _logger is not None else _configure()
+        return getattr(logger, name)
+
+
+logger = _LazyLogger()
 
 __all__ = ["logger"]
@@ -0,0 +1,86 @@
+# app/core/metrics.py
+import json
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+
+
+@dataclass
+class ScanMetrics:
+    """
+    Счётчики одного сканирования. Заполняются в scan_chunk, исполнителях
+    и ScanCache, суммируются через merge().
+    """
+    dirs_listed: int = 0
+    dirs_reused: int = 0
+    files_visited: int = 0
+
+    scandir_calls: int = 0
+    scandir_time: float = 0.0
+    stat_calls: int = 0
+    stat_time: float = 0.0
+
+    errors_by_type: Counter = field(default_factory=Counter)
+
+    cache_hits: int = 0
+    cache_misses: int = 0
+    cache_invalidations: int = 0
+
+    # путь папки верхнего уровня -> секунды от начала до готовности
+    folder_times: dict[str, float] = field(default_factory=dict)
+
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+
+    def merge(self, other: "ScanMetrics") -> None:
+        self.dirs_listed += other.dirs_listed
+        self.dirs_reused += other.dirs_reused
+        self.files_visited += other.files_visited
+        self.scandir_calls += other.scandir_calls
+        self.scandir_time += other.scandir_time
+        self.stat_calls += other.stat_calls
+        self.stat_time += other.stat_time
+        self.errors_by_type.update(other.errors_by_type)
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        self.cache_invalidations += other.cache_invalidations
+        self.folder_times.update(other.folder_times)
+
+    @property
+    def cpu_ratio(self) -> float:
+        """
+        Доля процессорного времени от реального. Около нуля — обход
+        ждёт диск/сеть (I/O-bound), около 1 и выше — упирается в CPU.
+        """
+        return self.cpu_time / self.wall_time if self.wall_time else 0.0
+
+    @property
+    def bound(self) -> str:
+        return "cpu" if self.cpu_ratio >= 0.7 else "io"
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["errors_by_type"] = dict(self.errors_by_type)
+        data["cpu_ratio"] = self.cpu_ratio
+        data["bound"] = self.bound
+        return data
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+    def log_summary(self) -> None:
+        # импорт здесь: метрики собираются и в дочерних процессах пула,
+        # которым не нужны файловые sink-и логгера
+        from app.core.logger import logger
+
+        logger.info(
+            f"Scan metrics: {self.dirs_listed} dirs listed, "
+            f"{self.dirs_reused} reused, {self.files_visited} files, "
+            f"{self.scandir_calls} scandir, {self.stat_calls} stat, "
+            f"cache {self.cache_hits}/{self.cache_misses}/{self.cache_invalidations} "
+            f"(hit/miss/invalid), {self.wall_time:.3f}s wall, "
+            f"cpu ratio {self.cpu_ratio:.2f} ({self.bound}-bound)"
+        )
+        if self.errors_by_type:
+            logger.info(f"Scan errors by type: {dict(self.errors_by_type)}")
+
+        logger.debug(f"Scan metrics report: {json.dumps(self.to_dict())}")
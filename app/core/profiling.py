@@ -0,0 +1,106 @@
+# app/core/profiling.py
+import cProfile
+import io
+import pstats
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Callable, TypeVar
+
+from app.core.logger import logger
+
+T = TypeVar("T")
+
+PROFILE_MODES = ("cprofile", "sample")
+
+# период опроса стеков сэмплирующим профилировщиком, секунды
+SAMPLE_INTERVAL = 0.005
+
+
+class SamplingProfiler:
+    """
+    Простой сэмплирующий профилировщик: раз в interval снимает стеки
+    всех потоков (кроме своего) через sys._current_frames().
+
+    В отличие от cProfile видит и потоки пула сканирования, а накладные
+    расходы не зависят от числа вызовов. Результат — collapsed-стеки,
+    которые понимают flamegraph.pl и speedscope.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL) -> None:
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def __enter__(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._run, name="sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append(f"{Path(code.co_filename).name}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+
+                self.stacks[";".join(reversed(parts))] += 1
+            self.samples += 1
+
+    def write_collapsed(self, output: Path) -> None:
+        with open(output, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top_leaves(self, limit: int = 15) -> list[tuple[str, int]]:
+        leaves: Counter[str] = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(limit)
+
+
+def profile_call(fn: Callable[[], T], mode: str, output: Path) -> T:
+    """
+    Выполняет fn под профилировщиком и сохраняет отчёт в output.
+
+    cprofile — детерминированный профиль (pstats), видит только текущий
+    поток, поэтому его стоит запускать с движком serial.
+    sample — сэмплирование всех потоков, collapsed-стеки.
+    """
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        result = profiler.runcall(fn)
+        profiler.dump_stats(output)
+
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(15)
+        logger.info(f"cProfile saved to {output}")
+        logger.debug(report.getvalue())
+        return result
+
+    if mode == "sample":
+        with SamplingProfiler() as sampler:
+            result = fn()
+        sampler.write_collapsed(output)
+
+        logger.info(f"Sampling profile saved to {output} ({sampler.samples} samples)")
+        for frame, count in sampler.top_leaves():
+            logger.debug(f"  {count:6d}  {frame}")
+        return result
+
+    raise ValueError(f"Unknown profile mode: {mode}")
@@ -0,0 +1,1224 @@
+# app/executors.py
+import asyncio
+import heapq
+import multiprocessing
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import replace
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from collections import deque
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+from app.analysis.duplicates import FileCandidates
+from app.analysis.file_types import TypeBreakdown
+from app.core.metrics import ScanMetrics
+from app.models import ChunkResult, DirIndex, FolderScope, ScanOptions, ScanResult
+from app.priority import ScanPriority
+from app.scan_rules import RuleMatcher
+from app.scanner import scan_chunk
+from app.tree import DirRecord, DirTree
+from app.utils.dir_stack import DirStack
+from app.utils.inode_set import InodeSet
+from app.utils.top_n import TopN
+
+# сколько каталогов читает одна задача пула, прежде чем вернуть
+# остаток стека планировщику для перераспределения
+DEFAULT_CHUNK_BUDGET = 256
+
+# сколько листингов каталогов asyncio-движок держит одновременно
+# и сколько каталогов может ждать в его очереди
+DEFAULT_ASYNC_CONCURRENCY = 256
+DEFAULT_ASYNC_QUEUE_SIZE = 10_000
+
+DEFAULT_ENGINE = "thread"
+
+# как часто (в секундах) сохранять контрольную точку идущего обхода
+DEFAULT_CHECKPOINT_INTERVAL = 30.0
+
+# как часто планировщик пула проверяет отмену, пока задачи работают
+CANCEL_POLL_INTERVAL = 0.01
+
+# сколько байт путей каталогов, ждущих обхода, держать в памяти на всё
+# сканирование (стеки задач и очередь планировщика); остальное уходит
+# во временные файлы (см. DirStack)
+DEFAULT_MEMORY_LIMIT = 64 << 20
+
+# сколько задач держать на воркер в пуле и в очередях дисков вместе:
+# остальные папки ждут номером в списке, а не готовыми задачами
+SUBMIT_AHEAD = 2
+
+
+def _empty_result(folder: Path) -> ScanResult:
+    return ScanResult(path=folder, size_bytes=0, file_count=0, error_count=0)
+
+
+def _accumulate(partial: ScanResult, chunk: ChunkResult) -> None:
+    partial.size_bytes += chunk.size_bytes
+    partial.allocated_bytes += chunk.allocated_bytes
+    partial.file_count += chunk.file_count
+    partial.error_count += chunk.error_count
+
+    if chunk.types is not None:
+        if partial.types is None:
+            partial.types = TypeBreakdown()
+        partial.types.merge(chunk.types)
+
+
+def _progress(partial: ScanResult) -> ScanResult:
+    # разбивку планировщик продолжает менять — в on_partial её не отдаём
+    return replace(partial, types=None)
+
+
+def _final(tree: DirTree | None, partial: ScanResult) -> ScanResult:
+    if tree is None:
+        return partial
+
+    result = tree.finalize().result(0)
+    result.types = partial.types
+    return result
+
+
+def _checkpoint(
+    on_checkpoint: Callable[[Path, list[DirRecord], list[str]], None],
+    folder: Path,
+    tree: DirTree,
+    saved: int,
+    pending: Iterable[str],
+) -> int:
+    """
+    Отдаёт on_checkpoint каталоги дерева с номера saved и остаток обхода.
+    Возвращает, с какого узла начинать следующую контрольную точку.
+    """
+    on_checkpoint(folder, list(tree.own_records(saved)), list(pending))
+    # пока у дерева один узел, корень мог ещё не получить свою запись
+    return len(tree) if len(tree) > 1 else 0
+
+
+class _HardlinkOwners:
+    """
+    Учёт жёстких ссылок всего вызова run(), не зависящий от порядка
+    обхода (движка, числа воркеров, приоритетов).
+
+    inode входит в итоги один раз: в первой по пути папке верхнего
+    уровня, где он встретился, а внутри неё — в каталоге с наименьшим
+    путём. Пока папка обходится, её ссылки только копятся (по одной
+    записи на inode). Готовая папка сводится, когда сведены все папки
+    раньше неё по пути: её inode сверяются с уже учтёнными, остальные
+    дописываются в итоги и дерево, и только тогда вызывается on_result.
+    Папки без жёстких ссылок отдаются сразу; при обходе по порядку
+    путей не ждёт никто.
+
+    Вызывается в одном потоке планировщика, поэтому без блокировок.
+    """
+
+    def __init__(
+        self,
+        folders: list[Path],
+        on_result: Callable[[ScanResult], None],
+        file_types: bool,
+    ) -> None:
+        self.on_result = on_result
+        self.file_types = file_types
+        self._order = sorted(range(len(folders)), key=lambda pos: str(folders[pos]))
+        # сколько первых папок _order уже сведено
+        self._settled = 0
+        # ключ inode -> (каталог, размер, место, ключ типа) по номеру папки
+        self._links: list[dict[int, tuple[str, int, int, str]] | None] = [None] * len(folders)
+        # готовые папки, ждущие сведения: (дерево, итоги)
+        self._ready: dict[int, tuple[DirTree | None, ScanResult]] = {}
+        self._done = [False] * len(folders)
+        self._seen = InodeSet()
+
+    def add(self, pos: int, chunk: ChunkResult) -> None:
+        """Забирает отложенные ссылки порции папки pos."""
+        if not chunk.links:
+            return
+
+        links = self._links[pos]
+        if links is None:
+            links = self._links[pos] = {}
+        for dir_path, key, size, alloc, type_key in chunk.links:
+            known = links.get(key)
+            if known is None or dir_path < known[0]:
+                links[key] = (dir_path, size, alloc, type_key)
+        chunk.links = []
+
+    def done(self, pos: int, tree: DirTree | None, partial: ScanResult) -> None:
+        """Папка pos обойдена целиком: отдаёт её сразу или после предшественниц."""
+        self._done[pos] = True
+        if self._links[pos] is None:
+            self.on_result(_final(tree, partial))
+        else:
+            self._ready[pos] = (tree, partial)
+        self._advance()
+
+    def flush(self) -> None:
+        """
+        Сводит все готовые папки (конец обхода или отмена): ссылки
+        недообойдённых папок тогда уже не появятся.
+        """
+        for pos in self._order:
+            if pos in self._ready:
+                self._settle(pos)
+        self._settled = len(self._order)
+
+    def _advance(self) -> None:
+        order = self._order
+        while self._settled < len(order) and self._done[order[self._settled]]:
+            pos = order[self._settled]
+            if pos in self._ready:
+                self._settle(pos)
+            self._settled += 1
+
+    def _settle(self, pos: int) -> None:
+        tree, partial = self._ready.pop(pos)
+        links = self._links[pos]
+        self._links[pos] = None
+
+        # каталог -> [размер, место, файлы, разбивка]
+        extra: dict[str, list] = {}
+        for key, (dir_path, size, alloc, type_key) in links.items():
+            if not self._seen.add(key):
+                continue
+
+            acc = extra.get(dir_path)
+            if acc is None:
+                acc = extra[dir_path] = [0, 0, 0, TypeBreakdown() if self.file_types else None]
+            acc[0] += size
+            acc[1] += alloc
+            acc[2] += 1
+            if acc[3] is not None:
+                acc[3].add(type_key, size, 1)
+
+        for dir_path, (size, alloc, files, types) in extra.items():
+            partial.size_bytes += size
+            partial.allocated_bytes += alloc
+            partial.file_count += files
+            if types is not None:
+                if partial.types is None:
+                    partial.types = TypeBreakdown()
+                partial.types.merge(types)
+            if tree is not None:
+                tree.add_own(dir_path, size, alloc, files, types)
+
+        self.on_result(_final(tree, partial))
+
+
+class _Backlog:
+    """
+    Задачи, ждущие воркера, в порядке приоритета их папок
+    (см. ScanPriority), а внутри одного приоритета — по номеру папки:
+    начатые папки доделываются раньше, чем берутся новые.
+    """
+
+    def __init__(self, priority: ScanPriority, folders: list[Path]) -> None:
+        self.priority = priority
+        self.folders = folders
+        self._heap: list[tuple[int, int, int, list[str]]] = []
+        self._seq = 0
+        self._version = priority.version
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __iter__(self) -> Iterator[tuple[int, list[str]]]:
+        return ((pos, dirs) for _, pos, _, dirs in self._heap)
+
+    def push(self, pos: int, dirs: list[str]) -> None:
+        level = self.priority.level(self.folders[pos])
+        heapq.heappush(self._heap, (level, pos, self._seq, dirs))
+        self._seq += 1
+
+    def pop(self, allowed: Callable[[int], bool] | None = None) -> tuple[int, list[str]] | None:
+        """Самая нужная задача, папку которой пропускает allowed (None — нет такой)."""
+        if self._version != self.priority.version:
+            # UI поменял приоритеты — пересортировываем очередь целиком
+            self._version = self.priority.version
+            level = self.priority.level
+            self._heap = [
+                (level(self.folders[pos]), pos, seq, dirs) for _, pos, seq, dirs in self._heap
+            ]
+            heapq.heapify(self._heap)
+
+        skipped = []
+        found = None
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            if allowed is None or allowed(item[1]):
+                found = item
+                break
+            skipped.append(item)
+
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+
+        return (found[1], found[3]) if found is not None else None
+
+    def clear(self) -> None:
+        self._heap = []
+
+
+def _folder_order(folders: list[Path], priority: ScanPriority | None) -> Iterator[int]:
+    """Номера папок по порядку или, в ленивом режиме, по текущему приоритету."""
+    if priority is None:
+        yield from range(len(folders))
+        return
+
+    backlog = _Backlog(priority, folders)
+    for pos, folder in enumerate(folders):
+        backlog.push(pos, [str(folder)])
+    while backlog:
+        yield backlog.pop()[0]
+
+
+class ScanExecutor(ABC):
+    """
+    Стратегия обхода списка папок верхнего уровня.
+
+    Для каждой полностью просканированной папки вызывается on_result.
+    При отмене незавершённые папки не попадают в результат: обход
+    останавливается внутри каталога (см. scan_chunk, stop), а не после
+    очередной папки.
+
+    build_tree — строить для каждой папки DirTree (ScanResult.tree),
+    чтобы UI мог переходить внутрь без повторного сканирования.
+
+    index — индекс каталогов из кеша для инкрементального пересканирования
+    (см. scan_chunk).
+
+    on_partial — вызывается с промежуточными итогами папки, которая
+    ещё сканируется (без дерева), после каждой порции каталогов.
+
+    metrics — если передан, в него суммируются счётчики всех порций
+    и время обхода каждой папки.
+
+    device — st_dev корня сканирования: каталоги на других устройствах
+    пропускаются (None — пересекать границы ФС). Жёсткие ссылки
+    учитываются один раз на inode в пределах всего вызова run(), в
+    папке, выбранной по путям, а не по порядку обхода (_HardlinkOwners):
+    папка с такими ссылками может прийти в on_result позже, чем
+    закончен её обход.
+
+    dirty — каталоги, изменившиеся по данным наблюдателя ФС
+    (см. ScanOptions.dirty).
+
+    top — если передан, в него сливаются крупнейшие файлы всех порций.
+
+    file_types — собирать разбивку по типам файлов (ScanResult.types).
+
+    files — если передан, в него собираются файлы не меньше
+    files.min_size (кандидаты для поиска дубликатов).
+
+    rules — правила исключения корня сканирования (см. ScanOptions.rules).
+
+    scopes — корень каждой папки, когда сканируется несколько корней:
+    его граница ФС и правила перекрывают device и rules, а по
+    устройству планировщик ограничивает число задач на диск
+    (per_device у пулов и asyncio-движка).
+
+    on_checkpoint — вызывается раз в checkpoint_interval секунд и при
+    отмене для каждой недосканированной папки: папка, собственные итоги
+    прочитанных с прошлого вызова каталогов и каталоги, до которых обход
+    ещё не дошёл. Только при build_tree.
+
+    priority — ленивый режим: папки (и их порции) берутся в работу в
+    порядке ScanPriority.level, который UI меняет по ходу сканирования.
+
+    memory_limit (параметр конструктора) — бюджет памяти на пути
+    каталогов, ждущих обхода, в байтах (None — без ограничения).
+    Он делится между стеками задач; сверх своей доли стек сбрасывает
+    нижние каталоги во временный файл.
+    """
+
+    checkpoint_interval = DEFAULT_CHECKPOINT_INTERVAL
+
+    def __init__(
+        self,
+        build_tree: bool = True,
+        memory_limit: int | None = DEFAULT_MEMORY_LIMIT,
+    ) -> None:
+        self.build_tree = build_tree
+        self.memory_limit = memory_limit
+
+    def _stacks(self) -> int:
+        """Сколько стеков обхода живёт одновременно (делят memory_limit)."""
+        return 1
+
+    def _stack_limit(self) -> int:
+        if not self.memory_limit:
+            return 0
+        return max(1, self.memory_limit // self._stacks())
+
+    def _options(
+        self,
+        metrics: ScanMetrics | None,
+        device: int | None,
+        dirty: frozenset[str] | None,
+        top: TopN[str] | None,
+        file_types: bool,
+        files: FileCandidates | None,
+        rules: RuleMatcher | None,
+    ) -> ScanOptions:
+        return ScanOptions(
+            build_tree=self.build_tree,
+            collect_metrics=metrics is not None,
+            device=device,
+            dirty=dirty,
+            top_files=top.limit if top is not None else 0,
+            file_types=file_types,
+            duplicate_min_size=files.min_size if files is not None else 0,
+            rules=rules,
+            stack_limit=self._stack_limit(),
+        )
+
+    @staticmethod
+    def _per_folder(
+        options: ScanOptions,
+        scopes: list[FolderScope] | None,
+        count: int,
+    ) -> list[ScanOptions]:
+        """Настройки обхода каждой папки (общие для папок одного корня)."""
+        if scopes is None:
+            return [options] * count
+
+        shared: dict[tuple, ScanOptions] = {}
+        result = []
+        for scope in scopes:
+            key = (scope.device, id(scope.rules), scope.root)
+            folder_options = shared.get(key)
+            if folder_options is None:
+                folder_options = shared[key] = replace(
+                    options, device=scope.device, rules=scope.rules, root=scope.root
+                )
+            result.append(folder_options)
+        return result
+
+    @abstractmethod
+    def run(
+        self,
+        folders: list[Path],
+        on_result: Callable[[ScanResult], None],
+        is_cancelled: Callable[[], bool],
+        index: DirIndex | None = None,
+        on_partial: Callable[[ScanResult], None] | None = None,
+        metrics: ScanMetrics | None = None,
+        device: int | None = None,
+        dirty: frozenset[str] | None = None,
+        top: TopN[str] | None = None,
+        file_types: bool = False,
+        files: FileCandidates | None = None,
+        rules: RuleMatcher | None = None,
+        scopes: list[FolderScope] | None = None,
+        on_checkpoint: Callable[[Path, list[DirRecord], list[str]], None] | None = None,
+        priority: ScanPriority | None = None,
+    ) -> None:
+        ...
+
+
+class SerialScanExecutor(ScanExecutor):
+    """
+    Последовательный обход в текущем потоке.
+
+    Папка читается порциями по chunk_budget каталогов, чтобы между
+    порциями отдавать промежуточные итоги. Стек обхода (DirStack)
+    переходит из порции в порцию без копирования.
+    """
+
+    def __init__(
+        self,
+        chunk_budget: int = DEFAULT_CHUNK_BUDGET,
+        build_tree: bool = True,
+        memory_limit: int | None = DEFAULT_MEMORY_LIMIT,
+    ) -> None:
+        super().__init__(build_tree, memory_limit)
+        self.chunk_budget = chunk_budget
+
+    def run(
+        self,
+        folders: list[Path],
+        on_result: Callable[[ScanResult], None],
+        is_cancelled: Callable[[], bool],
+        index: DirIndex | None = None,
+        on_partial: Callable[[ScanResult], None] | None = None,
+        metrics: ScanMetrics | None = None,
+        device: int | None = None,
+        dirty: frozenset[str] | None = None,
+        top: TopN[str] | None = None,
+        file_types: bool = False,
+        files: FileCandidates | None = None,
+        rules: RuleMatcher | None = None,
+        scopes: list[FolderScope] | None = None,
+        on_checkpoint: Callable[[Path, list[DirRecord], list[str]], None] | None = None,
+        priority: ScanPriority | None = None,
+    ) -> None:
+        options = self._options(metrics, device, dirty, top, file_types, files, rules)
+        per_folder = self._per_folder(options, scopes, len(folders))
+        owners = _HardlinkOwners(folders, on_result, file_types)
+        last_checkpoint = time.monotonic()
+
+        for pos in _folder_order(folders, priority):
+            if is_cancelled():
+                break
+
+            folder, options = folders[pos], per_folder[pos]
+
+            tree = DirTree(str(folder)) if self.build_tree else None
+            partial = _empty_result(folder)
+            stack: list[str] | DirStack = [str(folder)]
+            started = time.perf_counter()
+            saved = 0
+
+            while stack:
+                chunk = scan_chunk(stack, self.chunk_budget, options, index, is_cancelled)
+                owners.add(pos, chunk)
+                if top is not None:
+                    top.merge(chunk.top_files)
+                if files is not None:
+                    files.merge(chunk.files)
+                stack = chunk.pending
+
+                if chunk.metrics is not None:
+                    metrics.merge(chunk.metrics)
+
+                _accumulate(partial, chunk)
+
+                if tree is not None:
+                    tree.add_dirs(chunk.dirs)
+
+                if not stack:
+                    break
+
+                if is_cancelled():
+                    if tree is not None and on_checkpoint is not None:
+                        _checkpoint(on_checkpoint, folder, tree, saved, stack)
+                    # готовые папки, ждущие предшественниц, всё же отдаём
+                    owners.flush()
+                    return
+
+                if (
+                    tree is not None
+                    and on_checkpoint is not None
+                    and time.monotonic() - last_checkpoint >= self.checkpoint_interval
+                ):
+                    saved = _checkpoint(on_checkpoint, folder, tree, saved, stack)
+                    last_checkpoint = time.monotonic()
+
+                if on_partial is not None:
+                    on_partial(_progress(partial))
+
+            if metrics is not None:
+                metrics.folder_times[str(folder)] = time.perf_counter() - started
+
+            owners.done(pos, tree, partial)
+
+        owners.flush()
+
+
+class _PoolScanExecutor(ScanExecutor):
+    """
+    Общий планировщик для пулов потоков и процессов.
+
+    Каждая задача обходит не более chunk_budget каталогов и возвращает
+    остаток своего DFS-стека. Остаток режется на части и снова ставится
+    в очередь, так что свободные воркеры забирают работу из больших
+    поддеревьев, а не простаивают на одной огромной папке.
+
+    Часть — не больше chunk_budget каталогов (больше задача всё равно
+    не обойдёт); что не роздано, ждёт в стеках папки (DirStack) и
+    раздаётся по мере того, как задачи папки возвращаются. Папки
+    берутся в работу по мере освобождения пула (SUBMIT_AHEAD задач
+    на воркер), а их итоги и деревья заводятся при первой задаче и
+    отпускаются сразу после on_result — каталог с миллионом
+    подкаталогов и корень с миллионом папок не раздувают очередь.
+
+    per_device — сколько задач одновременно читают одно устройство
+    (None — без ограничения). Задачи сверх лимита ждут в очереди своего
+    устройства, а освободившиеся воркеры тем временем берут работу
+    с других дисков: несколько корней на одном HDD не гоняют головки
+    наперегонки.
+    """
+
+    # можно ли передавать индекс каталогов в задачи без сериализации
+    shares_memory = True
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        chunk_budget: int = DEFAULT_CHUNK_BUDGET,
+        build_tree: bool = True,
+        per_device: int | None = None,
+        memory_limit: int | None = DEFAULT_MEMORY_LIMIT,
+    ) -> None:
+        super().__init__(build_tree, memory_limit)
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+        self.chunk_budget = chunk_budget
+        self.per_device = per_device
+
+    def _stacks(self) -> int:
+        # стеки задач в работе и остатки папок у планировщика
+        return 2 * self.max_workers
+
+    def _make_stop(self):
+        """Флаг остановки задач, видимый воркерам пула."""
+        return threading.Event()
+
+    def _chunk_task(self, stop) -> Callable[..., ChunkResult]:
+        """Функция задачи: scan_chunk с проверкой флага stop."""
+        return partial(scan_chunk, stop=stop.is_set)
+
+    @abstractmethod
+    def _make_pool(self, stop) -> Executor:
+        ...
+
+    def run(
+        self,
+        folders: list[Path],
+        on_result: Callable[[ScanResult], None],
+        is_cancelled: Callable[[], bool],
+        index: DirIndex | None = None,
+        on_partial: Callable[[ScanResult], None] | None = None,
+        metrics: ScanMetrics | None = None,
+        device: int | None = None,
+        dirty: frozenset[str] | None = None,
+        top: TopN[str] | None = None,
+        file_types: bool = False,
+        files: FileCandidates | None = None,
+        rules: RuleMatcher | None = None,
+        scopes: list[FolderScope] | None = None,
+        on_checkpoint: Callable[[Path, list[DirRecord], list[str]], None] | None = None,
+        priority: ScanPriority | None = None,
+    ) -> None:
+        if not folders:
+            return
+
+        options = self._options(metrics, device, dirty, top, file_types, files, rules)
+        per_folder = self._per_folder(options, scopes, len(folders))
+        owners = _HardlinkOwners(folders, on_result, file_types)
+
+        # промежуточные итоги и деревья по номеру папки: заводятся при
+        # первой задаче папки и отпускаются после on_result
+        totals: list[ScanResult | None] = [None] * len(folders)
+        trees: list[DirTree | None] = [None] * len(folders)
+        outstanding = [0] * len(folders)
+        incomplete = [False] * len(folders)
+        # не розданный остаток обхода по номеру папки
+        overflow: list[list[DirStack]] = [[] for _ in folders]
+        futures: dict[Future, tuple[int, list[str]]] = {}
+        started = time.perf_counter()
+        # следующая папка, которую ещё не брали в работу (не в ленивом режиме)
+        admitted = 0
+
+        # устройство папки -> задачи в работе и ждущие своей очереди
+        devices = [scope.dev for scope in scopes] if scopes is not None else [device] * len(folders)
+        running: dict[int | None, int] = {}
+        waiting: dict[int | None, deque[tuple[int, list[str]]]] = {}
+        limit = self.per_device
+
+        # ленивый режим: задачи не уходят в пул сразу, а ждут здесь,
+        # и свободный воркер берёт самую нужную (с учётом per_device)
+        backlog = _Backlog(priority, folders) if priority is not None else None
+
+        if index is not None and not self.shares_memory:
+            # гонять весь индекс в каждый процесс дороже, чем перечитать
+            # каталоги; mtime всё равно собираем для следующего раза
+            index = {}
+
+        # каталоги, до которых обход не дошёл, по номеру папки (при отмене)
+        leftover: list[list[str]] = [[] for _ in folders]
+        saved = [0] * len(folders)
+        last_checkpoint = time.monotonic()
+        if not self.build_tree:
+            on_checkpoint = None
+
+        stop = self._make_stop()
+        task = self._chunk_task(stop)
+
+        with self._make_pool(stop) as pool:
+
+            def start(pos: int, dirs: list[str]) -> None:
+                if totals[pos] is None:
+                    totals[pos] = _empty_result(folders[pos])
+                    if self.build_tree:
+                        trees[pos] = DirTree(str(folders[pos]))
+
+                future = pool.submit(task, dirs, self.chunk_budget, per_folder[pos], index)
+                futures[future] = (pos, dirs)
+                running[devices[pos]] = running.get(devices[pos], 0) + 1
+
+            def submit(pos: int, dirs: list[str]) -> None:
+                outstanding[pos] += 1
+                if backlog is not None:
+                    backlog.push(pos, dirs)
+                    return
+
+                dev = devices[pos]
+                if limit is not None and running.get(dev, 0) >= limit:
+                    waiting.setdefault(dev, deque()).append((pos, dirs))
+                else:
+                    start(pos, dirs)
+
+            def idle(pos: int) -> int:
+                # сколько задач ещё можно запустить для диска этой папки
+                free = self.max_workers - len(futures)
+                if limit is not None:
+                    free = min(free, limit - running.get(devices[pos], 0))
+                return free
+
+            def disk_free(pos: int) -> bool:
+                return limit is None or running.get(devices[pos], 0) < limit
+
+            def fill() -> None:
+                while len(futures) < self.max_workers:
+                    item = backlog.pop(disk_free)
+                    if item is None:
+                        break
+                    start(*item)
+
+            def admit() -> None:
+                # ждущие в очередях дисков тоже в счёт: при занятых
+                # дисках иначе все папки сразу ушли бы в waiting
+                nonlocal admitted
+                ahead = SUBMIT_AHEAD * self.max_workers
+                while (
+                    admitted < len(folders)
+                    and len(futures) + sum(map(len, waiting.values())) < ahead
+                ):
+                    submit(admitted, [str(folders[admitted])])
+                    admitted += 1
+
+            def collect(future: Future) -> None:
+                pos, _ = futures.pop(future)
+                outstanding[pos] -= 1
+                running[devices[pos]] -= 1
+
+                chunk = future.result()
+                owners.add(pos, chunk)
+                if top is not None:
+                    top.merge(chunk.top_files)
+                if files is not None:
+                    files.merge(chunk.files)
+                _accumulate(totals[pos], chunk)
+
+                tree = trees[pos]
+                if tree is not None:
+                    tree.add_dirs(chunk.dirs)
+
+                if chunk.metrics is not None:
+                    metrics.merge(chunk.metrics)
+
+                stacks = overflow[pos]
+                if chunk.pending:
+                    stacks.append(chunk.pending)
+
+                if is_cancelled():
+                    # при отмене остаток стека не раздаём:
+                    # такая папка в результат не попадёт
+                    if stacks:
+                        incomplete[pos] = True
+                        for stack in stacks:
+                            leftover[pos].extend(stack)
+                            stack.close()
+                        stacks.clear()
+                else:
+                    for part in self._split(stacks, idle(pos)):
+                        submit(pos, part)
+
+                    # место на диске освободилось — запускаем ждущих
+                    queue = waiting.get(devices[pos])
+                    while queue and running[devices[pos]] < limit:
+                        start(*queue.popleft())
+
+                if outstanding[pos] and on_partial is not None:
+                    on_partial(_progress(totals[pos]))
+
+                if outstanding[pos] == 0 and not incomplete[pos]:
+                    if metrics is not None:
+                        metrics.folder_times[str(folders[pos])] = (
+                            time.perf_counter() - started
+                        )
+
+                    owners.done(pos, tree, totals[pos])
+                    trees[pos] = None
+                    totals[pos] = None
+
+            def remaining() -> list[list[str]]:
+                # каталоги в работе, в очередях дисков и в остатках
+                # по номеру папки
+                pending: list[list[str]] = [[] for _ in folders]
+                for pos, dirs in futures.values():
+                    pending[pos].extend(dirs)
+                for queue in [*waiting.values(), backlog or ()]:
+                    for pos, dirs in queue:
+                        pending[pos].extend(dirs)
+                for pos, stacks in enumerate(overflow):
+                    for stack in stacks:
+                        pending[pos].extend(stack)
+                return pending
+
+            if backlog is not None:
+                # приоритеты UI могут выбрать любую папку — в очереди все
+                for pos, folder in enumerate(folders):
+                    submit(pos, [str(folder)])
+                fill()
+            else:
+                admit()
+
+            while futures:
+                # с таймаутом: отмена не ждёт завершения долгой задачи
+                done, _ = wait(futures, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+                if not is_cancelled():
+                    if backlog is not None:
+                        fill()
+                    else:
+                        admit()
+
+                if is_cancelled():
+                    # задачи в работе останавливаются внутри каталога и
+                    # возвращают остаток стека, не начатые снимаем
+                    stop.set()
+                    for future, (pos, dirs) in list(futures.items()):
+                        if future.cancel():
+                            del futures[future]
+                            outstanding[pos] -= 1
+                            running[devices[pos]] -= 1
+                            incomplete[pos] = True
+                            leftover[pos].extend(dirs)
+                    for queue in [*waiting.values(), backlog or ()]:
+                        for pos, dirs in queue:
+                            incomplete[pos] = True
+                            leftover[pos].extend(dirs)
+                    waiting.clear()
+                    if backlog is not None:
+                        backlog.clear()
+                    for pos, stacks in enumerate(overflow):
+                        for stack in stacks:
+                            incomplete[pos] = True
+                            leftover[pos].extend(stack)
+                            stack.close()
+                        stacks.clear()
+
+                    while futures:
+                        done, _ = wait(futures)
+                        for future in done:
+                            collect(future)
+                    break
+
+                if (
+                    on_checkpoint is not None
+                    and time.monotonic() - last_checkpoint >= self.checkpoint_interval
+                ):
+                    pending = remaining()
+                    for pos, tree in enumerate(trees):
+                        # законченные и ещё не начатые папки не сохраняем
+                        if tree is not None and pending[pos] != [str(folders[pos])]:
+                            saved[pos] = _checkpoint(
+                                on_checkpoint, folders[pos], tree, saved[pos], pending[pos]
+                            )
+                    last_checkpoint = time.monotonic()
+
+        # и при отмене: готовые папки, ждущие предшественниц, отдаём
+        owners.flush()
+
+        if on_checkpoint is not None:
+            for pos, tree in enumerate(trees):
+                if tree is not None and incomplete[pos] and leftover[pos] != [str(folders[pos])]:
+                    _checkpoint(on_checkpoint, folders[pos], tree, saved[pos], leftover[pos])
+
+    def _split(self, stacks: list[DirStack], idle: int) -> list[list[str]]:
+        """
+        Снимает с вершины остатка папки работу для idle простаивающих
+        воркеров (хотя бы для одного), по chunk_budget каталогов на
+        задачу. Что не роздано, остаётся в stacks.
+        """
+        want = max(1, idle) * self.chunk_budget
+        pending: list[str] = []
+        while stacks and len(pending) < want:
+            pending.extend(stacks[-1].take(want - len(pending)))
+            if not stacks[-1]:
+                stacks.pop().close()
+
+        if not pending:
+            return []
+
+        parts = min(max(1, idle), len(pending))
+
+        # чередуем элементы, чтобы глубокие и мелкие ветки
+        # распределялись равномерно
+        return [pending[i::parts] for i in range(parts)]
+
+
+class ThreadPoolScanExecutor(_PoolScanExecutor):
+    """
+    Пул потоков: os.scandir и stat отпускают GIL, поэтому потоки
+    хорошо заполняют очередь ввода-вывода NVMe и сетевых дисков.
+    """
+
+    def _make_pool(self, stop) -> Executor:
+        return ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="scan",
+        )
+
+
+# флаг остановки в процессе пула (см. ProcessPoolScanExecutor)
+_process_stop = None
+
+
+def _init_process(stop) -> None:
+    global _process_stop
+    _process_stop = stop
+
+
+def _scan_chunk_in_process(
+    dirs: list[str],
+    budget: int | None,
+    options: ScanOptions,
+    index: DirIndex | None,
+) -> ChunkResult:
+    return scan_chunk(dirs, budget, options, index, _process_stop.is_set)
+
+
+class ProcessPoolScanExecutor(_PoolScanExecutor):
+    """
+    Пул процессов: для случаев, когда обход упирается в CPU
+    (очень много мелких файлов в кеше ОС).
+    """
+
+    shares_memory = False
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        chunk_budget: int = DEFAULT_CHUNK_BUDGET,
+        build_tree: bool = True,
+        per_device: int | None = None,
+        memory_limit: int | None = DEFAULT_MEMORY_LIMIT,
+    ) -> None:
+        super().__init__(
+            max_workers or os.cpu_count() or 1, chunk_budget, build_tree, per_device, memory_limit
+        )
+
+    def _make_stop(self):
+        return multiprocessing.Event()
+
+    def _chunk_task(self, stop) -> Callable[..., ChunkResult]:
+        # флаг уже передан процессам при запуске (_init_process)
+        return _scan_chunk_in_process
+
+    def _make_pool(self, stop) -> Executor:
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=_init_process,
+            initargs=(stop,),
+        )
+
+
+class AsyncioScanExecutor(ScanExecutor):
+    """
+    asyncio-движок для сетевых ФС (SMB/NFS) с большой задержкой.
+
+    Каждый каталог читается отдельной задачей в пуле потоков, а
+    concurrency корутин держат столько же листингов «в полёте».
+    Очередь каталогов ограничена queue_size: если она заполнена,
+    корутина обходит найденные подкаталоги сама (в глубину, своим
+    DirStack), так что память не растёт, а работа не теряется.
+
+    per_device — сколько листингов одного устройства может быть
+    «в полёте» одновременно (None — до concurrency).
+    """
+
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_ASYNC_CONCURRENCY,
+        queue_size: int = DEFAULT_ASYNC_QUEUE_SIZE,
+        build_tree: bool = True,
+        per_device: int | None = None,
+        memory_limit: int | None = DEFAULT_MEMORY_LIMIT,
+    ) -> None:
+        super().__init__(build_tree, memory_limit)
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.per_device = per_device
+
+    def _stacks(self) -> int:
+        # стек каждой корутины и стеки задач scan_chunk
+        return 2 * self.concurrency
+
+    def run(
+        self,
+        folders: list[Path],
+        on_result: Callable[[ScanResult], None],
+        is_cancelled: Callable[[], bool],
+        index: DirIndex | None = None,
+        on_partial: Callable[[ScanResult], None] | None = None,
+        metrics: ScanMetrics | None = None,
+        device: int | None = None,
+        dirty: frozenset[str] | None = None,
+        top: TopN[str] | None = None,
+        file_types: bool = False,
+        files: FileCandidates | None = None,
+        rules: RuleMatcher | None = None,
+        scopes: list[FolderScope] | None = None,
+        on_checkpoint: Callable[[Path, list[DirRecord], list[str]], None] | None = None,
+        priority: ScanPriority | None = None,
+    ) -> None:
+        if not folders:
+            return
+
+        asyncio.run(
+            self._run(
+                folders,
+                on_result,
+                is_cancelled,
+                index,
+                on_partial,
+                metrics,
+                device,
+                dirty,
+                top,
+                file_types,
+                files,
+                rules,
+                scopes,
+                on_checkpoint,
+                priority,
+            )
+        )
+
+    async def _run(
+        self,
+        folders: list[Path],
+        on_result: Callable[[ScanResult], None],
+        is_cancelled: Callable[[], bool],
+        index: DirIndex | None,
+        on_partial: Callable[[ScanResult], None] | None,
+        metrics: ScanMetrics | None,
+        device: int | None,
+        dirty: frozenset[str] | None,
+        top: TopN[str] | None,
+        file_types: bool,
+        files: FileCandidates | None,
+        rules: RuleMatcher | None,
+        scopes: list[FolderScope] | None,
+        on_checkpoint: Callable[[Path, list[DirRecord], list[str]], None] | None,
+        priority: ScanPriority | None,
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        # (приоритет, номер папки, каталог); в ленивом режиме очередь
+        # приоритетная — приоритет берётся на момент постановки в очередь
+        size = max(self.queue_size, len(folders))
+        queue: asyncio.Queue[tuple[int, int, str]] = (
+            asyncio.PriorityQueue(size) if priority is not None else asyncio.Queue(size)
+        )
+
+        def rank(pos: int) -> int:
+            return priority.level(folders[pos]) if priority is not None else 0
+
+        options = self._options(metrics, device, dirty, top, file_types, files, rules)
+        per_folder = self._per_folder(options, scopes, len(folders))
+        owners = _HardlinkOwners(folders, on_result, file_types)
+
+        # листинги в полёте по устройству папки
+        devices = [scope.dev for scope in scopes] if scopes is not None else [device] * len(folders)
+        limits = {
+            dev: asyncio.Semaphore(self.per_device or self.concurrency)
+            for dev in set(devices)
+        }
+
+        # промежуточные итоги и деревья по номеру папки: заводятся, когда
+        # папку берут из очереди, и отпускаются после on_result
+        totals: list[ScanResult | None] = [None] * len(folders)
+        trees: list[DirTree | None] = [None] * len(folders)
+        outstanding = [0] * len(folders)
+        incomplete = [False] * len(folders)
+        started = time.perf_counter()
+        stack_limit = self._stack_limit()
+
+        # где лежат каталоги, до которых обход не дошёл (для контрольных
+        # точек): очередь (не больше queue_size путей, не считая самих
+        # папок), стеки корутин и остатки, брошенные при отмене
+        queued: dict[str, int] = {}
+        walking: dict[int, tuple[int, DirStack, str | None]] = {}
+        leftover: dict[int, list[str]] = {}
+        saved = [0] * len(folders)
+        last_checkpoint = time.monotonic()
+        if not self.build_tree:
+            on_checkpoint = None
+
+        def remaining() -> list[list[str]]:
+            pending: list[list[str]] = [[] for _ in folders]
+            for path, pos in queued.items():
+                pending[pos].append(path)
+            for pos, dirs in leftover.items():
+                pending[pos].extend(dirs)
+            for pos, local, current in walking.values():
+                if current is not None:
+                    pending[pos].append(current)
+                pending[pos].extend(local)
+            return pending
+
+        def checkpoint(pending: list[list[str]], cancelled: bool) -> None:
+            for pos, tree in enumerate(trees):
+                # законченные и ещё не начатые папки не сохраняем
+                if tree is None or pending[pos] == [str(folders[pos])]:
+                    continue
+                if cancelled and not incomplete[pos]:
+                    continue
+                saved[pos] = _checkpoint(
+                    on_checkpoint, folders[pos], tree, saved[pos], pending[pos]
+                )
+
+        def finish(pos: int) -> None:
+            if metrics is not None:
+                metrics.folder_times[str(folders[pos])] = time.perf_counter() - started
+
+            tree = trees[pos]
+            trees[pos] = None
+
+            owners.done(pos, tree, totals[pos])
+            totals[pos] = None
+
+        async def consume(pool: ThreadPoolExecutor, me: int) -> None:
+            nonlocal last_checkpoint
+
+            while True:
+                _, pos, path = await queue.get()
+                del queued[path]
+                local = DirStack([path], stack_limit)
+
+                if totals[pos] is None:
+                    totals[pos] = _empty_result(folders[pos])
+                    if self.build_tree:
+                        trees[pos] = DirTree(str(folders[pos]))
+
+                while local:
+                    if is_cancelled():
+                        incomplete[pos] = True
+                        leftover.setdefault(pos, []).extend(local)
+                        local.close()
+                        break
+
+                    current = local.pop()
+                    walking[me] = (pos, local, current)
+                    async with limits[devices[pos]]:
+                        chunk = await loop.run_in_executor(
+                            pool, scan_chunk, [current], 1, per_folder[pos], index, is_cancelled
+                        )
+                    walking[me] = (pos, local, None)
+
+                    owners.add(pos, chunk)
+                    if top is not None:
+                        top.merge(chunk.top_files)
+                    if files is not None:
+                        files.merge(chunk.files)
+
+                    _accumulate(totals[pos], chunk)
+
+                    if trees[pos] is not None:
+                        trees[pos].add_dirs(chunk.dirs)
+                    if chunk.metrics is not None:
+                        metrics.merge(chunk.metrics)
+
+                    # остановленный каталог возвращается в chunk.pending
+                    found = chunk.pending
+                    while found:
+                        sub = found.pop()
+                        try:
+                            queue.put_nowait((rank(pos), pos, sub))
+                            queued[sub] = pos
+                            outstanding[pos] += 1
+                        except asyncio.QueueFull:
+                            # обратное давление: очередь полна — обходим
+                            # остальное сами, перекладывая блоки целиком
+                            found.append(sub)
+                            local.merge(found)
+                            break
+
+                    if on_partial is not None:
+                        on_partial(_progress(totals[pos]))
+
+                    if (
+                        on_checkpoint is not None
+                        and time.monotonic() - last_checkpoint >= self.checkpoint_interval
+                    ):
+                        last_checkpoint = time.monotonic()
+                        checkpoint(remaining(), cancelled=False)
+
+                walking.pop(me, None)
+
+                outstanding[pos] -= 1
+                if outstanding[pos] == 0 and not incomplete[pos]:
+                    finish(pos)
+
+                queue.task_done()
+
+        for pos, folder in enumerate(folders):
+            queue.put_nowait((rank(pos), pos, str(folder)))
+            queued[str(folder)] = pos
+            outstanding[pos] += 1
+
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency,
+            thread_name_prefix="scan-async",
+        ) as pool:
+            consumers = [
+                asyncio.create_task(consume(pool, me)) for me in range(self.concurrency)
+            ]
+
+            # корутина-потребитель завершается только с ошибкой —
+            # тогда не ждём очередь, а пробрасываем исключение
+            join = asyncio.create_task(queue.join())
+            done, _ = await asyncio.wait(
+                [join, *consumers],
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+
+            join.cancel()
+            for consumer in consumers:
+                consumer.cancel()
+            await asyncio.gather(join, *consumers, return_exceptions=True)
+
+            for task in done:
+                if task is not join:
+                    task.result()
+
+        # и при отмене: готовые папки, ждущие предшественниц, отдаём
+        owners.flush()
+
+        if on_checkpoint is not None:
+            checkpoint(remaining(), cancelled=True)
+
+
+_ENGINES: dict[str, type[ScanExecutor]] = {
+    "serial": SerialScanExecutor,
+    "thread": ThreadPoolScanExecutor,
+    "process": ProcessPoolScanExecutor,
+    "asyncio": AsyncioScanExecutor,
+}
+
+
+def create_executor(engine: str = DEFAULT_ENGINE, **kwargs) -> ScanExecutor:
+    """Создаёт исполнитель сканирования по имени движка."""
+    try:
+        cls = _ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Unknown scan engine: {engine}") from None
+
+    if cls is SerialScanExecutor:
+        # последовательный обход и так читает один диск за раз
+        kwargs.pop("per_device", None)
+
+    return cls(**kwargs)
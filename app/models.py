@@ -1,5 +1,14 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+from app.utils.dir_stack import DirStack
+
+if TYPE_CHECKING:
+    from app.analysis.file_types import TypeBreakdown
+    from app.core.metrics import ScanMetrics
+    from app.scan_rules import RuleMatcher
+    from app.tree import DirRecord, DirTree
 
 
 @dataclass
@@ -8,3 +17,111 @@ class ScanResult:
     size_bytes: int
     file_count: int
     error_count: int
+    # место на диске (st_blocks * 512); size_bytes — видимый размер
+    allocated_bytes: int = 0
+    # поддерево для перехода внутрь папки без повторного сканирования
+    tree: "DirTree | None" = field(default=None, compare=False, repr=False)
+    node: int = field(default=0, compare=False, repr=False)
+    # разбивка по типам файлов (только у папок верхнего уровня)
+    types: "TypeBreakdown | None" = field(default=None, compare=False, repr=False)
+
+
+@dataclass
+class ChunkResult:
+    """
+    Частичный результат обхода: итоги по уже прочитанным каталогам
+    и стек каталогов, до которых обход ещё не дошёл.
+    """
+    size_bytes: int
+    file_count: int
+    error_count: int
+    allocated_bytes: int = 0
+    pending: DirStack = field(default_factory=DirStack)
+    # собственные итоги каждого прочитанного каталога (если запрошены)
+    dirs: "list[DirRecord] | None" = None
+    # файлы с несколькими жёсткими ссылками: (каталог, ключ inode,
+    # размер, место на диске, ключ типа). В итоги они не входят, пока
+    # их не учтёт исполнитель — один раз на всё сканирование.
+    links: list[tuple[str, int, int, int, str]] = field(default_factory=list)
+    # min-куча (размер, путь) крупнейших файлов порции, если запрошена
+    top_files: list[tuple[int, str]] = field(default_factory=list)
+    # разбивка порции по типам файлов (если запрошена)
+    types: "TypeBreakdown | None" = None
+    # кандидаты в дубликаты (если запрошены): (путь, размер,
+    # ключ inode или 0, если он неизвестен, st_mtime_ns)
+    files: list[tuple[str, int, int, int]] = field(default_factory=list)
+    # счётчики вызовов (если запрошены)
+    metrics: "ScanMetrics | None" = None
+
+
+@dataclass(frozen=True)
+class ScanOptions:
+    """Настройки обхода, общие для всех порций одного сканирования."""
+    # собирать собственные итоги каталогов для DirTree
+    build_tree: bool = True
+    collect_metrics: bool = False
+    # st_dev корня: в каталоги на других устройствах не заходим.
+    # None — пересекать границы файловых систем
+    device: int | None = None
+    # каталоги, изменившиеся по данным наблюдателя ФС. Если задано,
+    # остальные каталоги из индекса берутся без stat
+    dirty: frozenset[str] | None = None
+    # сколько крупнейших файлов держать в ChunkResult.top_files (0 — не вести)
+    top_files: int = 0
+    # вести разбивку по типам файлов (ChunkResult.types)
+    file_types: bool = False
+    # собирать в ChunkResult.files файлы не меньше этого размера
+    # для поиска дубликатов (0 — не собирать)
+    duplicate_min_size: int = 0
+    # правила исключения (скомпилированные для корня сканирования)
+    rules: "RuleMatcher | None" = None
+    # сколько байт путей стек обхода держит в памяти, остальное
+    # сбрасывается во временный файл (0 — без ограничения)
+    stack_limit: int = 0
+    # корень сканирования: каталоги зависимостей (node_modules, .venv…)
+    # ищутся только в пути ниже него ("" — во всём пути)
+    root: str = ""
+
+
+@dataclass(frozen=True)
+class FolderScope:
+    """
+    Корень, которому принадлежит папка верхнего уровня, когда за одно
+    сканирование обходится несколько корней.
+    """
+    # устройство папки: по нему планировщик ограничивает число
+    # одновременных задач на диск
+    dev: int
+    # граница ФС для обхода (см. ScanOptions.device)
+    device: int | None = None
+    # правила исключения корня (см. ScanOptions.rules)
+    rules: "RuleMatcher | None" = None
+    # сам корень (см. ScanOptions.root)
+    root: str = ""
+
+
+# mtime записи индекса для каталога, который всегда перечитывается:
+# до него не дошёл прерванный обход (контрольная точка) или в нём
+# есть файлы с жёсткими ссылками
+PENDING_MTIME = -1.0
+
+
+@dataclass(slots=True)
+class DirIndexEntry:
+    """
+    Запись индекса каталогов из кеша: собственные итоги каталога
+    на момент, когда его mtime был равен mtime.
+    """
+    mtime: float
+    size_bytes: int
+    allocated_bytes: int
+    file_count: int
+    error_count: int
+    # собственная разбивка по типам файлов, закодированная
+    # (см. TypeBreakdown.encode)
+    types: str = ""
+    children: list[str] = field(default_factory=list)
+
+
+# полный путь каталога -> запись индекса
+DirIndex = dict[str, DirIndexEntry]
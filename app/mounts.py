@@ -0,0 +1,143 @@
+# app/mounts.py
+"""
+Список смонтированных файловых систем для сканирования «всех дисков».
+
+Linux — /proc/self/mounts без псевдо-ФС (proc, cgroup, tmpfs…),
+Windows — буквы дисков, macOS — корень и тома в /Volumes.
+Одна ФС, смонтированная в нескольких местах (bind mount), берётся
+один раз — по первой точке монтирования.
+
+Здесь же distinct_roots — отбор корней сканирования без вложенных
+(модуль лёгкий: окно вызывает её до первого кадра) — и mount_points
+для проверки границ ФС при сканировании по данным наблюдателя.
+"""
+import os
+import re
+import string
+import sys
+from pathlib import Path
+from typing import Iterable
+
+from app.core.logger import logger
+
+# типы ФС без файлов пользователя: их не сканируем
+PSEUDO_FILESYSTEMS = frozenset({
+    "autofs", "binfmt_misc", "bpf", "cgroup", "cgroup2", "configfs",
+    "debugfs", "devpts", "devtmpfs", "efivarfs", "fusectl", "hugetlbfs",
+    "mqueue", "nsfs", "overlay", "proc", "pstore", "ramfs", "rpc_pipefs",
+    "securityfs", "squashfs", "sysfs", "tmpfs", "tracefs",
+})
+
+_ESCAPE = re.compile(r"\\([0-7]{3})")
+
+
+def _unescape(field: str) -> str:
+    # пробелы, табуляции и "\\" в /proc/mounts записаны как \040, \011, \134
+    return _ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), field)
+
+
+def _mount_table() -> list[tuple[str, str]] | None:
+    """(точка монтирования, тип ФС) из /proc/self/mounts; None — не прочитать."""
+    try:
+        with open("/proc/self/mounts", encoding="utf-8", errors="surrogateescape") as f:
+            lines = f.readlines()
+    except OSError as e:
+        logger.warning(f"Cannot read mount table: {e}")
+        return None
+
+    table = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) >= 3:
+            table.append((_unescape(fields[1]), fields[2]))
+    return table
+
+
+def _linux_mounts() -> list[Path]:
+    # корень берём всегда, даже если это overlay контейнера
+    mounts = [Path("/")]
+    for path, fs_type in _mount_table() or ():
+        if fs_type not in PSEUDO_FILESYSTEMS:
+            mounts.append(Path(path))
+    return mounts
+
+
+def _windows_mounts() -> list[Path]:
+    if hasattr(os, "listdrives"):
+        return [Path(drive) for drive in os.listdrives()]
+    return [
+        Path(f"{letter}:\\")
+        for letter in string.ascii_uppercase
+        if os.path.exists(f"{letter}:\\")
+    ]
+
+
+def _mac_mounts() -> list[Path]:
+    mounts = [Path("/")]
+    try:
+        with os.scandir("/Volumes") as it:
+            mounts.extend(Path(entry.path) for entry in it if entry.is_dir())
+    except OSError:
+        pass
+    return mounts
+
+
+def list_mounts() -> list[Path]:
+    """Точки монтирования файловых систем с данными, по одной на устройство."""
+    if os.name == "nt":
+        mounts = _windows_mounts()
+    elif sys.platform == "darwin":
+        mounts = _mac_mounts()
+    else:
+        mounts = _linux_mounts()
+
+    result = []
+    devices: set[int] = set()
+    for mount in mounts:
+        try:
+            device = os.stat(mount).st_dev
+        except OSError:
+            # недоступный сетевой диск или пустой привод
+            continue
+        if device not in devices:
+            devices.add(device)
+            result.append(mount)
+    return result
+
+
+def mount_points() -> frozenset[str]:
+    """
+    Все точки монтирования, включая псевдо-ФС и повторы одного
+    устройства. Таблица есть только в Linux, в остальных системах
+    множество пустое.
+    """
+    if not sys.platform.startswith("linux"):
+        return frozenset()
+    return frozenset(path for path, _ in _mount_table() or ())
+
+
+def distinct_roots(roots: Iterable[Path], one_filesystem: bool = True) -> list[Path]:
+    """
+    Абсолютные корни без повторов и без вложенных: вложенный корень
+    и так обойдёт внешний. С one_filesystem вложенный корень на
+    другом устройстве остаётся — внешний обход в него не зайдёт
+    (так «все диски» не считают / и /home дважды).
+    """
+    unique = list(dict.fromkeys(Path(os.path.abspath(root)) for root in roots))
+
+    devices: dict[Path, int | None] = {}
+    for root in unique:
+        try:
+            devices[root] = os.stat(root).st_dev
+        except OSError:
+            devices[root] = None
+
+    def nested(root: Path) -> bool:
+        for parent in root.parents:
+            if parent not in devices:
+                continue
+            if not one_filesystem or devices[parent] == devices[root]:
+                return True
+        return False
+
+    return [root for root in unique if not nested(root)]
@@ -0,0 +1,67 @@
+# app/priority.py
+"""
+Приоритеты ленивого сканирования.
+
+Сначала показывается список папок верхнего уровня с оценками размеров
+(из прошлых сканирований), а потом папки обходятся не по порядку,
+а по тому, что сейчас нужно пользователю:
+
+    VISIBLE     строки, видимые в таблице;
+    FOCUSED     папки, в которые пользователь пытался перейти;
+    BACKGROUND  всё остальное.
+
+UI меняет приоритеты из своего потока по ходу сканирования, а
+планировщик исполнителя спрашивает level() всякий раз, когда выбирает
+следующую задачу. Уже запущенная задача не прерывается, но она
+ограничена бюджетом каталогов, так что освободившиеся воркеры быстро
+переходят к видимым строкам.
+"""
+import threading
+from pathlib import Path
+from typing import Iterable
+
+VISIBLE = 0
+FOCUSED = 1
+BACKGROUND = 2
+
+
+class ScanPriority:
+    """Текущие приоритеты папок (потокобезопасно, см. модуль)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._visible: frozenset[Path] = frozenset()
+        self._focused: set[Path] = set()
+        # растёт при каждом изменении: планировщик по нему понимает,
+        # что очередь пора пересортировать
+        self.version = 0
+
+    def set_visible(self, paths: Iterable[Path]) -> None:
+        """Строки, которые сейчас видны (заменяет прошлый набор)."""
+        visible = frozenset(paths)
+        with self._lock:
+            if visible == self._visible:
+                return
+            self._visible = visible
+            self.version += 1
+
+    def focus(self, path: Path) -> None:
+        """Пользователь раскрывает папку: её — сразу после видимых."""
+        with self._lock:
+            if path in self._focused:
+                return
+            self._focused.add(path)
+            self.version += 1
+
+    def level(self, path: Path) -> int:
+        """
+        Приоритет папки (меньше — раньше). Для нескольких корней
+        строка таблицы — корень, и его приоритет получают все его папки.
+        """
+        visible = self._visible
+        if path in visible or path.parent in visible:
+            return VISIBLE
+        focused = self._focused
+        if path in focused or path.parent in focused:
+            return FOCUSED
+        return BACKGROUND
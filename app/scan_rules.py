@@ -0,0 +1,251 @@
+# app/scan_rules.py
+"""
+Правила исключения при сканировании: шаблоны в стиле .gitignore,
+ограничение глубины и минимальный размер файла.
+
+Шаблоны (пути — относительно корня сканирования, через "/"):
+
+    .git            любой файл или каталог с таким именем
+    build/          только каталоги
+    /tmp            только в корне
+    docs/**/*.pdf   * и ? не переходят через "/", ** — любая глубина
+    !keep.log       вернуть то, что исключили шаблоны выше
+
+Побеждает последний подходящий шаблон. Исключённый каталог не
+открывается вовсе, поэтому, как и в git, файл внутри него вернуть
+шаблоном с "!" нельзя.
+
+Правила компилируются один раз: имена без подстановок и "/" (самый
+частый случай — .git, node_modules) проверяются поиском в frozenset,
+остальные шаблоны собираются в одно регулярное выражение. Путь
+записи строится, только если такие шаблоны есть.
+"""
+import hashlib
+import json
+import os
+import re
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from app.core.logger import logger
+
+DEFAULT_RULES_PATH = Path.cwd() / ".folder_size_rules.json"
+
+_IGNORE_CASE = os.name == "nt"
+
+
+@dataclass(frozen=True)
+class ScanRules:
+    """Правила сканирования одного корня (см. модуль)."""
+    exclude: tuple[str, ...] = ()
+    # каталоги глубже не читаются (папки верхнего уровня — глубина 1)
+    max_depth: int | None = None
+    # файлы меньше этого размера не учитываются
+    min_file_size: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.exclude) or self.max_depth is not None or self.min_file_size > 0
+
+    @property
+    def key(self) -> str:
+        """Отпечаток правил для ключей кеша ("" — без правил)."""
+        if not self:
+            return ""
+        text = json.dumps(asdict(self), sort_keys=True)
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+    def merged(self, other: "ScanRules") -> "ScanRules":
+        """Правила self, дополненные other (его ограничения важнее)."""
+        return ScanRules(
+            exclude=self.exclude + other.exclude,
+            max_depth=other.max_depth if other.max_depth is not None else self.max_depth,
+            min_file_size=other.min_file_size or self.min_file_size,
+        )
+
+    def compile(self, root: Path) -> "RuleMatcher | None":
+        """Матчер для обхода root; None, если правил нет."""
+        return RuleMatcher(self, root) if self else None
+
+
+def load_rules(root: Path, path: Path = DEFAULT_RULES_PATH) -> ScanRules:
+    """
+    Правила корня из файла настроек — JSON вида
+    {"<путь корня>": {"exclude": [...], "max_depth": 3, "min_file_size": 0}}.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return ScanRules()
+    except (OSError, ValueError) as e:
+        logger.warning(f"Cannot read scan rules {path}: {e}")
+        return ScanRules()
+
+    entry = config.get(os.path.abspath(root)) if isinstance(config, dict) else None
+    if not isinstance(entry, dict):
+        return ScanRules()
+
+    try:
+        return ScanRules(
+            exclude=tuple(str(p) for p in entry.get("exclude", ())),
+            max_depth=entry.get("max_depth"),
+            min_file_size=int(entry.get("min_file_size", 0)),
+        )
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Invalid scan rules for {root} in {path}: {e}")
+        return ScanRules()
+
+
+def _translate(pattern: str) -> str:
+    """Тело регулярного выражения для шаблона без "!", "/" в начале и конце."""
+    out = []
+    i = 0
+    n = len(pattern)
+
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end < 0:
+                out.append(re.escape(c))
+                i += 1
+                continue
+            body = pattern[i + 1 : end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+            i = end + 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+
+    return "".join(out)
+
+
+@dataclass
+class _Pattern:
+    negate: bool
+    dir_only: bool
+    # имя без подстановок и "/" или None
+    name: str | None
+    regex: str
+
+
+def _parse(line: str) -> _Pattern | None:
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+
+    anchored = "/" in line
+    line = line.lstrip("/")
+    if not line:
+        return None
+
+    if _IGNORE_CASE:
+        line = line.lower()
+
+    name = None if anchored or any(c in line for c in "*?[") else line
+    body = _translate(line)
+    regex = body if anchored else f"(?:.*/)?{body}"
+    return _Pattern(negate, dir_only, name, regex)
+
+
+@dataclass(eq=False)
+class RuleMatcher:
+    """
+    Скомпилированные правила для обхода одного корня.
+
+    Отбор в горячем цикле: excluded() на каждую запись каталога
+    и descend() один раз на каталог.
+    """
+    rules: ScanRules
+    root: Path
+    max_depth: int | None = field(init=False)
+    min_file_size: int = field(init=False)
+    # нужен ли excluded() путь записи (есть шаблоны с "/" или подстановками)
+    needs_path: bool = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.max_depth = self.rules.max_depth
+        self.min_file_size = self.rules.min_file_size
+
+        patterns = [p for p in map(_parse, self.rules.exclude) if p is not None]
+        self._ordered = any(p.negate for p in patterns)
+
+        # простые имена — в множества, остальное — в общие выражения
+        self._names = frozenset(p.name for p in patterns if p.name and not p.dir_only)
+        self._dir_names = frozenset(p.name for p in patterns if p.name and p.dir_only)
+
+        flags = re.IGNORECASE if _IGNORE_CASE else 0
+        rest = [p for p in patterns if p.name is None]
+        self._any = self._combine([p for p in rest if not p.dir_only], flags)
+        self._dirs = self._combine([p for p in rest if p.dir_only], flags)
+        self.needs_path = bool(rest) or self._ordered
+
+        # с "!" важен порядок: идём по шаблонам с конца
+        self._patterns = [
+            (p.negate, p.dir_only, re.compile(p.regex, flags)) for p in patterns
+        ]
+
+        self._prefix = len(os.path.join(str(self.root), ""))
+
+    @staticmethod
+    def _combine(patterns: list[_Pattern], flags: int) -> re.Pattern | None:
+        if not patterns:
+            return None
+        return re.compile("|".join(f"(?:{p.regex})" for p in patterns), flags)
+
+    def relative(self, path: str) -> str:
+        """Путь каталога относительно корня через "/" ("" для корня)."""
+        rel = path[self._prefix :]
+        return rel.replace(os.sep, "/") if os.sep != "/" else rel
+
+    def descend(self, rel: str) -> bool:
+        """Можно ли заходить в подкаталоги каталога rel (по глубине)."""
+        if self.max_depth is None:
+            return True
+        depth = rel.count("/") + 1 if rel else 0
+        return depth < self.max_depth
+
+    def excluded(self, rel: str, name: str, is_dir: bool) -> bool:
+        """Исключена ли запись name каталога rel."""
+        if _IGNORE_CASE:
+            name = name.lower()
+
+        if not self._ordered:
+            if name in self._names or (is_dir and name in self._dir_names):
+                return True
+            if not self.needs_path:
+                return False
+
+            path = f"{rel}/{name}" if rel else name
+            if self._any is not None and self._any.fullmatch(path):
+                return True
+            return is_dir and self._dirs is not None and self._dirs.fullmatch(path) is not None
+
+        path = f"{rel}/{name}" if rel else name
+        for negate, dir_only, regex in reversed(self._patterns):
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(path):
+                return not negate
+        return False
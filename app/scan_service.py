@@ -1,71 +1,462 @@
 # app/services/scan_service.py
+import os
+import stat
+import time
 from pathlib import Path
-from typing import Callable, List
+from typing import Callable, Iterable, List
 
-from app.models import ScanResult
-from app.scanner import scan_folder
+import numpy as np
+
+from app.analysis.duplicates import FileCandidates
+from app.analysis.file_types import merge_breakdowns
+from app.core.logger import logger
+from app.core.metrics import ScanMetrics
+from app.models import DirIndex, FolderScope, ScanResult
 from app.cache import ScanCache
+from app.executors import ScanExecutor, SerialScanExecutor
+from app.mounts import distinct_roots, mount_points
+from app.priority import ScanPriority
+from app.scan_rules import ScanRules
+from app.tree import DirRecord, DirTree
+from app.utils.top_n import TopN
+
+# готовые папки пишутся в кеш пачками по ходу сканирования:
+# не реже раза в SAVE_INTERVAL секунд или по SAVE_BATCH папок
+SAVE_INTERVAL = 2.0
+SAVE_BATCH = 64
+
+# сколько крупнейших файлов и каталогов запоминать за сканирование
+DEFAULT_TOP_N = 100
+
+
+def _cpu_time() -> float:
+    # с учётом завершившихся дочерних процессов (движок process)
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _empty_estimate(folder: Path) -> ScanResult:
+    return ScanResult(path=folder, size_bytes=0, file_count=0, error_count=0)
 
 
 class ScanService:
-    def __init__(self, cache: ScanCache) -> None:
+    def __init__(
+        self,
+        cache: ScanCache,
+        executor: ScanExecutor | None = None,
+        one_filesystem: bool = True,
+        top_n: int = DEFAULT_TOP_N,
+    ) -> None:
+        """
+        one_filesystem — не заходить в точки монтирования других
+        файловых систем (как du -x).
+        top_n — сколько крупнейших файлов собирать при обходе
+        (0 — не собирать).
+        """
         self.cache = cache
+        self.executor = executor or SerialScanExecutor()
+        self.one_filesystem = one_filesystem
+        self.top_n = top_n
+        # крупнейшие файлы последнего сканирования: (размер, путь)
+        self.largest_files: list[tuple[int, Path]] = []
+        # последнее сканирование перечитало все каталоги: без итогов
+        # из кеша и без пропуска каталогов по индексу mtime
+        self.full_walk = False
 
     def scan(
         self,
         root: Path,
         on_progress: Callable[[int], None],
         is_cancelled: Callable[[], bool],
-        force_rescan: bool = False
+        force_rescan: bool = False,
+        on_result: Callable[[ScanResult], None] | None = None,
+        on_partial: Callable[[ScanResult], None] | None = None,
+        metrics: ScanMetrics | None = None,
+        dirty: set[str] | None = None,
+        files: FileCandidates | None = None,
+        rules: ScanRules | None = None,
+        priority: ScanPriority | None = None,
+        keep_results: bool = True,
     ) -> List[ScanResult]:
+        """
+        on_result — вызывается для каждой готовой папки (из кеша или
+        после сканирования), как только она готова.
+        on_partial — промежуточные итоги папок, которые ещё сканируются.
+        metrics — если передан, заполняется счётчиками сканирования
+        и в конце пишется в лог.
+        dirty — каталоги, которые наблюдатель ФС видел изменёнными с
+        прошлого сканирования. Тогда перечитываются только они, а всё
+        остальное берётся из индекса каталогов без stat (точки
+        монтирования и каталоги с жёсткими ссылками проверяются всегда).
+        files — собрать кандидатов для поиска дубликатов (см.
+        find_duplicates). Для этого нужны все файлы, поэтому кеш
+        и индекс каталогов не используются, как при force_rescan.
+        rules — правила исключения корня. Исключённые папки верхнего
+        уровня не попадают в результат, записи кеша с другими
+        правилами не используются.
+        priority — ленивый режим: сразу после листинга корня каждая
+        папка, которую предстоит сканировать, приходит в on_partial
+        с оценкой из прошлого сканирования (или нулями), а дальше папки
+        обходятся в порядке priority (видимые строки — первыми).
+        keep_results=False — папки (с их деревьями) отдаются только в
+        on_result и не копятся до конца сканирования, возвращается пустой
+        список: так потоковый вывод не держит в памяти весь корень.
 
+        После сканирования в largest_files лежат top_n крупнейших
+        файлов корня по убыванию размера, а full_walk говорит, все ли
+        каталоги были перечитаны (снимок помечается полным).
+        """
+        return self._scan(
+            [root],
+            {root: rules} if rules is not None else {},
+            on_progress,
+            is_cancelled,
+            force_rescan,
+            on_result,
+            on_partial,
+            metrics,
+            dirty,
+            files,
+            priority,
+            keep_results,
+        )
 
-        try:
-            
-            subfolders = [p for p in root.iterdir() if p.is_dir()]
-            total = len(subfolders)
-        
-        except OSError as e:
-            # Логгирование сделает worker
-            raise RuntimeError(f"Cannot access root directory: {root}") from e
+    def scan_roots(
+        self,
+        roots: Iterable[Path],
+        on_progress: Callable[[int], None],
+        is_cancelled: Callable[[], bool],
+        force_rescan: bool = False,
+        on_result: Callable[[ScanResult], None] | None = None,
+        on_partial: Callable[[ScanResult], None] | None = None,
+        metrics: ScanMetrics | None = None,
+        dirty: set[str] | None = None,
+        files: FileCandidates | None = None,
+        rules: dict[Path, ScanRules] | None = None,
+        priority: ScanPriority | None = None,
+    ) -> List[ScanResult]:
+        """
+        Сканирует несколько корней за один запуск исполнителя: папки
+        верхнего уровня всех корней делят один пул (с ограничением задач
+        на устройство, см. per_device), один учёт жёстких ссылок и один
+        кеш. Параметры — как у scan(), rules — правила по корням.
+
+        Повторяющиеся и вложенные корни отбрасываются (distinct_roots),
+        недоступные пропускаются с предупреждением.
+
+        on_result получает папки верхнего уровня, как в scan(), а
+        возвращаются итоги самих корней с общими деревьями
+        (DirTree.combine) в порядке distinct_roots(roots).
+        """
+        roots = distinct_roots(roots, self.one_filesystem)
+        folders = self._scan(
+            roots,
+            rules or {},
+            on_progress,
+            is_cancelled,
+            force_rescan,
+            on_result,
+            on_partial,
+            metrics,
+            dirty,
+            files,
+            priority,
+            True,
+        )
+
+        by_root: dict[Path, list[ScanResult]] = {root: [] for root in roots}
+        for result in folders:
+            by_root[result.path.parent].append(result)
 
+        results = []
+        for root, children in by_root.items():
+            result = DirTree.combine(str(root), children).result(0)
+            result.types = merge_breakdowns(child.types for child in children)
+            results.append(result)
+        return results
+
+    def _scan(
+        self,
+        roots: list[Path],
+        rules: dict[Path, ScanRules],
+        on_progress: Callable[[int], None],
+        is_cancelled: Callable[[], bool],
+        force_rescan: bool,
+        on_result: Callable[[ScanResult], None] | None,
+        on_partial: Callable[[ScanResult], None] | None,
+        metrics: ScanMetrics | None,
+        dirty: set[str] | None,
+        files: FileCandidates | None,
+        priority: ScanPriority | None,
+        keep_results: bool,
+    ) -> List[ScanResult]:
+        """Папки верхнего уровня всех корней одним запуском исполнителя."""
+        self.full_walk = False
+        wall_started = time.perf_counter()
+        cpu_started = _cpu_time()
+
+        rules_keys: dict[Path, str] = {}
+        # папки верхнего уровня по корням и корень каждой папки
+        subfolders: dict[Path, list[Path]] = {}
+        scopes: dict[Path, FolderScope] = {}
+        failed: list[Path] = []
+
+        for root in roots:
+            root_rules = rules.get(root) or ScanRules()
+            matcher = root_rules.compile(root)
+            rules_keys[root] = root_rules.key
+
+            try:
+                # DirEntry.is_dir() берёт тип из d_type и делает stat
+                # только для symlink-ов, в отличие от Path.is_dir()
+                with os.scandir(root) as it:
+                    subfolders[root] = [
+                        Path(entry.path)
+                        for entry in it
+                        if entry.is_dir()
+                        and (
+                            matcher is None
+                            or (matcher.descend("") and not matcher.excluded("", entry.name, True))
+                        )
+                    ]
+                dev = os.stat(root).st_dev
+            except OSError as e:
+                if len(roots) == 1:
+                    # Логгирование сделает worker
+                    raise RuntimeError(f"Cannot access root directory: {root}") from e
+                logger.warning(f"Skipping inaccessible root {root}: {e}")
+                subfolders.pop(root, None)
+                failed.append(root)
+                continue
+
+            scopes[root] = FolderScope(
+                dev=dev,
+                device=dev if self.one_filesystem else None,
+                rules=matcher,
+                root=str(root),
+            )
+
+        if failed and len(failed) == len(roots):
+            raise RuntimeError(f"Cannot access root directory: {failed[0]}")
+
+        total = sum(len(folders) for folders in subfolders.values())
         if total == 0:
             on_progress(100)
             return []
-        
-        if force_rescan:
+
+        owner = {folder: root for root, folders in subfolders.items() for folder in folders}
+
+        if force_rescan or files is not None:
             cached = {}
+            index: DirIndex = {}
         else:
-            cached = self.cache.get_many(subfolders)
+            # папки с индексом каталогов пересканируются инкрементально:
+            # это дешевле полного обхода и точнее проверки mtime корня
+            index = {}
+            cached = {}
+            for root, folders in subfolders.items():
+                found = self.cache.get_dir_index(folders, rules_keys[root])
+                index.update(found)
+                cached.update(
+                    self.cache.get_many(
+                        [folder for folder in folders if str(folder) not in found],
+                        metrics,
+                        rules_keys[root],
+                    )
+                )
+
+        # без кеша и индекса (или при пустых) перечитывается всё
+        self.full_walk = not cached and not index
+
+        top = TopN[str](self.top_n) if self.top_n > 0 else None
 
         results: list[ScanResult] = []
-        scanned: list[ScanResult] = []
+        unsaved: list[ScanResult] = []
+        last_save = time.monotonic()
 
         done = 0
 
         # 1. Если есть кеш
         if cached:
             for path, result in cached.items():
-                results.append(result)
+                if keep_results:
+                    results.append(result)
+                if on_result is not None:
+                    on_result(result)
                 done += 1
                 on_progress(int(done / total * 100))
 
         # 2. сканируем остальное
-        for folder in subfolders:
-            if folder in cached:
-                continue
+        def save() -> None:
+            nonlocal unsaved, last_save
+            # сохраняем только реально отсканированное, с ключом правил
+            # корня каждой папки
+            by_root: dict[Path, list[ScanResult]] = {}
+            for result in unsaved:
+                by_root.setdefault(owner[result.path], []).append(result)
+            for root, items in by_root.items():
+                self.cache.save_many(items, rules_keys[root])
+                self.cache.save_dir_index(items, index, rules_keys[root])
+            unsaved = []
+            last_save = time.monotonic()
 
-            if is_cancelled():
-                break
-
-            result = scan_folder(folder)
-            results.append(result)
-            scanned.append(result)
+        def on_scanned(result: ScanResult) -> None:
+            nonlocal done
+            if keep_results:
+                results.append(result)
+            unsaved.append(result)
+            if on_result is not None:
+                on_result(result)
 
             done += 1
             on_progress(int(done / total * 100))
 
-        # 3. сохраняем только реально отсканированное
-        self.cache.save_many(scanned)
+            if len(unsaved) >= SAVE_BATCH or time.monotonic() - last_save >= SAVE_INTERVAL:
+                save()
+
+        # по порядку путей: в нём исполнитель сводит жёсткие ссылки,
+        # и папкам со ссылками не приходится ждать предшественниц
+        to_scan = sorted((folder for folder in owner if folder not in cached), key=str)
+
+        if priority is not None and on_partial is not None:
+            # первый экран — весь список папок с прошлыми размерами,
+            # не дожидаясь обхода
+            for root, folders in subfolders.items():
+                waiting = [folder for folder in folders if folder not in cached]
+                estimates = self.cache.get_estimates(waiting, rules_keys[root])
+                for folder in waiting:
+                    on_partial(estimates.get(folder) or _empty_estimate(folder))
+
+        def on_checkpoint(folder: Path, records: list[DirRecord], pending: list[str]) -> None:
+            # незаконченная папка: следующий запуск продолжит с этого места
+            self.cache.save_checkpoint(folder, records, pending, index, rules_keys[owner[folder]])
+
+        if dirty is not None and self.one_filesystem:
+            # каталоги индекса вне dirty берутся без stat, и смонтированная
+            # после прошлого сканирования ФС осталась бы незамеченной:
+            # точки монтирования проверяются всегда
+            dirty = dirty | mount_points()
+
+        try:
+            self.executor.run(
+                to_scan,
+                on_scanned,
+                is_cancelled,
+                index=index,
+                on_partial=on_partial,
+                metrics=metrics,
+                dirty=frozenset(dirty) if dirty is not None else None,
+                top=top,
+                file_types=True,
+                files=files,
+                scopes=[scopes[owner[folder]] for folder in to_scan],
+                on_checkpoint=on_checkpoint,
+                priority=priority,
+            )
+        finally:
+            # 3. остаток — и при отмене, и при падении обхода
+            save()
+
+        if top is not None:
+            self._collect_largest_files(
+                {root: rules_keys[root] for root in subfolders},
+                top,
+                force_rescan,
+                is_cancelled(),
+            )
+
+        if metrics is not None:
+            metrics.wall_time = time.perf_counter() - wall_started
+            metrics.cpu_time = _cpu_time() - cpu_started
+            metrics.log_summary()
 
         return results
+
+    def _collect_largest_files(
+        self,
+        roots: dict[Path, str],
+        top: TopN[str],
+        force_rescan: bool,
+        cancelled: bool,
+    ) -> None:
+        """
+        Дополняет кучу обхода сохранёнными файлами прошлых сканирований:
+        каталоги из кеша и индекса не читались, и их файлов в куче нет.
+        Сохранённые пути перепроверяются lstat — это top_n вызовов,
+        а не обход дерева. Берутся только файлы, собранные с теми же
+        правилами исключения (roots — корень -> ключ его правил).
+        """
+        if not force_rescan:
+            fresh = {path for _, path in top.heap}
+
+            for root, rules_key in roots.items():
+                for _, path in self.cache.get_top_files(root, rules_key):
+                    if path in fresh:
+                        continue
+                    try:
+                        st = os.lstat(path)
+                    except OSError:
+                        continue
+                    if stat.S_ISREG(st.st_mode):
+                        top.push(st.st_size, path)
+
+        items = top.items()
+        # после отмены куча неполная — не затираем ею сохранённую
+        if not cancelled:
+            # каждый файл — своему корню (самому глубокому из содержащих)
+            prefixes = sorted(
+                ((os.path.join(str(root), ""), root) for root in roots),
+                key=lambda item: len(item[0]),
+                reverse=True,
+            )
+            by_root: dict[Path, list[tuple[int, str]]] = {root: [] for root in roots}
+            for size, path in items:
+                for prefix, root in prefixes:
+                    if path.startswith(prefix):
+                        by_root[root].append((size, path))
+                        break
+
+            for root, root_items in by_root.items():
+                self.cache.save_top_files(root, root_items, roots[root])
+
+        self.largest_files = [(size, Path(path)) for size, path in items]
+
+    @staticmethod
+    def largest_dirs(results: Iterable[ScanResult], n: int = DEFAULT_TOP_N) -> list[ScanResult]:
+        """
+        n крупнейших каталогов любой глубины по итогам поддерева
+        (предки крупного каталога тоже попадают в список).
+        results — папки верхнего уровня: корни своих деревьев или
+        дети корня снимка.
+
+        Считается по колонкам деревьев результатов без обхода ФС:
+        argpartition по размерам каждого дерева, затем слияние.
+        """
+        top = TopN[tuple[int, int]](n)
+        trees: dict[int, tuple] = {}
+        roots: dict[int, set[int]] = {}
+
+        for r in results:
+            if r.tree is None:
+                top.push(r.size_bytes, (id(r), -1))
+                trees[id(r)] = (r, None)
+                continue
+            trees.setdefault(id(r.tree), (r, r.tree))
+            roots.setdefault(id(r.tree), set()).add(r.node)
+
+        for key, nodes in roots.items():
+            tree = trees[key][1]
+            sizes = np.frombuffer(tree.size, dtype=np.int64)
+            # узел 0 снимка — корень сканирования, а не папка результата
+            candidates = np.arange(len(sizes)) if 0 in nodes else np.arange(1, len(sizes))
+            if len(candidates) > n:
+                candidates = candidates[np.argpartition(-sizes[candidates], n - 1)[:n]]
+
+            for node in candidates.tolist():
+                top.push(int(sizes[node]), (key, node))
+
+        largest = []
+        for _, (key, node) in top.items():
+            owner, tree = trees[key]
+            largest.append(owner if tree is None else tree.result(node))
+        return largest
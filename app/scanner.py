@@ -1,9 +1,39 @@
+from array import array
 from pathlib import Path
+from typing import Callable
+from operator import itemgetter
+import heapq
 import os
-from app.models import ScanResult
+import time
+from app.analysis.file_types import TypeBreakdown, dependency_key, group_by_dir
+from app.core.metrics import ScanMetrics
+from app.utils.dir_stack import BLOCK_NAMES, DirStack
+from app.utils.inode_set import InodeSet, inode_key
+from app.models import PENDING_MTIME, ChunkResult, DirIndex, ScanOptions, ScanResult
+from app.scan_rules import RuleMatcher
+from app.tree import DirRecord, DirTree
 
 FILE_ATTRIBUTE_REPARSE_POINT = 0x400
 
+# junction / reparse point бывают только в Windows, и там DirEntry.stat()
+# берётся из данных FindNextFile без системного вызова. На POSIX
+# is_dir(follow_symlinks=False) по d_type уже отсекает symlink-и,
+# так что каталог проверять не нужно вовсе.
+_CHECK_REPARSE_POINTS = os.name == "nt"
+
+# В Windows нет st_blocks (и DirEntry не даёт st_ino/st_nlink) —
+# там место на диске считаем равным видимому размеру
+_HAS_BLOCKS = hasattr(os.stat_result, "st_blocks")
+
+DEFAULT_OPTIONS = ScanOptions()
+
+# как часто (в записях каталога) проверять остановку внутри одного каталога
+STOP_CHECK_ENTRIES = 1024
+
+# сколько файлов копится для разбивки по типам, прежде чем сгруппировать
+# их, не дожидаясь конца порции (16 байт на файл)
+TYPE_FLUSH_FILES = 1 << 16
+
 def _is_safe_dir(entry: os.DirEntry) -> bool:
     """
     Безопасно ли входить в каталог:
@@ -25,38 +55,585 @@ def _is_safe_dir(entry: os.DirEntry) -> bool:
         return False
 
 
-def scan_folder(path: Path) -> ScanResult:
+def _flush_types(
+    keys: list[str],
+    numbers: array,
+    sizes: array,
+    bounds: list[int],
+    slots: list[int],
+    records: list[DirRecord] | None,
+    types: TypeBreakdown,
+    start: int,
+) -> TypeBreakdown:
+    """
+    Группирует накопленные файлы разбивки по типам до конца порции:
+    итоги законченных каталогов уходят в records и types, а файлы
+    каталога, который ещё читается (с номера start), возвращаются
+    отдельной разбивкой. Массивы очищаются.
+    """
+    if start:
+        per_dir, listed = group_by_dir(
+            keys, numbers[:start], sizes[:start], bounds if records is not None else [start]
+        )
+        types.merge(listed)
+        if records is not None:
+            for slot, text in zip(slots, per_dir):
+                records[slot] = records[slot][:6] + (text,)
+
+    _, partial = group_by_dir(keys, numbers[start:], sizes[start:], [len(numbers) - start])
+    del numbers[:], sizes[:], bounds[:], slots[:]
+    return partial
+
+
+def scan_chunk(
+    dirs: list[str] | DirStack,
+    budget: int | None = None,
+    options: ScanOptions = DEFAULT_OPTIONS,
+    index: DirIndex | None = None,
+    stop: Callable[[], bool] | None = None,
+) -> ChunkResult:
+    """
+    Обходит каталоги из dirs (DFS), пока не исчерпан бюджет.
+
+    budget — сколько каталогов можно прочитать за один вызов
+    (None — без ограничений). Необойдённые каталоги возвращаются
+    в ChunkResult.pending, чтобы их можно было раздать другим воркерам.
+
+    Стек обхода — DirStack: пути в нём хранятся компактно, а сверх
+    options.stack_limit байт сбрасываются во временный файл. Если dirs
+    уже DirStack (pending прошлой порции), он продолжается на месте,
+    без копирования.
+
+    options.build_tree — сохранять собственные итоги каждого каталога
+    в ChunkResult.dirs (для построения DirTree).
+
+    options.collect_metrics — считать вызовы scandir/stat, их время
+    и ошибки по типам в ChunkResult.metrics. Без него счётчики
+    не ведутся, а горячий цикл не трогает таймер.
+
+    options.device — не заходить в каталоги на другом устройстве
+    (точки монтирования), как du -x.
+
+    options.top_files — держать в ChunkResult.top_files min-кучу этого
+    размера из крупнейших файлов (память не растёт с числом файлов).
+
+    options.file_types — вести разбивку по типам файлов: итог порции
+    в ChunkResult.types и собственная разбивка каждого каталога
+    в записях dirs. В горячем цикле только номер ключа и размер
+    дописываются в массивы, группировка — в конце порции или каждые
+    TYPE_FLUSH_FILES файлов, так что память не зависит от их числа.
+
+    options.duplicate_min_size — собирать в ChunkResult.files файлы
+    не меньше этого размера (кандидаты для поиска дубликатов).
+
+    options.rules — правила исключения: исключённые файлы не учитываются
+    (и для них не делается stat), исключённые каталоги и каталоги
+    глубже max_depth не открываются вовсе.
+
+    options.dirty — каталоги, которые наблюдатель ФС видел изменёнными.
+    Если задано, запись индекса любого другого каталога считается
+    актуальной без stat.
+
+    index — индекс каталогов из прошлого сканирования. Если он передан
+    (пусть и пустой), для каждого каталога запоминается mtime, а каталог,
+    чей mtime не изменился, не перечитывается: его собственные итоги
+    и список подкаталогов берутся из индекса. mtime каталога меняется
+    только при изменении его прямых записей, поэтому изменения
+    глубже обнаруживаются на своём уровне.
+
+    Для файла делается ровно один lstat (DirEntry.stat), из него
+    берутся размер, st_blocks и (st_dev, st_ino). Файлы с несколькими
+    жёсткими ссылками откладываются в ChunkResult.links — их учитывает
+    исполнитель (или apply_hardlinks), один раз на inode.
+
+    stop — кооперативная отмена: проверяется перед каждым каталогом
+    и каждые STOP_CHECK_ENTRIES записей внутри каталога. Недочитанный
+    каталог не учитывается (кроме уже попавших в top_files файлов)
+    и возвращается в pending вместе с остатком стека.
+    """
     total_size = 0
+    total_alloc = 0
     total_files = 0
     errors = 0
+    visited = 0
 
-    stack: list[Path] = [path]
+    stack = dirs if isinstance(dirs, DirStack) else DirStack(dirs, options.stack_limit)
+    records: list[DirRecord] | None = [] if options.build_tree else None
+    links: list[tuple[str, int, int, int, str]] = []
+    top: list[tuple[int, str]] = []
+    top_limit = options.top_files
+    files: list[tuple[str, int, int, int]] = []
+    duplicate_min = options.duplicate_min_size
+
+    collect_types = options.file_types
+    types = TypeBreakdown() if collect_types else None
+    type_ids: dict[str, int] = {}
+    type_keys: list[str] = []
+    type_numbers = array("q")
+    type_sizes = array("q")
+    # конец файлов каждого прочитанного каталога в type_numbers
+    # и номер его записи в records
+    type_bounds: list[int] = []
+    type_slots: list[int] = []
+    # начало файлов текущего каталога в type_numbers и уже
+    # сгруппированная часть его разбивки (если файлов очень много)
+    type_start = 0
+    carry: TypeBreakdown | None = None
+    dependency: str | None = None
+    key = ""
+
+    device = options.device
+    dirty = options.dirty
+
+    # каталоги зависимостей — только среди каталогов ниже корня: корень
+    # сам внутри ~/.cache или .venv не должен относить туда все файлы
+    root_prefix = len(os.path.join(options.root, "")) if options.root else 0
+
+    rules = options.rules
+    min_file_size = rules.min_file_size if rules is not None else 0
+    rel = ""
+    descend = True
+    need_dir_stat = index is not None or device is not None
+
+    metrics = ScanMetrics() if options.collect_metrics else None
+    clock = time.perf_counter
+
+    stopped = False
+    countdown = STOP_CHECK_ENTRIES
 
     while stack:
+        if budget is not None and visited >= budget:
+            break
+        if stop is not None and stop():
+            break
+
         current = stack.pop()
+        visited += 1
+
+        dir_size = 0
+        dir_alloc = 0
+        dir_files = 0
+        dir_errors = 0
+        mtime = 0.0
+
+        cached = index.get(current) if index is not None else None
+
+        if (
+            cached is not None
+            and dirty is not None
+            and current not in dirty
+            and cached.mtime != PENDING_MTIME
+        ):
+            # наблюдатель не видел изменений — проверять mtime не нужно
+            mtime = cached.mtime
+
+        elif need_dir_stat:
+            try:
+                if metrics is not None:
+                    started = clock()
+                    dir_stat = os.stat(current)
+                    metrics.stat_time += clock() - started
+                    metrics.stat_calls += 1
+                else:
+                    dir_stat = os.stat(current)
+            except OSError as oe:
+                errors += 1
+                if metrics is not None:
+                    metrics.errors_by_type[type(oe).__name__] += 1
+                continue
+
+            # точка монтирования другой ФС
+            if device is not None and dir_stat.st_dev != device:
+                continue
+
+            mtime = dir_stat.st_mtime
+            # грязный каталог перечитываем, даже если mtime прежний:
+            # запись в файл на месте mtime каталога не меняет
+            if cached is not None and (cached.mtime != mtime or dirty is not None):
+                cached = None
+
+        if cached is not None:
+            total_size += cached.size_bytes
+            total_alloc += cached.allocated_bytes
+            total_files += cached.file_count
+            errors += cached.error_count
+            stack.extend(cached.children)
+
+            if metrics is not None:
+                metrics.dirs_reused += 1
+
+            if types is not None:
+                types.add_encoded(cached.types)
+
+            if records is not None:
+                records.append(
+                    (
+                        current,
+                        cached.size_bytes,
+                        cached.allocated_bytes,
+                        cached.file_count,
+                        cached.error_count,
+                        mtime,
+                        cached.types,
+                    )
+                )
+            continue
+
+        if collect_types:
+            dependency = dependency_key(current[root_prefix:])
+
+        if rules is not None:
+            rel = rules.relative(current)
+            descend = rules.descend(rel)
+
+        if metrics is not None:
+            listed_at = clock()
+            stat_time = 0.0
+            stat_calls = 0
+
+        if stop is not None:
+            # что откатить, если каталог не дочитаем
+            marks = (len(links), len(files))
+
+        type_start = len(type_numbers)
+        links_start = len(links)
+        # подкаталоги уходят в стек блоками по BLOCK_NAMES имён
+        subdirs: list[str] = []
+        pushed = 0
 
         try:
             with os.scandir(current) as it:
                 for entry in it:
+                    if stop is not None:
+                        countdown -= 1
+                        if not countdown:
+                            countdown = STOP_CHECK_ENTRIES
+                            if stop():
+                                stopped = True
+                                break
                     try:
                         if entry.is_file(follow_symlinks=False):
-                            stat = entry.stat(follow_symlinks=False)
-                            total_size += stat.st_size
-                            total_files += 1
+                            if rules is not None and rules.excluded(rel, entry.name, False):
+                                continue
+
+                            if metrics is not None:
+                                started = clock()
+                                stat = entry.stat(follow_symlinks=False)
+                                stat_time += clock() - started
+                                stat_calls += 1
+                            else:
+                                stat = entry.stat(follow_symlinks=False)
+
+                            if stat.st_size < min_file_size:
+                                continue
+
+                            alloc = stat.st_blocks * 512 if _HAS_BLOCKS else stat.st_size
+
+                            # то же, что TopN.push, но без вызова в горячем цикле
+                            if top_limit:
+                                if len(top) < top_limit:
+                                    heapq.heappush(top, (stat.st_size, entry.path))
+                                elif stat.st_size > top[0][0]:
+                                    heapq.heapreplace(top, (stat.st_size, entry.path))
+
+                            # жёсткие ссылки тоже: их отсеет поиск дубликатов
+                            if duplicate_min and stat.st_size >= duplicate_min:
+                                files.append(
+                                    (
+                                        entry.path,
+                                        stat.st_size,
+                                        # DirEntry в Windows не знает st_ino
+                                        inode_key(stat.st_dev, stat.st_ino) if stat.st_ino else 0,
+                                        stat.st_mtime_ns,
+                                    )
+                                )
+
+                            if collect_types:
+                                if dependency is None:
+                                    name = entry.name
+                                    dot = name.rfind(".")
+                                    key = name[dot:].lower() if dot > 0 else ""
+                                else:
+                                    key = dependency
+
+                            if stat.st_nlink > 1:
+                                links.append(
+                                    (
+                                        current,
+                                        inode_key(stat.st_dev, stat.st_ino),
+                                        stat.st_size,
+                                        alloc,
+                                        key,
+                                    )
+                                )
+                                continue
+
+                            dir_size += stat.st_size
+                            dir_alloc += alloc
+                            dir_files += 1
+
+                            if collect_types:
+                                number = type_ids.get(key)
+                                if number is None:
+                                    number = type_ids[key] = len(type_keys)
+                                    type_keys.append(key)
+                                type_numbers.append(number)
+                                type_sizes.append(stat.st_size)
+
+                                if len(type_numbers) >= TYPE_FLUSH_FILES:
+                                    part = _flush_types(
+                                        type_keys,
+                                        type_numbers,
+                                        type_sizes,
+                                        type_bounds,
+                                        type_slots,
+                                        records,
+                                        types,
+                                        type_start,
+                                    )
+                                    if carry is None:
+                                        carry = part
+                                    else:
+                                        carry.merge(part)
+                                    type_start = 0
 
                         elif entry.is_dir(follow_symlinks=False):
-                            if _is_safe_dir(entry):
-                                stack.append(Path(entry.path))
+                            if rules is not None and (
+                                not descend or rules.excluded(rel, entry.name, True)
+                            ):
+                                continue
+                            if not _CHECK_REPARSE_POINTS or _is_safe_dir(entry):
+                                subdirs.append(entry.name)
+                                if len(subdirs) >= BLOCK_NAMES:
+                                    stack.push(current, subdirs)
+                                    pushed += len(subdirs)
+                                    subdirs = []
 
-                    except (PermissionError, FileNotFoundError):
-                        errors += 1
+                    except (PermissionError, FileNotFoundError) as e:
+                        dir_errors += 1
+                        if metrics is not None:
+                            metrics.errors_by_type[type(e).__name__] += 1
 
-        except (PermissionError, FileNotFoundError):
-            errors += 1
+        except (PermissionError, FileNotFoundError) as e:
+            dir_errors += 1
+            if metrics is not None:
+                metrics.errors_by_type[type(e).__name__] += 1
 
-    return ScanResult(
-        path=path,
+        if stopped:
+            n_links, n_files = marks
+            del links[n_links:], files[n_files:]
+            del type_numbers[type_start:], type_sizes[type_start:]
+            carry = None
+            stack.discard(pushed)
+            stack.append(current)
+            break
+
+        if subdirs:
+            stack.push(current, subdirs)
+
+        if metrics is not None:
+            metrics.dirs_listed += 1
+            metrics.files_visited += stat_calls
+            metrics.scandir_calls += 1
+            metrics.scandir_time += clock() - listed_at - stat_time
+            metrics.stat_calls += stat_calls
+            metrics.stat_time += stat_time
+
+        total_size += dir_size
+        total_alloc += dir_alloc
+        total_files += dir_files
+        errors += dir_errors
+
+        own_types = ""
+        if carry is not None:
+            # в каталоге больше TYPE_FLUSH_FILES файлов: его разбивка
+            # собрана по частям, досчитываем её сразу
+            carry.merge(
+                _flush_types(
+                    type_keys,
+                    type_numbers,
+                    type_sizes,
+                    type_bounds,
+                    type_slots,
+                    records,
+                    types,
+                    type_start,
+                )
+            )
+            types.merge(carry)
+            own_types = carry.encode() if records is not None else ""
+            carry = None
+        elif collect_types:
+            type_bounds.append(len(type_numbers))
+            if records is not None:
+                type_slots.append(len(records))
+
+        if records is not None:
+            if len(links) > links_start:
+                # каталог с жёсткими ссылками из индекса не берём: в его
+                # итоги входят только inode, которыми он владеет, а это
+                # зависит от остальных каталогов сканирования
+                mtime = PENDING_MTIME
+            records.append((current, dir_size, dir_alloc, dir_files, dir_errors, mtime, own_types))
+
+    if types is not None:
+        # без дерева разбивка по каталогам не нужна — одна группа
+        bounds = type_bounds if records is not None else [len(type_numbers)]
+        per_dir, listed = group_by_dir(type_keys, type_numbers, type_sizes, bounds)
+        types.merge(listed)
+
+        if records is not None:
+            for slot, text in zip(type_slots, per_dir):
+                records[slot] = records[slot][:6] + (text,)
+
+    return ChunkResult(
         size_bytes=total_size,
         file_count=total_files,
         error_count=errors,
-    )
\ No newline at end of file
+        allocated_bytes=total_alloc,
+        pending=stack,
+        dirs=records,
+        links=links,
+        top_files=top,
+        types=types,
+        files=files,
+        metrics=metrics,
+    )
+
+
+def scan_dir_own(
+    path: str,
+    rules: RuleMatcher | None = None,
+) -> tuple[int, int, int, int, list[str]]:
+    """
+    Собственные итоги одного каталога без обхода вглубь:
+    (байты, место на диске, файлы, ошибки, имена подкаталогов).
+    Жёсткие ссылки здесь считаются как обычные файлы.
+    rules — правила исключения корня, к которому относится path.
+    """
+    size = 0
+    alloc = 0
+    files = 0
+    errors = 0
+    subdirs: list[str] = []
+
+    rel = rules.relative(path) if rules is not None else ""
+    descend = rules is None or rules.descend(rel)
+
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        if rules is not None and rules.excluded(rel, entry.name, False):
+                            continue
+                        stat = entry.stat(follow_symlinks=False)
+                        if rules is not None and stat.st_size < rules.min_file_size:
+                            continue
+                        size += stat.st_size
+                        alloc += stat.st_blocks * 512 if _HAS_BLOCKS else stat.st_size
+                        files += 1
+
+                    elif entry.is_dir(follow_symlinks=False):
+                        if rules is not None and (
+                            not descend or rules.excluded(rel, entry.name, True)
+                        ):
+                            continue
+                        if not _CHECK_REPARSE_POINTS or _is_safe_dir(entry):
+                            subdirs.append(entry.name)
+
+                except (PermissionError, FileNotFoundError):
+                    errors += 1
+
+    except (PermissionError, FileNotFoundError):
+        errors += 1
+
+    return size, alloc, files, errors, subdirs
+
+
+def apply_hardlinks(chunk: ChunkResult, seen: InodeSet) -> None:
+    """
+    Учитывает отложенные жёсткие ссылки порции: каждый inode входит
+    в итоги один раз (в каталог с наименьшим путём среди ещё не
+    учтённых в seen), как у исполнителей при обходе одной папки.
+    """
+    if not chunk.links:
+        return
+
+    extra: dict[str, list[int]] = {}
+    extra_types: dict[str, TypeBreakdown] = {}
+
+    for dir_path, key, size, alloc, type_key in sorted(chunk.links, key=itemgetter(0)):
+        if not seen.add(key):
+            continue
+
+        acc = extra.get(dir_path)
+        if acc is None:
+            acc = extra[dir_path] = [0, 0, 0]
+        acc[0] += size
+        acc[1] += alloc
+        acc[2] += 1
+
+        chunk.size_bytes += size
+        chunk.allocated_bytes += alloc
+        chunk.file_count += 1
+
+        if chunk.types is not None:
+            chunk.types.add(type_key, size, 1)
+            extra_types.setdefault(dir_path, TypeBreakdown()).add(type_key, size, 1)
+
+    if chunk.dirs is not None and extra:
+        records = []
+        for record in chunk.dirs:
+            acc = extra.get(record[0])
+            if acc is not None:
+                path, size, alloc, files, errors, mtime, types = record
+                own = extra_types.get(path)
+                if own is not None:
+                    merged = TypeBreakdown.decode(types)
+                    merged.merge(own)
+                    types = merged.encode()
+                record = (
+                    path,
+                    size + acc[0],
+                    alloc + acc[1],
+                    files + acc[2],
+                    errors,
+                    mtime,
+                    types,
+                )
+            records.append(record)
+        chunk.dirs = records
+
+    chunk.links = []
+
+
+def scan_folder(
+    path: Path,
+    build_tree: bool = False,
+    index: DirIndex | None = None,
+    rules: RuleMatcher | None = None,
+    stop: Callable[[], bool] | None = None,
+) -> ScanResult:
+    """
+    Полный обход одной папки в текущем потоке.
+    rules — правила исключения корня, к которому относится path
+    (без них обходится всё).
+    stop — прервать обход (итоги тогда неполные, см. scan_chunk).
+    """
+    options = ScanOptions(build_tree=build_tree, rules=rules, root=str(path))
+    chunk = scan_chunk([str(path)], options=options, index=index, stop=stop)
+    apply_hardlinks(chunk, InodeSet())
+
+    if build_tree:
+        tree = DirTree(str(path))
+        tree.add_dirs(chunk.dirs)
+        return tree.finalize().result(0)
+
+    return ScanResult(
+        path=path,
+        size_bytes=chunk.size_bytes,
+        file_count=chunk.file_count,
+        error_count=chunk.error_count,
+        allocated_bytes=chunk.allocated_bytes,
+    )
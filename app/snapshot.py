@@ -0,0 +1,353 @@
+# app/snapshot.py
+"""
+Бинарный снимок полного дерева сканирования.
+
+Файл читается через mmap: колонки узлов — это memoryview прямо над
+отображённой памятью, имена декодируются только при обращении.
+Поэтому открытие снимка не зависит от числа узлов.
+
+Раскладка (little-endian, каждая секция выровнена на 8 байт):
+
+    заголовок       magic, version, flags, node_count, names_size, created
+    name_offsets    int64[node_count + 1]
+    names           utf-8 (os.fsencode) имена узлов подряд
+    parent          int64[node_count]
+    size            int64[node_count]
+    alloc           int64[node_count]
+    files           int64[node_count]
+    errors          int64[node_count]
+    mtime           float64[node_count]
+    child_offsets   int64[node_count + 1]
+    child_ids       int64[node_count - 1]
+    opaque_count    int64                   (с версии 2)
+    opaque          int64[opaque_count]
+
+Узел 0 — корень сканирования (полный путь), его дети — папки
+верхнего уровня. Итоги в узлах агрегированные, как у DirTree
+после finalize().
+
+opaque — узлы папок, записанных без дерева (итоги из кеша): дети у
+них в снимке не сохранены, хотя на диске могут быть. При сравнении
+снимков содержимое таких узлов считается неизвестным.
+
+Флаг FLAG_FULL — снимок записан после обхода, перечитавшего все
+каталоги. Без него часть каталогов взята из кеша или индекса по
+mtime, и рост файлов внутри неизменённых каталогов снимок не видит.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Sequence
+
+from app.models import ScanResult
+from app.tree import DirTree
+from app.utils.np import numpy
+
+if TYPE_CHECKING:
+    import numpy as np
+
+MAGIC = b"FSVSNAP\0"
+SNAPSHOT_VERSION = 2
+# версии, которые ещё читаются (в версии 1 нет списка opaque)
+_READABLE_VERSIONS = (1, 2)
+
+DEFAULT_SNAPSHOT_DIR = Path.cwd() / ".folder_size_snapshots"
+
+# сколько последних снимков хранить для одного корня
+MAX_SNAPSHOTS = 30
+
+SNAPSHOT_SUFFIX = ".fsvs"
+
+_HEADER = struct.Struct("<8sIIqqd")
+# флаги заголовка
+FLAG_FULL = 1
+# типы колонок в файле
+_INT = "<i8"
+_FLOAT = "<f8"
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def snapshot_dir(root: Path, directory: Path = DEFAULT_SNAPSHOT_DIR) -> Path:
+    """Каталог истории снимков для корня сканирования."""
+    key = hashlib.sha1(os.fsencode(os.path.abspath(root))).hexdigest()[:16]
+    return directory / key
+
+
+def list_snapshots(root: Path, directory: Path = DEFAULT_SNAPSHOT_DIR) -> list[Path]:
+    """Снимки корня от старого к новому (имя файла — время создания)."""
+    try:
+        return sorted(snapshot_dir(root, directory).glob(f"*{SNAPSHOT_SUFFIX}"))
+    except OSError:
+        return []
+
+
+def latest_snapshot(root: Path, directory: Path = DEFAULT_SNAPSHOT_DIR) -> Path | None:
+    snapshots = list_snapshots(root, directory)
+    return snapshots[-1] if snapshots else None
+
+
+def save_snapshot(
+    root: Path,
+    results: Iterable[ScanResult],
+    directory: Path = DEFAULT_SNAPSHOT_DIR,
+    keep: int = MAX_SNAPSHOTS,
+    full: bool = False,
+) -> Path:
+    """
+    Пишет новый снимок в историю корня и удаляет самые старые,
+    оставляя keep последних. full — все каталоги перечитаны при
+    этом обходе (см. ScanService.full_walk).
+    """
+    created = time.time()
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(created))
+    path = snapshot_dir(root, directory) / f"{stamp}-{int(created * 1000) % 1000:03d}{SNAPSHOT_SUFFIX}"
+
+    write_snapshot(path, root, results, created, full)
+
+    for old in list_snapshots(root, directory)[:-keep]:
+        try:
+            old.unlink()
+        except OSError:
+            # снимок может быть ещё открыт (mmap на Windows) — удалим в другой раз
+            pass
+
+    return path
+
+
+class _NameTable:
+    """Имена узлов из таблицы строк снимка, декодируются по запросу."""
+
+    __slots__ = ("offsets", "blob")
+
+    def __init__(self, offsets: memoryview, blob: memoryview) -> None:
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, node: int) -> str:
+        start = self.offsets[node]
+        end = self.offsets[node + 1]
+        return os.fsdecode(bytes(self.blob[start:end]))
+
+
+class Snapshot:
+    """Открытый снимок: дерево поверх mmap, время создания и вид обхода."""
+
+    def __init__(
+        self,
+        path: Path,
+        created: float,
+        tree: DirTree,
+        names: _NameTable,
+        buffer: mmap.mmap,
+        full: bool = False,
+        opaque: Sequence[int] = (),
+    ) -> None:
+        self.path = path
+        self.created = created
+        # полный обход или инкрементальный (кеш, индекс каталогов)
+        self.full = full
+        # узлы без сохранённого поддерева
+        self.opaque = opaque
+        self.tree = tree
+        # таблица строк как есть: смещения и байты имён подряд
+        self.name_offsets = names.offsets
+        self.name_bytes = names.blob
+        # колонки дерева ссылаются на эту память, пока жив снимок
+        self._buffer = buffer
+        self._levels: "list[np.ndarray] | None" = None
+
+    @property
+    def root(self) -> Path:
+        return Path(self.tree.names[0])
+
+    def results(self) -> list[ScanResult]:
+        """Папки верхнего уровня с поддеревьями для перехода внутрь."""
+        tree = self.tree
+        return [tree.result(node) for node in tree.children(0)]
+
+    def levels(self) -> "list[np.ndarray]":
+        """
+        Номера узлов по уровням дерева: [корень], его дети, внуки…
+        Дети всего уровня собираются одной операцией по спискам
+        детей; считается один раз на снимок.
+        """
+        if self._levels is not None:
+            return self._levels
+
+        np = numpy()
+
+        child_offsets, child_ids = self.tree.child_index()
+        offsets = np.frombuffer(child_offsets, dtype=np.int64)
+        child_ids = np.frombuffer(child_ids, dtype=np.int64)
+
+        frontier = np.zeros(1, dtype=np.int64)
+        levels = [frontier]
+
+        while True:
+            starts = offsets[frontier]
+            counts = offsets[frontier + 1] - starts
+            total = int(counts.sum())
+            if not total:
+                break
+
+            # позиции детей всех узлов фронта в child_ids подряд
+            shift = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+            frontier = child_ids[shift + np.arange(total)]
+            levels.append(frontier)
+
+        self._levels = levels
+        return levels
+
+
+# ---------------------------------------------------------------------------
+# ЗАПИСЬ
+# ---------------------------------------------------------------------------
+
+def write_snapshot(
+    path: Path,
+    root: Path,
+    results: Iterable[ScanResult],
+    created: float | None = None,
+    full: bool = False,
+) -> None:
+    """
+    Пишет снимок результатов сканирования root.
+    full — снимок полного обхода, ставит FLAG_FULL.
+    Папки без дерева (например, из кеша итогов) попадают в снимок
+    одним узлом без детей и в список opaque. Файл заменяется атомарно.
+    """
+    np = numpy()
+
+    results = list(results)
+    tree = DirTree.combine(str(root), results)
+    # дети корня идут в порядке results
+    opaque = np.array(
+        [node for node, r in zip(tree.children(0), results) if r.tree is None],
+        dtype=_INT,
+    )
+    count = len(tree)
+    names = tree.names
+    child_offsets, child_ids = tree.child_index()
+
+    encoded = [os.fsencode(name) for name in names]
+    name_offsets = np.zeros(count + 1, dtype=_INT)
+    np.cumsum(
+        np.fromiter(map(len, encoded), dtype=_INT, count=count),
+        out=name_offsets[1:],
+    )
+    blob = b"".join(encoded)
+
+    header = _HEADER.pack(
+        MAGIC,
+        SNAPSHOT_VERSION,
+        FLAG_FULL if full else 0,
+        count,
+        len(blob),
+        time.time() if created is None else created,
+    )
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(name_offsets.data)
+        f.write(blob)
+        f.write(b"\0" * (_align(len(blob)) - len(blob)))
+        for column in (tree.parent, tree.size, tree.alloc, tree.files, tree.errors):
+            f.write(np.frombuffer(column, dtype=np.int64).astype(_INT, copy=False).data)
+        f.write(np.frombuffer(tree.mtime, dtype=np.float64).astype(_FLOAT, copy=False).data)
+        for column in (child_offsets, child_ids):
+            f.write(np.frombuffer(column, dtype=np.int64).astype(_INT, copy=False).data)
+        f.write(struct.pack("<q", len(opaque)))
+        f.write(opaque.data)
+
+    os.replace(tmp, path)
+
+
+# ---------------------------------------------------------------------------
+# ЧТЕНИЕ
+# ---------------------------------------------------------------------------
+
+def open_snapshot(path: Path) -> Snapshot:
+    """
+    Открывает снимок через mmap без разбора узлов.
+    ValueError — если файл не снимок, другой версии или обрезан.
+    """
+    if sys.byteorder != "little":
+        raise ValueError("Snapshots are supported only on little-endian hosts")
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < _HEADER.size:
+            raise ValueError(f"Not a snapshot file: {path}")
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, flags, count, names_size, created = _HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError(f"Not a snapshot file: {path}")
+    if version not in _READABLE_VERSIONS:
+        raise ValueError(f"Unsupported snapshot version {version}: {path}")
+
+    expected = (
+        _HEADER.size
+        + 8 * (count + 1)
+        + _align(names_size)
+        + 8 * 6 * count
+        + 8 * (count + 1)
+        + 8 * max(count - 1, 0)
+        + (8 if version >= 2 else 0)
+    )
+    if len(buffer) < expected:
+        raise ValueError(f"Truncated snapshot: {path}")
+
+    view = memoryview(buffer)
+    offset = _HEADER.size
+
+    def take(size: int, fmt: str | None = None) -> memoryview:
+        nonlocal offset
+        chunk = view[offset : offset + size]
+        offset = _align(offset + size)
+        return chunk.cast(fmt) if fmt is not None else chunk
+
+    name_offsets = take(8 * (count + 1), "q")
+    blob = take(names_size)
+    parent = take(8 * count, "q")
+    size = take(8 * count, "q")
+    alloc = take(8 * count, "q")
+    files = take(8 * count, "q")
+    errors = take(8 * count, "q")
+    mtime = take(8 * count, "d")
+    child_offsets = take(8 * (count + 1), "q")
+    child_ids = take(8 * max(count - 1, 0), "q")
+
+    opaque: Sequence[int] = ()
+    if version >= 2:
+        (opaque_count,) = struct.unpack_from("<q", buffer, offset)
+        offset += 8
+        if len(buffer) < expected + 8 * opaque_count:
+            raise ValueError(f"Truncated snapshot: {path}")
+        opaque = take(8 * opaque_count, "q")
+
+    names = _NameTable(name_offsets, blob)
+    tree = DirTree.from_columns(
+        names,
+        parent,
+        size,
+        alloc,
+        files,
+        errors,
+        mtime,
+        child_offsets,
+        child_ids,
+    )
+    return Snapshot(path, created, tree, names, buffer, bool(flags & FLAG_FULL), opaque)
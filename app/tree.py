@@ -0,0 +1,428 @@
+# app/tree.py
+import os
+from array import array
+from itertools import islice
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator, Sequence
+
+from app.analysis.file_types import TypeBreakdown
+from app.models import ScanResult
+from app.utils.np import numpy
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# (путь каталога, байты файлов, место на диске, число файлов, ошибки,
+# mtime каталога, разбивка по типам) — только непосредственное
+# содержимое каталога, без подкаталогов. mtime равен 0.0, если при
+# обходе он не запрашивался; разбивка закодирована (TypeBreakdown.encode)
+# и пуста, если не собиралась.
+DirRecord = tuple[str, int, int, int, int, float, str]
+
+
+class DirTree:
+    """
+    Компактное дерево каталогов одного поддерева.
+
+    Узлы хранятся в параллельных массивах (array), а не объектами:
+    на узел уходит несколько десятков байт плюс строка имени.
+    Узел 0 — корень, у него в names лежит полный путь.
+
+    Пока дерево строится, размеры в узлах собственные (только файлы
+    самого каталога). После finalize() — агрегированные по поддереву,
+    и появляются списки детей в виде смещений (CSR).
+    """
+
+    __slots__ = (
+        "names",
+        "parent",
+        "size",
+        "alloc",
+        "files",
+        "errors",
+        "mtime",
+        "types",
+        "_index",
+        "_child_offsets",
+        "_child_ids",
+    )
+
+    def __init__(self, root: str) -> None:
+        self.names: list[str] = [root]
+        self.parent = array("q", [-1])
+        self.size = array("q", [0])
+        self.alloc = array("q", [0])
+        self.files = array("q", [0])
+        self.errors = array("q", [0])
+        self.mtime = array("d", [0.0])
+        # собственная разбивка по типам файлов (нужна индексу каталогов)
+        self.types: list[str] | None = [""]
+
+        # путь -> индекс узла, нужен только на время построения
+        self._index: dict[str, int] | None = {root: 0}
+        self._child_offsets: array | None = None
+        self._child_ids: array | None = None
+
+    @classmethod
+    def from_columns(
+        cls,
+        names: Sequence[str],
+        parent: Sequence[int],
+        size: Sequence[int],
+        alloc: Sequence[int],
+        files: Sequence[int],
+        errors: Sequence[int],
+        mtime: Sequence[float],
+        child_offsets: Sequence[int],
+        child_ids: Sequence[int],
+    ) -> "DirTree":
+        """
+        Готовое (finalized) дерево поверх уже посчитанных колонок.
+        Колонки могут быть memoryview над отображённым в память файлом
+        снимка — тогда данные не копируются и не разбираются.
+        """
+        tree = cls.__new__(cls)
+        tree.names = names
+        tree.parent = parent
+        tree.size = size
+        tree.alloc = alloc
+        tree.files = files
+        tree.errors = errors
+        tree.mtime = mtime
+        tree.types = None
+        tree._index = None
+        tree._child_offsets = child_offsets
+        tree._child_ids = child_ids
+        return tree
+
+    @classmethod
+    def combine(cls, root: str, results: Iterable[ScanResult]) -> "DirTree":
+        """
+        Готовое дерево с корнем root, дети которого — папки results.
+        Поддеревья папок копируются колонками целиком (через NumPy),
+        папки без дерева (например, из кеша итогов) становятся одним
+        узлом без детей. Итоги корня — сумма папок.
+        """
+        np = numpy()
+
+        names: list[str] = [root]
+        columns: dict[str, list[np.ndarray]] = {
+            key: [] for key in ("parent", "size", "alloc", "files", "errors", "mtime")
+        }
+        count = 1
+
+        def add(key: str, values) -> None:
+            columns[key].append(
+                np.asarray(values, dtype=np.float64 if key == "mtime" else np.int64)
+            )
+
+        for r in results:
+            tree = r.tree
+            if tree is None:
+                names.append(r.path.name)
+                add("parent", [0])
+                add("size", [r.size_bytes])
+                add("alloc", [r.allocated_bytes])
+                add("files", [r.file_count])
+                add("errors", [r.error_count])
+                add("mtime", [0.0])
+                count += 1
+                continue
+
+            nodes = tree.subtree(r.node)
+
+            # номера узлов поддерева -> номера в новом дереве
+            local = np.full(len(tree), -1, dtype=np.int64)
+            local[nodes] = np.arange(count, count + len(nodes), dtype=np.int64)
+
+            parent = local[np.frombuffer(tree.parent, dtype=np.int64)[nodes]]
+            parent[0] = 0
+
+            tree_names = tree.names
+            names.append(r.path.name)
+            names.extend(tree_names[node] for node in nodes[1:].tolist())
+
+            add("parent", parent)
+            for key in ("size", "alloc", "files", "errors"):
+                add(key, np.frombuffer(getattr(tree, key), dtype=np.int64)[nodes])
+            add("mtime", np.frombuffer(tree.mtime, dtype=np.float64)[nodes])
+            count += len(nodes)
+
+        def column(key: str, root_value) -> np.ndarray:
+            dtype = np.float64 if key == "mtime" else np.int64
+            return np.concatenate([np.array([root_value], dtype=dtype), *columns[key]])
+
+        parent = column("parent", -1)
+        totals = {key: column(key, 0) for key in ("size", "alloc", "files", "errors")}
+
+        # корень — сумма папок верхнего уровня
+        top = parent == 0
+        for values in totals.values():
+            values[0] = values[top].sum()
+
+        # списки детей (CSR): стабильная сортировка по родителю сохраняет
+        # порядок узлов внутри каждого родителя
+        child_parent = parent[1:]
+        child_offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(child_parent, minlength=count), out=child_offsets[1:])
+        child_ids = np.argsort(child_parent, kind="stable").astype(np.int64) + 1
+
+        return cls.from_columns(
+            names,
+            array("q", parent.tobytes()),
+            array("q", totals["size"].tobytes()),
+            array("q", totals["alloc"].tobytes()),
+            array("q", totals["files"].tobytes()),
+            array("q", totals["errors"].tobytes()),
+            array("d", column("mtime", 0.0).tobytes()),
+            array("q", child_offsets.tobytes()),
+            array("q", child_ids.tobytes()),
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    # ------------------------------------------------------------------
+    # ПОСТРОЕНИЕ
+    # ------------------------------------------------------------------
+
+    def add_dirs(self, records: Iterable[DirRecord]) -> None:
+        """
+        Добавляет каталоги в дерево.
+        Родитель каталога должен быть добавлен раньше самого каталога.
+        """
+        index = self._index
+        if index is None:
+            raise RuntimeError("DirTree is already finalized")
+
+        for path, size, alloc, files, errors, mtime, types in records:
+            node = index.get(path)
+
+            if node is None:
+                parent = index[os.path.dirname(path)]
+                node = len(self.names)
+                index[path] = node
+
+                self.names.append(os.path.basename(path))
+                self.parent.append(parent)
+                self.size.append(size)
+                self.alloc.append(alloc)
+                self.files.append(files)
+                self.errors.append(errors)
+                self.mtime.append(mtime)
+                self.types.append(types)
+            else:
+                self.size[node] += size
+                self.alloc[node] += alloc
+                self.files[node] += files
+                self.errors[node] += errors
+                self.mtime[node] = mtime
+                self.types[node] = types
+
+    def add_own(
+        self,
+        path: str,
+        size: int,
+        alloc: int,
+        files: int,
+        types: TypeBreakdown | None = None,
+    ) -> None:
+        """
+        Прибавляет к собственным итогам уже добавленного каталога
+        (пока дерево строится), не трогая его mtime. types сливается
+        с собственной разбивкой каталога.
+        """
+        index = self._index
+        if index is None:
+            raise RuntimeError("DirTree is already finalized")
+
+        node = index[path]
+        self.size[node] += size
+        self.alloc[node] += alloc
+        self.files[node] += files
+        if types is not None:
+            merged = TypeBreakdown.decode(self.types[node])
+            merged.merge(types)
+            self.types[node] = merged.encode()
+
+    def own_records(self, start: int = 0) -> Iterator[DirRecord]:
+        """
+        Собственные итоги узлов с номера start, пока дерево ещё строится
+        (для контрольных точек прерванного обхода).
+        """
+        index = self._index
+        if index is None:
+            raise RuntimeError("DirTree is already finalized")
+
+        # узлы нумеруются в порядке добавления, как и ключи index
+        for path, node in islice(index.items(), start, None):
+            yield (
+                path,
+                self.size[node],
+                self.alloc[node],
+                self.files[node],
+                self.errors[node],
+                self.mtime[node],
+                self.types[node],
+            )
+
+    def finalize(self) -> "DirTree":
+        """Суммирует размеры снизу вверх и строит списки детей."""
+        if self._index is None:
+            return self
+
+        count = len(self.names)
+        parent = self.parent
+
+        # родитель всегда добавлен раньше ребёнка, поэтому одного
+        # обратного прохода хватает для агрегации
+        counts = array("q", bytes(8 * (count + 1)))
+        for node in range(count - 1, 0, -1):
+            p = parent[node]
+            self.size[p] += self.size[node]
+            self.alloc[p] += self.alloc[node]
+            self.files[p] += self.files[node]
+            self.errors[p] += self.errors[node]
+            counts[p + 1] += 1
+
+        for node in range(count):
+            counts[node + 1] += counts[node]
+
+        ids = array("q", bytes(8 * max(count - 1, 0)))
+        fill = array("q", counts)
+        for node in range(1, count):
+            p = parent[node]
+            ids[fill[p]] = node
+            fill[p] += 1
+
+        self._child_offsets = counts
+        self._child_ids = ids
+        self._index = None
+        return self
+
+    # ------------------------------------------------------------------
+    # НАВИГАЦИЯ
+    # ------------------------------------------------------------------
+
+    def children(self, node: int) -> array:
+        if self._child_ids is None:
+            raise RuntimeError("DirTree is not finalized")
+
+        start = self._child_offsets[node]
+        end = self._child_offsets[node + 1]
+        return self._child_ids[start:end]
+
+    def child_index(self) -> tuple[Sequence[int], Sequence[int]]:
+        """Списки детей целиком: смещения по узлам и номера детей (CSR)."""
+        if self._child_ids is None:
+            raise RuntimeError("DirTree is not finalized")
+
+        return self._child_offsets, self._child_ids
+
+    def subtree(self, node: int) -> "np.ndarray":
+        """Узлы поддерева node по возрастанию (родитель раньше детей)."""
+        np = numpy()
+
+        if node == 0:
+            return np.arange(len(self), dtype=np.int64)
+
+        nodes = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            nodes.append(current)
+            stack.extend(self.children(current))
+
+        return np.sort(np.array(nodes, dtype=np.int64))
+
+    def path(self, node: int) -> Path:
+        parts = []
+        while node > 0:
+            parts.append(self.names[node])
+            node = self.parent[node]
+
+        return Path(self.names[0], *reversed(parts))
+
+    def paths(self) -> Iterator[tuple[int, str]]:
+        """
+        Узлы с полными путями в прямом порядке обхода (родитель раньше
+        детей). Пути собираются по ходу: в памяти одновременно только
+        пути текущей ветки, а не всего дерева.
+        """
+        if self._child_ids is None:
+            raise RuntimeError("DirTree is not finalized")
+
+        offsets = self._child_offsets
+        ids = self._child_ids
+
+        root = self.names[0]
+        yield 0, root
+
+        # [путь, следующий ребёнок, конец детей] для каждого узла ветки
+        branch = [[root, offsets[0], offsets[1]]]
+        while branch:
+            frame = branch[-1]
+            path, pos, end = frame
+            if pos == end:
+                branch.pop()
+                continue
+
+            frame[1] = pos + 1
+            child = ids[pos]
+            child_path = os.path.join(path, self.names[child])
+            yield child, child_path
+
+            if offsets[child] != offsets[child + 1]:
+                branch.append([child_path, offsets[child], offsets[child + 1]])
+
+    def records(self) -> Iterator[DirRecord]:
+        """
+        Собственные итоги каждого каталога (обратная операция к add_dirs),
+        в порядке paths(). Собственные значения получаются вычитанием
+        итогов детей.
+        """
+        offsets = self._child_offsets
+        ids = self._child_ids
+
+        for node, path in self.paths():
+            size = self.size[node]
+            alloc = self.alloc[node]
+            files = self.files[node]
+            errors = self.errors[node]
+
+            for child in ids[offsets[node] : offsets[node + 1]]:
+                size -= self.size[child]
+                alloc -= self.alloc[child]
+                files -= self.files[child]
+                errors -= self.errors[child]
+
+            types = self.types[node] if self.types is not None else ""
+            yield path, size, alloc, files, errors, self.mtime[node], types
+
+    def result(self, node: int) -> ScanResult:
+        """Итоги узла в виде ScanResult (с поддеревом для перехода внутрь)."""
+        return ScanResult(
+            path=self.path(node),
+            size_bytes=self.size[node],
+            file_count=self.files[node],
+            error_count=self.errors[node],
+            allocated_bytes=self.alloc[node],
+            tree=self,
+            node=node,
+        )
+
+    # ------------------------------------------------------------------
+    # ОБНОВЛЕНИЕ
+    # ------------------------------------------------------------------
+
+    def add_to_node(self, node: int, size: int, alloc: int, files: int, errors: int) -> None:
+        """
+        Прибавляет значения к узлу и всем его предкам, чтобы итоги
+        поддеревьев оставались согласованными (для готового дерева).
+        """
+        while node >= 0:
+            self.size[node] += size
+            self.alloc[node] += alloc
+            self.files[node] += files
+            self.errors[node] += errors
+            node = self.parent[node]
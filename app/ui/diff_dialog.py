@@ -0,0 +1,92 @@
+# app/ui/diff_dialog.py
+import time
+
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import (
+    QAbstractItemView,
+    QDialog,
+    QLabel,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+)
+
+from app.analysis.snapshot_diff import SnapshotDiff
+from app.ui.styles import table_styles
+from app.utils.size_format import format_size
+
+STATUS_TITLES = {
+    "grown": "Выросла",
+    "shrunk": "Уменьшилась",
+    "added": "Новая",
+    "removed": "Удалена",
+}
+
+SCAN_TITLES = {
+    True: "полное",
+    False: "инкрементальное",
+}
+
+HEADERS = ["", "Folder", "Before", "After", "Change", "Per hour"]
+
+
+def _signed_size(num_bytes: float) -> str:
+    sign = "+" if num_bytes > 0 else "-" if num_bytes < 0 else ""
+    return f"{sign}{format_size(abs(num_bytes))}"
+
+
+class DiffDialog(QDialog):
+    """Разница двух снимков: что выросло, уменьшилось, появилось и исчезло."""
+
+    def __init__(self, diff: SnapshotDiff, parent=None) -> None:
+        super().__init__(parent)
+
+        self.setWindowTitle("Изменения между сканированиями")
+        self.resize(800, 500)
+
+        layout = QVBoxLayout(self)
+
+        old = time.strftime("%Y-%m-%d %H:%M", time.localtime(diff.old_created))
+        new = time.strftime("%Y-%m-%d %H:%M", time.localtime(diff.new_created))
+        layout.addWidget(
+            QLabel(
+                f"{old} ({SCAN_TITLES[diff.old_full]}) → {new} ({SCAN_TITLES[diff.new_full]}): "
+                f"всего {_signed_size(diff.total_delta)}"
+            )
+        )
+        if not (diff.old_full and diff.new_full):
+            layout.addWidget(
+                QLabel(
+                    "Инкрементальный снимок: рост файлов внутри неизменённых каталогов "
+                    "не учтён. Для точного сравнения — «Пересканировать»."
+                )
+            )
+
+        entries = diff.entries()
+
+        table = QTableWidget(len(entries), len(HEADERS), self)
+        table.setHorizontalHeaderLabels(HEADERS)
+        table.horizontalHeader().setStretchLastSection(True)
+        table.verticalHeader().setVisible(False)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        table.setStyleSheet(table_styles)
+        table.setAlternatingRowColors(True)
+
+        for row, entry in enumerate(entries):
+            cells = [
+                STATUS_TITLES[entry.status],
+                str(entry.path),
+                format_size(entry.old_size),
+                format_size(entry.new_size),
+                _signed_size(entry.delta),
+                _signed_size(entry.rate),
+            ]
+            for column, text in enumerate(cells):
+                item = QTableWidgetItem(text)
+                if column >= 2:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                table.setItem(row, column, item)
+
+        table.resizeColumnsToContents()
+        layout.addWidget(table)
@@ -0,0 +1,73 @@
+# app/ui/largest_dialog.py
+from pathlib import Path
+
+from PySide6.QtCore import Qt, QUrl
+from PySide6.QtGui import QDesktopServices
+from PySide6.QtWidgets import (
+    QAbstractItemView,
+    QDialog,
+    QTableWidget,
+    QTableWidgetItem,
+    QTabWidget,
+    QVBoxLayout,
+)
+
+from app.models import ScanResult
+from app.ui.styles import table_styles
+from app.utils.size_format import format_size
+
+
+def _table(rows: list[tuple[str, int]], parent) -> QTableWidget:
+    table = QTableWidget(len(rows), 2, parent)
+    table.setHorizontalHeaderLabels(["Path", "Size"])
+    table.horizontalHeader().setStretchLastSection(True)
+    table.verticalHeader().setVisible(False)
+    table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+    table.setSelectionBehavior(QAbstractItemView.SelectRows)
+    table.setStyleSheet(table_styles)
+    table.setAlternatingRowColors(True)
+
+    for row, (path, size) in enumerate(rows):
+        table.setItem(row, 0, QTableWidgetItem(path))
+        item = QTableWidgetItem(format_size(size))
+        item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+        table.setItem(row, 1, item)
+
+    table.resizeColumnsToContents()
+    return table
+
+
+class LargestDialog(QDialog):
+    """
+    Крупнейшие файлы и каталоги последнего сканирования.
+    Двойной клик открывает папку, где лежит файл (или сам каталог).
+    """
+
+    def __init__(
+        self,
+        files: list[tuple[int, Path]],
+        dirs: list[ScanResult],
+        parent=None,
+    ) -> None:
+        super().__init__(parent)
+
+        self.setWindowTitle("Крупнейшие файлы и папки")
+        self.resize(800, 500)
+
+        layout = QVBoxLayout(self)
+        tabs = QTabWidget(self)
+
+        files_table = _table([(str(path), size) for size, path in files], self)
+        files_table.cellDoubleClicked.connect(
+            lambda row, _: self._open(files[row][1].parent)
+        )
+        tabs.addTab(files_table, f"Файлы ({len(files)})")
+
+        dirs_table = _table([(str(r.path), r.size_bytes) for r in dirs], self)
+        dirs_table.cellDoubleClicked.connect(lambda row, _: self._open(dirs[row].path))
+        tabs.addTab(dirs_table, f"Папки ({len(dirs)})")
+
+        layout.addWidget(tabs)
+
+    def _open(self, path: Path) -> None:
+        QDesktopServices.openUrl(QUrl.fromLocalFile(str(path)))
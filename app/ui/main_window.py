@@ -1,7 +1,8 @@
 import time
-from typing import List
+from dataclasses import replace
+from typing import TYPE_CHECKING, List
 from pathlib import Path
-from app.ui.custom_widgets import FilesTableItem, SizeTableItem
+from app.ui.results_model import COLUMN_ICON, COLUMN_SIZE, ResultsTableModel
 from app.ui.styles import table_styles
 from PySide6.QtWidgets import QPushButton
 
@@ -12,40 +13,122 @@ from PySide6.QtWidgets import (
     QMainWindow,
     QWidget,
     QVBoxLayout,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QProgressBar,
     QLabel,
 )
-from PySide6.QtCore import QThread, QTimer, Qt
+from PySide6.QtCore import QEvent, QModelIndex, QThread, QTimer, Qt, Signal
 
-from app.utils.size_format import format_bytes_grouped, format_size
-from app.worker import ScanWorker
+from app.cache import DEFAULT_CACHE_PATH, ScanCache
 from app.models import ScanResult
+from app.mounts import distinct_roots
+from app.snapshot import latest_snapshot, list_snapshots, open_snapshot
+from app.scan_rules import load_rules
+from app.core.logger import logger
+from app.utils.size_format import format_size
 from PySide6.QtGui import QDesktopServices
 from PySide6.QtCore import QUrl
 from PySide6.QtWidgets import QStyle
 
+# сканер, наблюдатель, анализ и диалоги импортируются при первом
+# использовании, уже после первого кадра
+if TYPE_CHECKING:
+    from app.analysis.duplicates import DuplicateReport
+    from app.watcher import DirWatcher, LiveTrees
+    from app.worker import ScanWorker
 
 
+# через сколько мс после прокрутки, сортировки или новых строк
+# сообщать сканеру, какие папки сейчас видны
+PRIORITY_DELAY_MS = 100
+
+# если первый кадр так и не нарисован (окно свёрнуто), сканирование
+# всё равно стартует через столько мс
+FIRST_PAINT_TIMEOUT_MS = 500
+
 
 class MainWindow(QMainWindow):
-    def __init__(self, root_path: Path) -> None:
+    # каталоги, изменившиеся на диске, и их перечитанные итоги
+    # (LiveTrees, пути, изменения) — из потока наблюдателя
+    dirty_detected = Signal(object)
+    # таблица нарисована в первый раз: после этого стартуют сканирование
+    # и чистка кеша
+    first_painted = Signal()
+
+    def __init__(
+        self,
+        roots: List[Path],
+        watch: bool = False,
+        per_device: int | None = None,
+    ) -> None:
+        """
+        roots — корни сканирования. Один корень показывается своими
+        папками верхнего уровня, несколько — строкой на корень
+        (с переходом внутрь), всё в одной таблице и с одним кешем.
+        watch — после сканирования следить за деревом (inotify или опрос)
+        и обновлять размеры на лету; «Обновить» перечитает только
+        изменившиеся каталоги. Выключено по умолчанию (--watch).
+        per_device — сколько задач сканирования одновременно читают
+        один диск (None — без ограничения).
+        """
         super().__init__()
         
 
         self.setWindowTitle("Folder Size Viewer")
         self.resize(600, 400)
 
-        self.root_path = root_path
+        self.roots = distinct_roots(roots)
+        self._multi = len(self.roots) > 1
+        self._per_device = per_device
+        # правила исключения корней из файла настроек
+        self._rules = {root: load_rules(root) for root in self.roots}
 
         self._thread: QThread | None = None
         self._worker: ScanWorker | None = None
+        # соединения сигналов текущего воркера с окном (снимаются при остановке)
+        self._connections: list[tuple] = []
+        # остановленные потоки, которые ещё доделывают работу, и
+        # сканирование, отложенное до их завершения
+        self._retired: list[QThread] = []
+        self._deferred: dict | None = None
+
+        # одно соединение с кешем на всё время жизни окна
+        self._cache = ScanCache(DEFAULT_CACHE_PATH)
         
         self._scan_started_at: float | None = None
+
+        # результаты верхнего уровня и путь навигации вглубь дерева
+        self._root_results: List[ScanResult] = []
+        self._nav_stack: List[ScanResult] = []
+        # крупнейшие файлы последнего сканирования (размер, путь)
+        self._largest_files: list[tuple[int, Path]] = []
+        # итог поиска дубликатов, пока не показан в строке статуса
+        self._duplicates: DuplicateReport | None = None
+        # несколько корней: итоги корней по уже готовым папкам
+        self._running: dict[Path, ScanResult] = {}
+
+        self._watch = watch
+        self._watcher: DirWatcher | None = None
+        self._live: LiveTrees | None = None
+        # изменившиеся каталоги с последнего сканирования
+        self._dirty: set[str] = set()
+        self.dirty_detected.connect(self._on_dirty)
+
+        # видимые строки пересчитываются не на каждый пиксель прокрутки
+        self._priority_timer = QTimer(self)
+        self._priority_timer.setSingleShot(True)
+        self._priority_timer.setInterval(PRIORITY_DELAY_MS)
+        self._priority_timer.timeout.connect(self._update_priority)
         
         self._build_ui()
-        self._start_scan()
+        self._load_previous()
+
+        # первый кадр — сразу из кеша или снимка, а сканирование
+        # (и проверка кеша) начинается, когда он уже на экране
+        self._painted = False
+        self.first_painted.connect(self._on_first_painted)
+        self.table.viewport().installEventFilter(self)
+        QTimer.singleShot(FIRST_PAINT_TIMEOUT_MS, self._mark_painted)
         
         
 
@@ -54,7 +137,7 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(central)
         layout = QVBoxLayout(central)
         
-        self.path_label = QLabel(str(self.root_path))
+        self.path_label = QLabel(self._roots_label())
         layout.addWidget(self.path_label)
         
         self.info_label = QLabel('')
@@ -70,18 +153,60 @@ class MainWindow(QMainWindow):
         
         layout.addWidget(self.rescan_button)
 
+        self.quick_rescan_button = QPushButton("Быстро: только изменённые каталоги")
+        self.quick_rescan_button.setToolTip(
+            "Перечитывает каталоги с новым mtime и продолжает прерванный обход.\n"
+            "Рост файлов без изменения каталога (дозапись, логи) не заметит."
+        )
+        self.quick_rescan_button.clicked.connect(self._on_quick_rescan)
+
+        layout.addWidget(self.quick_rescan_button)
+
+        self.refresh_button = QPushButton("Обновить")
+        self.refresh_button.setEnabled(False)
+        self.refresh_button.clicked.connect(self._on_refresh)
+
+        layout.addWidget(self.refresh_button)
+
+        self.up_button = QPushButton("Вверх")
+        self.up_button.setEnabled(False)
+        self.up_button.clicked.connect(self._on_navigate_up)
+
+        layout.addWidget(self.up_button)
+
+        self.diff_button = QPushButton("Изменения")
+        self.diff_button.clicked.connect(self._on_show_diff)
+        self._update_diff_button()
+
+        layout.addWidget(self.diff_button)
+
+        self.largest_button = QPushButton("Крупнейшие")
+        self.largest_button.setEnabled(False)
+        self.largest_button.clicked.connect(self._on_show_largest)
 
-        self.table = QTableWidget(0, 4)
-        self.table.setHorizontalHeaderLabels(["", "Folder", "Size", "Files"])
+        layout.addWidget(self.largest_button)
+
+        self.duplicates_button = QPushButton("Найти дубликаты")
+        self.duplicates_button.clicked.connect(self._on_find_duplicates)
+
+        layout.addWidget(self.duplicates_button)
+
+
+        self.model = ResultsTableModel(self.style().standardIcon(QStyle.SP_DirIcon), self)
+
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
         self.table.setColumnWidth(0, 32)
         
         self.table.setMouseTracking(True)
         self.table.viewport().setMouseTracking(True)
-        self.table.cellEntered.connect(self._on_cell_hovered)
+        self.table.entered.connect(self._on_cell_hovered)
 
         
-        self.table.cellClicked.connect(self._on_folder_cell_clicked)
+        self.table.clicked.connect(self._on_folder_cell_clicked)
+        self.table.doubleClicked.connect(self._on_folder_cell_double_clicked)
         
         # Отключаем редактирование
         self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
@@ -89,38 +214,153 @@ class MainWindow(QMainWindow):
         
         self.table.setStyleSheet(table_styles)
         self.table.setAlternatingRowColors(True)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setSelectionMode(QTableView.SingleSelection)
+
+        # сортировку делает модель (argsort по колонке)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(COLUMN_SIZE, Qt.DescendingOrder)
+
+        # ленивое сканирование: видимые строки обходятся первыми
+        self.table.verticalScrollBar().valueChanged.connect(self._schedule_priority)
+        self.model.layoutChanged.connect(self._schedule_priority)
+        self.model.rowsInserted.connect(self._schedule_priority)
+        self.model.modelReset.connect(self._schedule_priority)
         
         layout.addWidget(self.table)
         
         
 
-    def _start_scan(self, force_rescan: bool = False) -> None:
+    def _load_previous(self) -> None:
+        """
+        Сразу показывает прошлые итоги, пока идёт сканирование: строки
+        из кеша (без stat — актуальность проверит сканирование) или
+        последний снимок (через mmap, с деревьями для перехода внутрь),
+        смотря что свежее. Свежие строки заменят их по пути.
+        """
+        results: List[ScanResult] = []
+        taken: list[float] = []
+
+        for root in self.roots:
+            cached, cached_at = self._cache.get_children(root, self._rules[root].key)
+
+            snapshot = None
+            path = latest_snapshot(root)
+            if path is not None:
+                try:
+                    snapshot = open_snapshot(path)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Cannot open snapshot {path}: {e}")
+
+            if snapshot is not None and snapshot.created >= cached_at:
+                # у нескольких корней строка — сам корень снимка
+                results.extend([snapshot.tree.result(0)] if self._multi else snapshot.results())
+                taken.append(snapshot.created)
+            elif cached:
+                results.extend([self._sum_root(root, cached)] if self._multi else cached)
+                taken.append(cached_at)
+
+        if not taken:
+            return
+
+        self._root_results = results
+        self._populate_table(self._root_results)
+
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(min(taken)))
+        self.info_label.setText(f"Показаны результаты от {when}, идёт обновление…")
+
+    @staticmethod
+    def _sum_root(root: Path, children: List[ScanResult]) -> ScanResult:
+        return ScanResult(
+            path=root,
+            size_bytes=sum(r.size_bytes for r in children),
+            file_count=sum(r.file_count for r in children),
+            error_count=sum(r.error_count for r in children),
+            allocated_bytes=sum(r.allocated_bytes for r in children),
+        )
+
+    def eventFilter(self, obj, event) -> bool:
+        if event.type() == QEvent.Paint and obj is self.table.viewport():
+            # сигнал — после того, как кадр дорисуется
+            QTimer.singleShot(0, self._mark_painted)
+        return super().eventFilter(obj, event)
+
+    def _mark_painted(self) -> None:
+        if self._painted:
+            return
+        self._painted = True
+        self.table.viewport().removeEventFilter(self)
+        self.first_painted.emit()
+
+    def _on_first_painted(self) -> None:
+        self._cache.expire_in_background()
+        # «Пересканировать» могли нажать ещё до первого кадра
+        if self._thread is None:
+            self._start_scan()
+
+    def _start_scan(
+        self,
+        force_rescan: bool = False,
+        dirty: set[str] | None = None,
+        duplicates: bool = False,
+    ) -> None:
+        self._stop_watcher()
+
+        if self._retired:
+            # прошлый обход ещё пишет контрольную точку — новый стартует
+            # после него и продолжит с этого места
+            self._deferred = dict(force_rescan=force_rescan, dirty=dirty, duplicates=duplicates)
+            self.rescan_button.setEnabled(False)
+            self.rescan_button.setText("Остановка…")
+            self.quick_rescan_button.setEnabled(False)
+            return
+
         self._scan_started_at = time.perf_counter()
         
-        self.info_label.setText("")
+        if not self._root_results:
+            self.info_label.setText("")
         
         self.rescan_button.setEnabled(False)
         self.rescan_button.setText("Сканирование…")
+        self.quick_rescan_button.setEnabled(False)
+        self.duplicates_button.setEnabled(False)
+        self._running = {}
         
+        from app.worker import ScanWorker
+
         self._thread = QThread(self)
-        self._worker = ScanWorker(self.root_path, force_rescan=force_rescan)
+        self._worker = ScanWorker(
+            self.roots,
+            force_rescan=force_rescan,
+            cache=self._cache,
+            dirty=dirty,
+            duplicates=duplicates,
+            rules=self._rules,
+            per_device=self._per_device,
+            lazy=True,
+        )
 
         self._worker.moveToThread(self._thread)
 
         # сигналы
         self._thread.started.connect(self._worker.run)
-        self._worker.progress.connect(self._on_progress)
-        self._worker.finished.connect(self._on_finished)
-        self._worker.error.connect(self._on_error)
-
-        # корректное завершение
+        self._connections = [
+            (self._worker.progress, self._on_progress),
+            (self._worker.results_ready, self._on_results_ready),
+            (self._worker.partial, self._on_partial),
+            (self._worker.largest_ready, self._on_largest_ready),
+            (self._worker.anomalies_ready, self.model.set_anomalies),
+            (self._worker.duplicates_ready, self._on_duplicates_ready),
+            (self._worker.finished, self._on_finished),
+            (self._worker.error, self._on_error),
+        ]
+        for signal, slot in self._connections:
+            signal.connect(slot)
+
+        # корректное завершение (и после ошибки, и после отмены)
         self._worker.finished.connect(self._thread.quit)
-        self._worker.finished.connect(self._worker.deleteLater)
-        
-        
-        # self._thread.finished.connect(self._thread.deleteLater)
+        self._worker.error.connect(self._thread.quit)
+        self._thread.finished.connect(self._worker.deleteLater)
 
         self._thread.start()
 
@@ -129,15 +369,71 @@ class MainWindow(QMainWindow):
     def _on_progress(self, percent: int) -> None:
         self.progress_bar.setValue(percent)
 
+    def _on_results_ready(self, results: List[ScanResult]) -> None:
+        if self._multi:
+            # строки — корни: их итоги растут по мере готовности папок
+            results = self._add_to_roots(results)
+            self._root_results = [
+                r for r in self._root_results if r.path not in self._running
+            ] + list(self._running.values())
+        else:
+            self._root_results.extend(results)
+
+        # пока пользователь внутри папки, верхний уровень не трогаем
+        if not self._nav_stack:
+            self.model.upsert(results, in_progress=self._multi)
+
+    def _on_partial(self, results: List[ScanResult]) -> None:
+        # у нескольких корней промежуточные итоги папок не показываем:
+        # строка корня и так обновляется с каждой готовой папкой
+        if not self._nav_stack and not self._multi:
+            self.model.upsert(results, in_progress=True)
+
+    def _add_to_roots(self, results: List[ScanResult]) -> List[ScanResult]:
+        """Прибавляет готовые папки к итогам их корней, возвращает копии корней."""
+        touched: dict[Path, ScanResult] = {}
+        for result in results:
+            root = result.path.parent
+            total = self._running.get(root)
+            if total is None:
+                total = self._running[root] = ScanResult(
+                    path=root, size_bytes=0, file_count=0, error_count=0
+                )
+
+            total.size_bytes += result.size_bytes
+            total.allocated_bytes += result.allocated_bytes
+            total.file_count += result.file_count
+            total.error_count += result.error_count
+            touched[root] = total
+
+        return [replace(total) for total in touched.values()]
+
+    def _on_largest_ready(self, files: list[tuple[int, Path]]) -> None:
+        self._largest_files = files
+
+    def _on_duplicates_ready(self, report: "DuplicateReport") -> None:
+        self._duplicates = report
+        self.model.set_reclaimable(report.reclaimable_by_dir())
+
     def _on_finished(self, results: List[ScanResult]) -> None:
         self.progress_bar.setValue(100)
-        self._populate_table(results)
+        self._root_results = results
+
+        # полная перерисовка убирает строки недосканированных папок
+        if not self._nav_stack:
+            self._show_current_level()
         
         
         self.rescan_button.setEnabled(True)
         self.rescan_button.setText("Пересканировать")
+        self.quick_rescan_button.setEnabled(True)
+        self._update_diff_button()
+        self.largest_button.setEnabled(True)
+        self.duplicates_button.setEnabled(True)
+        self._start_watcher()
         
         self._handle_show_scan_time()
+        self._show_duplicates_summary()
         
         
         
@@ -147,86 +443,281 @@ class MainWindow(QMainWindow):
         
         self.rescan_button.setEnabled(True)
         self.rescan_button.setText("Пересканировать")
+        self.quick_rescan_button.setEnabled(True)
+        self.duplicates_button.setEnabled(True)
         
         self._scan_started_at = None
 
     def _populate_table(self, results: List[ScanResult]) -> None:
-        self.table.setSortingEnabled(False)
-        self.table.setRowCount(0)
-        
-        folder_icon = self.style().standardIcon(QStyle.SP_DirIcon)
-
-        for result in results:
-            row = self.table.rowCount()
-            self.table.insertRow(row)
-
-            
-            icon_item = QTableWidgetItem()
-            icon_item.setIcon(folder_icon)
-            icon_item.setData(Qt.UserRole, str(result.path))
-            icon_item.setFlags(Qt.ItemIsEnabled)
-
-            self.table.setItem(row, 0, icon_item)
-            
-            folder_item = QTableWidgetItem(result.path.name)
-            folder_item.setToolTip(str(result.path))
-
-            self.table.setItem(row, 1, folder_item)
-                        
-            
-            size_item = SizeTableItem()
-            size_item.setText(format_size(result.size_bytes))
-            size_item.setData(Qt.UserRole, result.size_bytes)
-            size_item.setToolTip(f"{format_bytes_grouped(result.size_bytes)} bytes")
-            self.table.setItem(row, 2, size_item)
-            
-            
-            # self.table.setItem(row, 3, QTableWidgetItem(str(result.file_count)))
-            
-            files_item = FilesTableItem(str(result.file_count))
-            files_item.setData(Qt.UserRole, result.file_count)
-            self.table.setItem(row, 3, files_item)
-            
-            
-        self.table.setSortingEnabled(True)
-        
+        self.model.set_results(results)
         
     def _on_rescan(self) -> None:
+        """Полный обход заново, без кеша, индекса и контрольных точек."""
+        self._restart(force_rescan=True)
+
+    def _on_quick_rescan(self) -> None:
+        """
+        Пересканирование через индекс каталогов: перечитываются только
+        каталоги с изменившимся mtime, а прерванный обход продолжается с
+        контрольной точки.
+
+        Рост файла на месте (дозапись, перезапись, растущий лог) mtime
+        каталога не меняет, поэтому такой обход его не заметит — итоги
+        остаются прежними до полного пересканирования.
+        """
+        self._restart()
+
+    def _restart(self, force_rescan: bool = False) -> None:
         self._stop_worker()
-        self.table.setRowCount(0)
+        self._root_results = []
+        self._nav_stack = []
+        self.up_button.setEnabled(False)
+        self.path_label.setText(self._roots_label())
+        self.model.set_results([])
+        self.model.set_anomalies({})
+        self.model.set_reclaimable({})
         self.progress_bar.setValue(0)
-        self._start_scan(force_rescan=True)
+        self._start_scan(force_rescan=force_rescan)
+
+    def _on_find_duplicates(self) -> None:
+        """Полный обход со сбором файлов, затем поиск дубликатов среди них."""
+        self._stop_worker()
+        self._nav_stack = []
+        self.up_button.setEnabled(False)
+        self.path_label.setText(self._roots_label())
+        self.progress_bar.setValue(0)
+        self._start_scan(duplicates=True)
         
     def _stop_worker(self) -> None:
+        """
+        Отменяет текущее сканирование, не дожидаясь его: поток доделает
+        контрольную точку сам и удалится по QThread.finished. Сигналы
+        воркера от окна отключаются сразу — его запоздалые results_ready
+        и finished не перезапишут таблицу следующего сканирования.
+        """
         if self._worker:
             self._worker.cancel()
 
-        if self._thread:
-            if self._thread.isRunning():
-                self._thread.quit()
-                self._thread.wait()
+        for signal, slot in self._connections:
+            signal.disconnect(slot)
+        self._connections = []
+
+        thread = self._thread
+        if thread is not None and thread.isRunning():
+            self._retired.append(thread)
+            thread.finished.connect(lambda: self._on_retired(thread))
+        elif thread is not None:
+            thread.deleteLater()
 
         self._worker = None
         self._thread = None
+
+    def _on_retired(self, thread: QThread) -> None:
+        """Остановленный поток закончил: запускаем отложенное сканирование."""
+        self._retired.remove(thread)
+        thread.deleteLater()
+
+        if not self._retired and self._deferred is not None:
+            options, self._deferred = self._deferred, None
+            self._start_scan(**options)
             
     
-    def _on_folder_cell_clicked(self, row: int, column: int) -> None:
+    def _on_folder_cell_clicked(self, index: QModelIndex) -> None:
         # если клик не по первой колонке
-        if column != 0:
-            return
-
-        item = self.table.item(row, 0)
-        if not item:
+        if index.column() != COLUMN_ICON:
             return
 
-        path = item.data(Qt.UserRole)
+        path = index.data(Qt.UserRole)
         if not path:
             return
 
         QDesktopServices.openUrl(QUrl.fromLocalFile(path))
         
-    def _on_cell_hovered(self, row: int, column: int) -> None:
-        if column == 0:
+    def _on_folder_cell_double_clicked(self, index: QModelIndex) -> None:
+        result = self.model.result_at(index.row())
+        if result is None:
+            return
+
+        if result.tree is None:
+            # папка ещё не досканирована — пусть сканер возьмёт её следующей
+            if self._worker is not None and self._worker.priority is not None:
+                self._worker.priority.focus(result.path)
+                self.info_label.setText(f"{result.path.name}: сканируется в первую очередь…")
+            return
+
+        if not len(result.tree.children(result.node)):
+            return
+
+        self._nav_stack.append(result)
+        self._show_current_level()
+
+    def _on_navigate_up(self) -> None:
+        if self._nav_stack:
+            self._nav_stack.pop()
+            self._show_current_level()
+
+    def _show_current_level(self) -> None:
+        """Показывает содержимое текущей папки из уже построенного дерева."""
+        self._update_diff_button()
+
+        if not self._nav_stack:
+            self.path_label.setText(self._roots_label())
+            self.up_button.setEnabled(False)
+            self._populate_table(self._root_results)
+            return
+
+        current = self._nav_stack[-1]
+        tree = current.tree
+        children = [tree.result(node) for node in tree.children(current.node)]
+
+        self.path_label.setText(str(current.path))
+        self.up_button.setEnabled(True)
+        self._populate_table(children)
+
+    def _schedule_priority(self, *_) -> None:
+        # сигналы приходят с разными аргументами, сами они не нужны
+        self._priority_timer.start()
+
+    def _update_priority(self) -> None:
+        """Сообщает ленивому сканированию, какие папки сейчас на экране."""
+        if self._worker is None or self._worker.priority is None or self._nav_stack:
+            return
+
+        first = self.table.rowAt(0)
+        if first < 0:
+            return
+        last = self.table.rowAt(self.table.viewport().height() - 1)
+        if last < 0:
+            last = self.model.rowCount() - 1
+
+        rows = (self.model.result_at(row) for row in range(first, last + 1))
+        self._worker.priority.set_visible(r.path for r in rows if r is not None)
+
+    def resizeEvent(self, event) -> None:
+        super().resizeEvent(event)
+        self._schedule_priority()
+
+    def _roots_label(self) -> str:
+        if not self._multi:
+            return str(self.roots[0])
+        return f"Корней: {len(self.roots)} — " + ", ".join(map(str, self.roots))
+
+    def _current_root(self) -> Path | None:
+        """Корень, история которого относится к текущему уровню таблицы."""
+        if not self._multi:
+            return self.roots[0]
+        # на верхнем уровне строки разных корней
+        return self._nav_stack[0].path if self._nav_stack else None
+
+    def _start_watcher(self) -> None:
+        self._stop_watcher()
+        if not self._watch:
+            return
+
+        from app.watcher import DirWatcher, LiveTrees
+
+        # правила корня, к которому относится каждая строка верхнего уровня
+        matchers = {root: rules.compile(root) for root, rules in self._rules.items()}
+        owners = [
+            r.path if self._multi else self.roots[0] for r in self._root_results
+        ]
+        live = LiveTrees(
+            self._root_results,
+            [matchers.get(owner) for owner in owners],
+            roots=self._multi,
+        )
+        self._live = live
+        self._dirty = set()
+        self.refresh_button.setEnabled(False)
+
+        def on_dirty(paths: set[str]) -> None:
+            # поток наблюдателя: диск читается здесь (и новые подкаталоги
+            # целиком), а в GUI уходят только итоги для LiveTrees.apply
+            changes = live.scan(paths, watcher.stopped)
+            if not watcher.stopped():
+                self.dirty_detected.emit((live, paths, changes))
+
+        watcher = DirWatcher(on_dirty)
+        self._watcher = watcher
+        # пути каталогов строятся уже в потоке наблюдателя
+        watcher.start(live.dirs())
+
+    def _stop_watcher(self) -> None:
+        if self._watcher is not None:
+            self._watcher.stop()
+        self._watcher = None
+        self._live = None
+
+    def closeEvent(self, event) -> None:
+        self._stop_watcher()
+        self._stop_worker()
+        self._deferred = None
+        # окно закрывается: работающий QThread уничтожать нельзя,
+        # поэтому здесь (и только здесь) дожидаемся остановленных
+        for thread in list(self._retired):
+            thread.wait()
+        super().closeEvent(event)
+
+    def _on_dirty(self, event: tuple) -> None:
+        live, paths, changes = event
+        # изменения наблюдателя, который уже остановлен, не нужны
+        if live is not self._live:
+            return
+
+        self._dirty |= paths
+        updated = live.apply(changes)
+        self._root_results = list(self._live.results)
+
+        if self._nav_stack:
+            self._show_current_level()
+        elif updated:
+            self.model.upsert(updated)
+
+        self.refresh_button.setEnabled(True)
+        self.info_label.setText(f"Изменилось папок на диске: {len(self._dirty)}")
+
+    def _on_refresh(self) -> None:
+        """Перечитывает только каталоги, изменившиеся с прошлого сканирования."""
+        dirty = self._dirty
+        self._stop_worker()
+        self._nav_stack = []
+        self.up_button.setEnabled(False)
+        self.path_label.setText(self._roots_label())
+        self.progress_bar.setValue(0)
+        self.refresh_button.setEnabled(False)
+        self._start_scan(dirty=dirty)
+
+    def _update_diff_button(self) -> None:
+        # сравнивать есть с чем, только когда снимков хотя бы два
+        root = self._current_root()
+        self.diff_button.setEnabled(root is not None and len(list_snapshots(root)) >= 2)
+
+    def _on_show_diff(self) -> None:
+        root = self._current_root()
+        history = list_snapshots(root) if root is not None else []
+        if len(history) < 2:
+            return
+
+        from app.analysis.snapshot_diff import diff_snapshots
+        from app.ui.diff_dialog import DiffDialog
+
+        try:
+            diff = diff_snapshots(open_snapshot(history[-2]), open_snapshot(history[-1]))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cannot compare snapshots: {e}")
+            return
+
+        DiffDialog(diff, self).exec()
+
+    def _on_show_largest(self) -> None:
+        from app.scan_service import ScanService
+        from app.ui.largest_dialog import LargestDialog
+
+        dirs = ScanService.largest_dirs(self._root_results)
+        LargestDialog(self._largest_files, dirs, self).exec()
+
+    def _on_cell_hovered(self, index: QModelIndex) -> None:
+        if index.column() == COLUMN_ICON:
             self.table.viewport().setCursor(Qt.PointingHandCursor)
         else:
             self.table.viewport().setCursor(Qt.ArrowCursor)
@@ -237,3 +728,14 @@ class MainWindow(QMainWindow):
             self.info_label.setText(f"Сканирование завершено за {elapsed:.4f} секунд")
             self._scan_started_at = None
 
+    def _show_duplicates_summary(self) -> None:
+        report = self._duplicates
+        if report is None:
+            return
+
+        self._duplicates = None
+        self.info_label.setText(
+            f"Дубликаты: {len(report.groups)} групп, "
+            f"можно освободить {format_size(report.reclaimable)}"
+        )
+
@@ -0,0 +1,383 @@
+# app/ui/results_model.py
+from array import array
+from bisect import insort
+from functools import cmp_to_key
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Iterable
+
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PySide6.QtGui import QColor, QFont, QIcon
+
+from app.analysis.file_types import CATEGORY_TITLES
+from app.models import ScanResult
+from app.utils.np import numpy
+from app.utils.size_format import format_bytes_grouped, format_size
+
+if TYPE_CHECKING:
+    from app.analysis.anomalies import Anomaly
+
+COLUMN_ICON = 0
+COLUMN_NAME = 1
+COLUMN_SIZE = 2
+COLUMN_ALLOCATED = 3
+COLUMN_FILES = 4
+COLUMN_DUPLICATES = 5
+
+HEADERS = ["", "Folder", "Size", "On disk", "Files", "Duplicates"]
+
+
+# сколько категорий и расширений показывать в подсказке
+TOOLTIP_TYPES = 5
+
+# фон строк аномальных каталогов
+ANOMALY_COLOR = QColor(255, 140, 60, 60)
+
+# таблицы меньше этого сортируются без NumPy: первый кадр (строки
+# из кеша) не ждёт его загрузки
+_VECTOR_MIN_ROWS = 4096
+
+# колонки ResultStore с числовыми значениями колонок таблицы
+_COLUMN_ARRAYS = {
+    COLUMN_SIZE: "sizes",
+    COLUMN_ALLOCATED: "allocated",
+    COLUMN_FILES: "files",
+}
+
+# если в пачке изменилась больше чем 1/_MERGE_FRACTION часть строк,
+# таблица сортируется заново, а не вставкой изменившихся строк
+_MERGE_FRACTION = 8
+
+
+def _types_tooltip(result: ScanResult) -> str:
+    lines = [
+        f"{CATEGORY_TITLES[name]}: {format_size(size)} ({files})"
+        for name, size, files in result.types.by_category()[:TOOLTIP_TYPES]
+    ]
+    extensions = [
+        f"{key or '(без расширения)'} {format_size(size)}"
+        for key, size, _ in result.types.top_keys(TOOLTIP_TYPES)
+    ]
+    if extensions:
+        lines.append("")
+        lines.append(", ".join(extensions))
+    return "\n".join(lines)
+
+
+def _anomaly_tooltip(anomaly: "Anomaly") -> str:
+    # аномалии приходят после сканирования — модуль к этому времени загружен
+    from app.analysis.anomalies import METRIC_TITLES
+
+    value = (
+        str(anomaly.value)
+        if anomaly.metric == "files"
+        else format_size(anomaly.value)
+    )
+    baseline = "соседей" if anomaly.baseline == "parent" else "папок той же глубины"
+    return (
+        f"{METRIC_TITLES[anomaly.metric]}: {value}, "
+        f"в {anomaly.ratio:.1f} раза больше обычного для {baseline}"
+    )
+
+
+class ResultStore:
+    """
+    Колоночное хранилище результатов для таблицы.
+
+    Числа лежат в колонках array, а ScanResult — в списке, колонки
+    ссылаются на него по номеру. Сортировка большой таблицы — один
+    argsort NumPy по колонке (frombuffer, без копии) без вызова
+    Python-сравнений; маленькая сортируется sorted(). Порядок в обе
+    стороны устойчивый: при равных значениях записи идут по номеру.
+    """
+
+    def __init__(self) -> None:
+        # освобождаемое удалением дубликатов место по путям каталогов;
+        # живёт дольше строк: поиск идёт по всему дереву сразу
+        self.reclaimable: dict[Path, int] = {}
+        self.clear()
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def clear(self) -> None:
+        self.results: list[ScanResult] = []
+        self.sizes = array("q")
+        self.allocated = array("q")
+        self.files = array("q")
+        self.in_progress = array("b")
+
+        # путь -> номер записи, чтобы обновлять строки на месте
+        self._by_path: dict[Path, int] = {}
+
+    def upsert(self, result: ScanResult, in_progress: bool = False) -> int:
+        """Обновляет запись по пути или добавляет новую; возвращает её номер."""
+        pos = self._by_path.get(result.path)
+
+        if pos is None:
+            pos = self._by_path[result.path] = len(self.results)
+            self.results.append(result)
+            self.sizes.append(result.size_bytes)
+            self.allocated.append(result.allocated_bytes)
+            self.files.append(result.file_count)
+            self.in_progress.append(in_progress)
+        else:
+            self.results[pos] = result
+            self.sizes[pos] = result.size_bytes
+            self.allocated[pos] = result.allocated_bytes
+            self.files[pos] = result.file_count
+            self.in_progress[pos] = in_progress
+        return pos
+
+    def _key(self, column: int) -> Callable[[int], Any] | None:
+        """Значение колонки по номеру записи (None — колонка без сортировки)."""
+        if column == COLUMN_SIZE:
+            return self.sizes.__getitem__
+        if column == COLUMN_ALLOCATED:
+            return self.allocated.__getitem__
+        if column == COLUMN_FILES:
+            return self.files.__getitem__
+        if column == COLUMN_DUPLICATES:
+            reclaimable = self.reclaimable
+            results = self.results
+            return lambda pos: reclaimable.get(results[pos].path, 0)
+        if column == COLUMN_NAME:
+            results = self.results
+            return lambda pos: results[pos].path.name.lower()
+        return None
+
+    def argsort(self, column: int, descending: bool) -> array:
+        """Номера записей в порядке сортировки по колонке (устойчивой)."""
+        count = len(self.results)
+        key = self._key(column)
+        if key is None:
+            return array("q", range(count))
+
+        if count < _VECTOR_MIN_ROWS:
+            # sorted с reverse сохраняет порядок равных — по номеру
+            return array("q", sorted(range(count), key=key, reverse=descending))
+
+        np = numpy()
+        if column in (COLUMN_SIZE, COLUMN_ALLOCATED, COLUMN_FILES):
+            values = np.frombuffer(getattr(self, _COLUMN_ARRAYS[column]), dtype=np.int64)
+        elif column == COLUMN_DUPLICATES:
+            values = np.fromiter(map(key, range(count)), dtype=np.int64, count=count)
+        else:
+            # строки — в ранги, чтобы убывание было сменой знака
+            values = np.unique(np.array(list(map(key, range(count))), dtype=str), return_inverse=True)[1]
+        if descending:
+            values = -values.astype(np.int64)
+
+        return array("q", np.argsort(values, kind="stable").astype(np.int64).tobytes())
+
+    def merge(self, order: array, changed: Iterable[int], column: int, descending: bool) -> array:
+        """
+        Порядок order, в котором записи changed (новые или изменившиеся)
+        переставлены на свои места — тот же, что дал бы argsort, но без
+        пересортировки всей таблицы. Новые записи в order уже есть.
+        """
+        key = self._key(column)
+        changed = sorted(set(changed))
+        if key is None or not changed:
+            return order
+        if len(changed) * _MERGE_FRACTION > len(order):
+            return self.argsort(column, descending)
+
+        sign = -1 if descending else 1
+
+        def compare(a: int, b: int) -> int:
+            ka, kb = key(a), key(b)
+            if ka != kb:
+                return sign if ka > kb else -sign
+            return a - b
+
+        merged = array("q", order)
+        for pos in changed:
+            del merged[merged.index(pos)]
+        by_key = cmp_to_key(compare)
+        for pos in changed:
+            insort(merged, pos, key=by_key)
+        return merged
+
+
+class ResultsTableModel(QAbstractTableModel):
+    """
+    Модель таблицы папок поверх ResultStore.
+    Текст ячеек строится лениво — только для видимых строк.
+    """
+
+    def __init__(self, folder_icon: QIcon, parent=None) -> None:
+        super().__init__(parent)
+        self._folder_icon = folder_icon
+        self._store = ResultStore()
+
+        # порядок строк: номер строки -> номер записи в хранилище
+        self._order = array("q")
+        self._sort_column = COLUMN_SIZE
+        self._sort_order = Qt.DescendingOrder
+
+        self._italic = QFont()
+        self._italic.setItalic(True)
+
+        # аномальные каталоги всего дерева, подсвечиваются на любом уровне
+        self._anomalies: dict[Path, "Anomaly"] = {}
+
+    # ---------- данные ----------
+
+    def set_results(self, results: Iterable[ScanResult]) -> None:
+        self.beginResetModel()
+        self._store.clear()
+        for result in results:
+            self._store.upsert(result)
+        self._order = self._store.argsort(
+            self._sort_column, self._sort_order == Qt.DescendingOrder
+        )
+        self.endResetModel()
+
+    def upsert(self, results: Iterable[ScanResult], in_progress: bool = False) -> None:
+        """
+        Добавляет или обновляет строки; изменившиеся встают на свои
+        места в текущей сортировке (без пересортировки всей таблицы).
+        """
+        before = len(self._store)
+        changed = [self._store.upsert(result, in_progress) for result in results]
+        after = len(self._store)
+
+        if after > before:
+            self.beginInsertRows(QModelIndex(), before, after - 1)
+            self._order.extend(range(before, after))
+            self.endInsertRows()
+
+        if before:
+            self.dataChanged.emit(
+                self.index(0, 0), self.index(before - 1, len(HEADERS) - 1)
+            )
+
+        self._reorder(
+            self._store.merge(
+                self._order,
+                changed,
+                self._sort_column,
+                self._sort_order == Qt.DescendingOrder,
+            )
+        )
+
+    def set_anomalies(self, anomalies: dict[Path, "Anomaly"]) -> None:
+        self._anomalies = anomalies
+        if self._order:
+            self.dataChanged.emit(
+                self.index(0, 0), self.index(len(self._order) - 1, len(HEADERS) - 1)
+            )
+
+    def set_reclaimable(self, reclaimable: dict[Path, int]) -> None:
+        """Место, которое освободит удаление дубликатов, по каталогам."""
+        self._store.reclaimable = reclaimable
+        if self._order:
+            self.dataChanged.emit(
+                self.index(0, COLUMN_DUPLICATES),
+                self.index(len(self._order) - 1, COLUMN_DUPLICATES),
+            )
+        if self._sort_column == COLUMN_DUPLICATES:
+            self.sort(self._sort_column, self._sort_order)
+
+    def result_at(self, row: int) -> ScanResult | None:
+        if 0 <= row < len(self._order):
+            return self._store.results[self._order[row]]
+        return None
+
+    # ---------- QAbstractTableModel ----------
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._order)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section: int, orientation, role=Qt.DisplayRole) -> Any:
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return HEADERS[section]
+        return None
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+
+        pos = self._order[index.row()]
+        column = index.column()
+        result = self._store.results[pos]
+
+        if role == Qt.DisplayRole:
+            if column == COLUMN_NAME:
+                return result.path.name
+            if column == COLUMN_SIZE:
+                return format_size(int(self._store.sizes[pos]))
+            if column == COLUMN_ALLOCATED:
+                return format_size(int(self._store.allocated[pos]))
+            if column == COLUMN_FILES:
+                return str(int(self._store.files[pos]))
+            if column == COLUMN_DUPLICATES:
+                reclaimable = self._store.reclaimable.get(result.path)
+                return format_size(reclaimable) if reclaimable else ""
+
+        elif role == Qt.DecorationRole:
+            if column == COLUMN_ICON:
+                return self._folder_icon
+
+        elif role == Qt.BackgroundRole:
+            if result.path in self._anomalies:
+                return ANOMALY_COLOR
+
+        elif role == Qt.ToolTipRole:
+            if column == COLUMN_NAME:
+                anomaly = self._anomalies.get(result.path)
+                if anomaly is not None:
+                    return f"{result.path}\n{_anomaly_tooltip(anomaly)}"
+                return str(result.path)
+            if column == COLUMN_SIZE:
+                return f"{format_bytes_grouped(int(self._store.sizes[pos]))} bytes"
+            if column == COLUMN_ALLOCATED:
+                return f"{format_bytes_grouped(int(self._store.allocated[pos]))} bytes on disk"
+            if column == COLUMN_FILES and result.types is not None:
+                return _types_tooltip(result)
+            if column == COLUMN_DUPLICATES and result.path in self._store.reclaimable:
+                reclaimable = self._store.reclaimable[result.path]
+                return f"{format_bytes_grouped(reclaimable)} bytes in duplicate copies"
+
+        elif role == Qt.FontRole:
+            if column == COLUMN_NAME and self._store.in_progress[pos]:
+                return self._italic
+
+        elif role == Qt.UserRole:
+            if column == COLUMN_ICON:
+                return str(result.path)
+            return result
+
+        return None
+
+    def sort(self, column: int, order=Qt.AscendingOrder) -> None:
+        self._sort_column = column
+        self._sort_order = order
+        self._reorder(self._store.argsort(column, order == Qt.DescendingOrder))
+
+    def _reorder(self, order: array) -> None:
+        """Новый порядок строк с переносом выделения на те же записи."""
+        self.layoutAboutToBeChanged.emit()
+
+        # переносим выделение и прочие persistent-индексы на новые строки
+        persistent = self.persistentIndexList()
+        positions = [self._order[i.row()] for i in persistent]
+
+        self._order = order
+
+        if persistent:
+            rows = array("q", bytes(8 * len(self._order)))
+            for row, pos in enumerate(self._order):
+                rows[pos] = row
+            self.changePersistentIndexList(
+                persistent,
+                [
+                    self.index(rows[pos], i.column())
+                    for pos, i in zip(positions, persistent)
+                ],
+            )
+
+        self.layoutChanged.emit()
@@ -1,8 +1,8 @@
 table_styles = """
-QTableWidget::item:hover {
+QTableView::item:hover {
     background-color: rgba(100, 150, 255, 40);
 }
-QTableWidget::item:selected {
+QTableView::item:selected {
     background-color: rgba(100, 150, 255, 80);
 }
 """
\ No newline at end of file
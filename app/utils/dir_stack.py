@@ -0,0 +1,190 @@
+import os
+import tempfile
+from array import array
+from typing import Iterable, Iterator
+
+# сколько имён в одном блоке стека: каталог с миллионом подкаталогов
+# ложится в стек частями, и сбросить на диск можно любую из них
+BLOCK_NAMES = 1024
+
+# в именах файлов не бывает NUL — им и разделяем имена внутри блока
+_SEP = "\0"
+
+# примерная цена блока сверх самих строк (список и заголовки str)
+_BLOCK_OVERHEAD = 160
+
+
+def _block_size(prefix: str, names: str) -> int:
+    return len(prefix) + len(names) + _BLOCK_OVERHEAD
+
+
+class DirStack:
+    """
+    Стек каталогов обхода (LIFO, как list с append/pop).
+
+    Пути хранятся не строкой на каталог, а блоками: общий префикс
+    (путь родителя) и имена детей одной строкой через NUL — вместо
+    ~50 байт заголовка и полного пути на каждый каталог выходит
+    примерно длина имени. На глубоких деревьях, где полные пути
+    длинные, разница в разы.
+
+    limit — сколько байт (примерно) держать в памяти; сверх него
+    нижние блоки сбрасываются во временный файл и читаются обратно,
+    когда до них дойдёт очередь. 0 — без ограничения.
+    """
+
+    __slots__ = ("limit", "_blocks", "_size", "_count", "_file", "_offsets")
+
+    def __init__(self, paths: Iterable[str] = (), limit: int = 0) -> None:
+        self.limit = limit
+        # [префикс, имена через NUL, конец ещё не извлечённых имён]
+        self._blocks: list[list] = []
+        self._size = 0
+        self._count = 0
+        self._file = None
+        # начала сброшенных блоков в файле (сверху — последний)
+        self._offsets = array("q")
+        self.extend(paths)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        """Все каталоги стека без извлечения (порядок не гарантируется)."""
+        for prefix, names in self._dump():
+            for name in names.split(_SEP):
+                yield prefix + name
+
+    def __getstate__(self):
+        # для пула процессов: сброшенное едет вместе со стеком
+        return self.limit, list(self._dump())
+
+    def __setstate__(self, state) -> None:
+        limit, blocks = state
+        self.__init__(limit=limit)
+        for prefix, names in blocks:
+            self._add(prefix, names, names.count(_SEP) + 1)
+
+    def _dump(self) -> Iterator[tuple[str, str]]:
+        """Все блоки (и сброшенные, и в памяти) снизу вверх, по одному."""
+        if self._offsets:
+            f = self._file
+            ends = list(self._offsets[1:])
+            f.seek(0, os.SEEK_END)
+            ends.append(f.tell())
+            for start, end in zip(self._offsets, ends):
+                f.seek(start)
+                prefix, _, names = f.read(end - start).decode("utf-8", "surrogatepass").partition(_SEP)
+                yield prefix, names
+
+        for prefix, names, end in list(self._blocks):
+            yield prefix, names[:end]
+
+    @property
+    def spilled(self) -> int:
+        """Сколько блоков сейчас лежит во временном файле."""
+        return len(self._offsets)
+
+    def push(self, parent: str, names: list[str]) -> None:
+        """Кладёт подкаталоги names каталога parent (последний — наверх)."""
+        prefix = os.path.join(parent, "")
+        for start in range(0, len(names), BLOCK_NAMES):
+            part = names[start : start + BLOCK_NAMES]
+            self._add(prefix, _SEP.join(part), len(part))
+
+    def append(self, path: str) -> None:
+        self._add("", path, 1)
+
+    def extend(self, paths: Iterable[str]) -> None:
+        batch = []
+        for path in paths:
+            batch.append(path)
+            if len(batch) == BLOCK_NAMES:
+                self._add("", _SEP.join(batch), len(batch))
+                batch = []
+        if batch:
+            self._add("", _SEP.join(batch), len(batch))
+
+    def merge(self, other: "DirStack") -> None:
+        """Перекладывает все каталоги other наверх этого стека (other пустеет)."""
+        for prefix, names in other._dump():
+            self._add(prefix, names, names.count(_SEP) + 1)
+        other.close()
+
+    def pop(self) -> str:
+        blocks = self._blocks
+        if not blocks:
+            if not self._offsets:
+                raise IndexError("pop from empty DirStack")
+            self._load()
+
+        block = blocks[-1]
+        prefix, names, end = block
+        start = names.rfind(_SEP, 0, end)
+        if start < 0:
+            blocks.pop()
+            self._size -= _block_size(prefix, names)
+        else:
+            block[2] = start
+
+        self._count -= 1
+        return prefix + names[start + 1 : end]
+
+    def take(self, n: int) -> list[str]:
+        """Снимает до n каталогов сверху."""
+        n = min(n, self._count)
+        return [self.pop() for _ in range(n)]
+
+    def discard(self, n: int) -> None:
+        """Выбрасывает n каталогов сверху (откат недочитанного каталога)."""
+        for _ in range(min(n, self._count)):
+            self.pop()
+
+    def close(self) -> None:
+        """Освобождает временный файл (стек становится пустым)."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._blocks = []
+        self._offsets = array("q")
+        self._size = 0
+        self._count = 0
+
+    def _add(self, prefix: str, names: str, count: int) -> None:
+        self._blocks.append([prefix, names, len(names)])
+        self._size += _block_size(prefix, names)
+        self._count += count
+        if self.limit and self._size > self.limit:
+            self._spill()
+
+    def _spill(self) -> None:
+        """Сбрасывает нижние блоки в файл, пока в памяти не останется limit / 2."""
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix="fsv-stack-")
+
+        f = self._file
+        f.seek(0, os.SEEK_END)
+        blocks = self._blocks
+        target = self.limit // 2
+
+        moved = 0
+        # верхний блок остаётся: его сейчас и будут снимать
+        while moved < len(blocks) - 1 and self._size > target:
+            prefix, names, end = blocks[moved]
+            self._offsets.append(f.tell())
+            f.write((prefix + _SEP + names[:end]).encode("utf-8", "surrogatepass"))
+            self._size -= _block_size(prefix, names)
+            moved += 1
+
+        del blocks[:moved]
+
+    def _load(self) -> None:
+        """Читает обратно верхний из сброшенных блоков."""
+        f = self._file
+        start = self._offsets.pop()
+        f.seek(start)
+        prefix, _, names = f.read().decode("utf-8", "surrogatepass").partition(_SEP)
+        f.truncate(start)
+
+        self._blocks.append([prefix, names, len(names)])
+        self._size += _block_size(prefix, names)
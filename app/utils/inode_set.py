@@ -0,0 +1,92 @@
+from array import array
+
+# 0 в таблице означает пустой слот
+_EMPTY = 0
+_MASK = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+
+# при такой доле заполнения таблица удваивается
+_MAX_LOAD = 0.5
+
+
+def inode_key(dev: int, ino: int) -> int:
+    """
+    64-битный ключ пары (st_dev, st_ino).
+    Ложное совпадение двух разных пар возможно, но вероятность
+    ~n²/2⁶⁵ — для 10⁸ inode порядка 10⁻³ на весь скан.
+    """
+    key = (ino ^ (dev * _GOLDEN)) & _MASK
+    return key or 1
+
+
+def _slot(key: int, mask: int) -> int:
+    # ключи inode плохо распределены в младших битах — перемешиваем
+    return (((key * _GOLDEN) & _MASK) >> 32) & mask
+
+
+class InodeSet:
+    """
+    Множество ключей inode на открытой адресации поверх array('Q').
+
+    8 байт на слот, при заполнении до 50% — ~16 байт на inode
+    (set из int занял бы ~70+). max_entries ограничивает память:
+    сверх лимита новые ключи не запоминаются и считаются новыми
+    (файл будет посчитан повторно, но память не растёт).
+    """
+
+    __slots__ = ("_table", "_mask", "_count", "max_entries", "overflow")
+
+    def __init__(self, capacity: int = 1024, max_entries: int = 32_000_000) -> None:
+        size = 1
+        while size < capacity * 2:
+            size <<= 1
+
+        self._table = array("Q", bytes(8 * size))
+        self._mask = size - 1
+        self._count = 0
+        self.max_entries = max_entries
+        self.overflow = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, key: int) -> bool:
+        """Добавляет ключ. True — если его ещё не было."""
+        table = self._table
+        mask = self._mask
+        slot = _slot(key, mask)
+
+        while True:
+            current = table[slot]
+            if current == _EMPTY:
+                break
+            if current == key:
+                return False
+            slot = (slot + 1) & mask
+
+        if self._count >= self.max_entries:
+            self.overflow += 1
+            return True
+
+        table[slot] = key
+        self._count += 1
+
+        if self._count > len(table) * _MAX_LOAD:
+            self._grow()
+        return True
+
+    def _grow(self) -> None:
+        old = self._table
+        self._table = array("Q", bytes(16 * len(old)))
+        self._mask = len(self._table) - 1
+        table = self._table
+        mask = self._mask
+
+        for key in old:
+            if key == _EMPTY:
+                continue
+
+            slot = _slot(key, mask)
+            while table[slot] != _EMPTY:
+                slot = (slot + 1) & mask
+            table[slot] = key
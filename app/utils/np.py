@@ -0,0 +1,23 @@
+"""
+Ленивый импорт NumPy для модулей, которые загружает первый кадр окна
+(кеш, снимки, дерево каталогов, разбивка по типам, таблица).
+
+Импорт NumPy стоит ~80 мс, а до первой отрисовки он не нужен: кодирование
+разбивки, чтение строк кеша и открытие снимка обходятся без него. Эти
+модули берут NumPy через numpy() в тех функциях, которые им считают.
+Модули, которых первый кадр не касается (сканирование, анализ),
+импортируют NumPy как обычно.
+"""
+from types import ModuleType
+
+_numpy: ModuleType | None = None
+
+
+def numpy() -> ModuleType:
+    """Модуль numpy; импортируется при первом вызове."""
+    global _numpy
+    if _numpy is None:
+        import numpy
+
+        _numpy = numpy
+    return _numpy
@@ -0,0 +1,35 @@
+import heapq
+from typing import Generic, Iterable, TypeVar
+
+T = TypeVar("T")
+
+
+class TopN(Generic[T]):
+    """
+    N наибольших элементов по размеру: min-куча фиксированного размера.
+    Память — O(limit), сколько бы элементов ни прошло через push().
+    """
+
+    __slots__ = ("limit", "heap")
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.heap: list[tuple[int, T]] = []
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def push(self, size: int, item: T) -> None:
+        heap = self.heap
+        if len(heap) < self.limit:
+            heapq.heappush(heap, (size, item))
+        elif size > heap[0][0]:
+            heapq.heapreplace(heap, (size, item))
+
+    def merge(self, items: Iterable[tuple[int, T]]) -> None:
+        for size, item in items:
+            self.push(size, item)
+
+    def items(self) -> list[tuple[int, T]]:
+        """Элементы по убыванию размера."""
+        return sorted(self.heap, reverse=True)
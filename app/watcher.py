@@ -0,0 +1,472 @@
+# app/watcher.py
+"""
+Наблюдение за деревом после сканирования.
+
+DirWatcher следит за каталогами через inotify (Linux, через ctypes,
+без зависимостей), а если его нет или не хватило лимита
+fs.inotify.max_user_watches — опрашивает mtime каталогов.
+Изменившиеся каталоги отдаются пачками в on_dirty.
+
+LiveTrees применяет изменения к деревьям показанных результатов:
+перечитывает только собственное содержимое «грязного» каталога
+(в потоке наблюдателя) и разносит разницу по предкам (в GUI-потоке).
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+from app.core.logger import logger
+from app.models import PENDING_MTIME, ScanResult
+from app.scan_rules import RuleMatcher
+from app.scanner import scan_dir_own, scan_folder
+
+# изменения копятся столько секунд, прежде чем уйти в on_dirty
+WATCH_DEBOUNCE = 0.5
+
+# период опроса mtime, если inotify недоступен
+POLL_INTERVAL = 5.0
+
+# больше каталогов не опрашиваем: stat каждого раз в POLL_INTERVAL
+# на миллионах каталогов занимает диск целиком
+POLL_MAX_DIRS = 50_000
+
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_DONT_FOLLOW = 0x02000000
+_IN_EXCL_UNLINK = 0x04000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (
+    _IN_MODIFY
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+    | _IN_ONLYDIR
+    | _IN_DONT_FOLLOW
+    | _IN_EXCL_UNLINK
+)
+
+# struct inotify_event без имени: wd, mask, cookie, len
+_EVENT = struct.Struct("iIII")
+
+
+def _load_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        init = libc.inotify_init1
+        add = libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+
+    init.argtypes = [ctypes.c_int]
+    add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return init, add
+
+
+_INOTIFY = _load_inotify()
+
+
+class DirWatcher:
+    """
+    Следит за набором каталогов в фоновом потоке.
+
+    dirs — пары (путь каталога, mtime на момент сканирования). Сначала
+    каталоги сверяются с этими mtime: так не теряются изменения,
+    случившиеся между чтением каталога и началом наблюдения.
+    dirs читается уже в потоке наблюдателя: на деревьях в миллионы
+    каталогов построение путей заметно по времени.
+
+    Опрос (без inotify) включается, только если каталогов не больше
+    poll_limit, иначе наблюдение выключается с записью в лог.
+
+    on_dirty вызывается из потока наблюдателя.
+    """
+
+    def __init__(
+        self,
+        on_dirty: Callable[[set[str]], None],
+        debounce: float = WATCH_DEBOUNCE,
+        poll_interval: float = POLL_INTERVAL,
+        poll_limit: int = POLL_MAX_DIRS,
+    ) -> None:
+        self.on_dirty = on_dirty
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.poll_limit = poll_limit
+        # inotify / polling / off, известен после запуска
+        self.mode: str | None = None
+
+        self._source: Iterable[tuple[str, float]] = ()
+        self._dirs: dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self, dirs: Iterable[tuple[str, float]]) -> None:
+        self._source = dirs
+        self._thread = threading.Thread(target=self._run, name="dir-watcher", daemon=True)
+        self._thread.start()
+
+    def stopped(self) -> bool:
+        """Наблюдатель останавливается (для долгих on_dirty)."""
+        return self._stop.is_set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        for path, mtime in self._source:
+            if self._stop.is_set():
+                return
+            self._dirs[path] = mtime
+        self._source = ()
+
+        if _INOTIFY is not None:
+            try:
+                self._run_inotify()
+                return
+            except OSError as e:
+                logger.warning(f"inotify unavailable, falling back to polling: {e}")
+
+        self._run_polling()
+
+    # ------------------------------------------------------------------
+    # INOTIFY
+    # ------------------------------------------------------------------
+
+    def _run_inotify(self) -> None:
+        init, add = _INOTIFY
+
+        fd = init(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        try:
+            paths: dict[int, str] = {}
+            for path in self._dirs:
+                wd = add(fd, os.fsencode(path), _WATCH_MASK)
+                if wd >= 0:
+                    paths[wd] = path
+                    continue
+
+                code = ctypes.get_errno()
+                # каталог успел исчезнуть — это изменение, а не сбой
+                if code in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                    continue
+                raise OSError(code, f"inotify_add_watch failed for {path}")
+
+            self.mode = "inotify"
+            logger.debug(f"Watching {len(paths)} directories with inotify")
+
+            pending = self._verify()
+            deadline = time.monotonic() + self.debounce if pending else None
+
+            while not self._stop.is_set():
+                timeout = 0.2 if deadline is None else max(0.0, deadline - time.monotonic())
+                ready, _, _ = select.select([fd], [], [], min(timeout, 0.2))
+
+                if ready:
+                    data = os.read(fd, 64 * 1024)
+                    changed = self._parse_events(data, paths)
+                    if changed:
+                        pending |= changed
+                        if deadline is None:
+                            deadline = time.monotonic() + self.debounce
+
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.on_dirty(pending)
+                    pending = set()
+                    deadline = None
+        finally:
+            os.close(fd)
+
+    def _parse_events(self, data: bytes, paths: dict[int, str]) -> set[str]:
+        changed: set[str] = set()
+        offset = 0
+
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size + length
+
+            if mask & _IN_Q_OVERFLOW:
+                # события потеряны — считаем изменённым всё
+                changed.update(paths.values())
+                continue
+
+            path = paths.get(wd)
+            if path is None:
+                continue
+
+            if mask & _IN_IGNORED:
+                del paths[wd]
+            changed.add(path)
+
+        return changed
+
+    # ------------------------------------------------------------------
+    # ОПРОС
+    # ------------------------------------------------------------------
+
+    def _run_polling(self) -> None:
+        if len(self._dirs) > self.poll_limit:
+            self.mode = "off"
+            logger.warning(
+                f"Not watching {len(self._dirs)} directories: polling is limited "
+                f"to {self.poll_limit} without inotify"
+            )
+            return
+
+        self.mode = "polling"
+        logger.debug(f"Polling {len(self._dirs)} directories every {self.poll_interval}s")
+
+        while not self._stop.wait(self.poll_interval):
+            changed = self._verify()
+            if changed:
+                self.on_dirty(changed)
+
+    def _verify(self) -> set[str]:
+        """
+        Каталоги, чей mtime отличается от запомненного.
+        Изменение файла на месте mtime каталога не меняет — опрос его
+        не увидит (inotify видит по IN_MODIFY).
+        """
+        changed: set[str] = set()
+
+        for path, mtime in self._dirs.items():
+            if self._stop.is_set():
+                break
+            try:
+                current = os.stat(path).st_mtime
+            except OSError:
+                current = None
+
+            if mtime == PENDING_MTIME:
+                # mtime при сканировании не запомнен (каталог с жёсткими
+                # ссылками) — сверять не с чем, следим с текущего
+                self._dirs[path] = current
+            elif current != mtime:
+                changed.add(path)
+                self._dirs[path] = current
+
+        return changed
+
+
+# перечитанный наблюдателем каталог: (номер результата, узел, новые
+# собственные байты, место, файлы, ошибки — вместе с появившимися
+# подкаталогами, исчезнувшие дети)
+LiveChange = tuple[int, int, int, int, int, int, list[int]]
+
+
+class LiveTrees:
+    """
+    Деревья показанных результатов, обновляемые по событиям наблюдателя.
+
+    Меняются только итоги: новые подкаталоги учитываются в размере
+    родителя, удалённые обнуляются, но форму дерева исправит лишь
+    следующее сканирование грязных каталогов.
+
+    Работа разделена на две части: scan() читает диск (собственное
+    содержимое грязных каталогов и целиком новые подкаталоги) и
+    вызывается в потоке наблюдателя, а apply() только переносит
+    результат в деревья — это в GUI-потоке, без ввода-вывода.
+    Оба шага идемпотентны: исчезнувший узел обнуляется, а собственные
+    итоги каталога приводятся к перечитанным, сколько бы раз apply()
+    ни повторили.
+    """
+
+    def __init__(
+        self,
+        results: Iterable[ScanResult],
+        rules: Iterable[RuleMatcher | None] | None = None,
+        roots: bool = False,
+    ) -> None:
+        """
+        rules — правила исключения, с которыми сканировался каждый
+        результат (по порядку results).
+        roots — results это итоги самих корней (ScanService.scan_roots):
+        собственные файлы корня при сканировании не считаются, поэтому
+        за самими корнями не следим, только за их подкаталогами.
+        """
+        self.results: list[ScanResult] = list(results)
+        self.rules = list(rules) if rules is not None else [None] * len(self.results)
+        self.roots = roots
+
+        # путь результата -> его номер; пути остальных каталогов не
+        # хранятся, узел находится спуском по именам (см. _find)
+        self._positions: dict[str, int] = {}
+        for pos, result in enumerate(self.results):
+            tree = result.tree
+            # снимки (mmap) только для чтения, а поддеревья не корни
+            if tree is None or result.node != 0 or isinstance(tree.size, memoryview):
+                continue
+            self._positions[str(result.path)] = pos
+
+        # имя -> ребёнок для узлов, через которые уже спускались
+        self._children: dict[tuple[int, int], dict[str, int]] = {}
+        # исчезнувшие с диска узлы (номер результата, узел); меняется
+        # только в scan()
+        self._removed: set[tuple[int, int]] = set()
+
+    def dirs(self) -> Iterator[tuple[str, float]]:
+        """Каталоги для наблюдения и их mtime на момент сканирования."""
+        for path, pos in self._positions.items():
+            tree = self.results[pos].tree
+            for node, node_path in tree.paths():
+                if node or not self.roots:
+                    yield node_path, tree.mtime[node]
+
+    def scan(
+        self,
+        paths: Iterable[str],
+        stop: Callable[[], bool] | None = None,
+    ) -> list[LiveChange]:
+        """
+        Перечитывает грязные каталоги (в потоке наблюдателя). Деревья
+        не меняются — изменения отдаются для apply().
+        stop — прервать (наблюдатель останавливается).
+        """
+        changes = []
+        for path in paths:
+            if stop is not None and stop():
+                break
+
+            found = self._find(path)
+            if found is not None:
+                changes.append(self._scan_node(*found, path, stop))
+        return changes
+
+    def apply(self, changes: Iterable[LiveChange]) -> list[ScanResult]:
+        """
+        Переносит изменения в деревья (в GUI-потоке) и возвращает
+        обновлённые результаты верхнего уровня (новые объекты ScanResult).
+        """
+        touched: set[int] = set()
+
+        for pos, node, size, alloc, files, errors, missing in changes:
+            tree = self.results[pos].tree
+            for child in missing:
+                tree.add_to_node(
+                    child,
+                    -tree.size[child],
+                    -tree.alloc[child],
+                    -tree.files[child],
+                    -tree.errors[child],
+                )
+
+            own_size = tree.size[node]
+            own_alloc = tree.alloc[node]
+            own_files = tree.files[node]
+            own_errors = tree.errors[node]
+            for child in tree.children(node):
+                own_size -= tree.size[child]
+                own_alloc -= tree.alloc[child]
+                own_files -= tree.files[child]
+                own_errors -= tree.errors[child]
+
+            tree.add_to_node(
+                node,
+                size - own_size,
+                alloc - own_alloc,
+                files - own_files,
+                errors - own_errors,
+            )
+            touched.add(pos)
+
+        updated = []
+        for pos in sorted(touched):
+            result = self.results[pos].tree.result(0)
+            # разбивку по типам обновит только следующее сканирование
+            result.types = self.results[pos].types
+            self.results[pos] = result
+            updated.append(result)
+        return updated
+
+    def _find(self, path: str) -> tuple[int, int] | None:
+        """Результат и узел каталога path (None — за ним не следим)."""
+        top = path
+        parts: list[str] = []
+        while top not in self._positions:
+            parent, name = os.path.split(top)
+            if parent == top or not name:
+                return None
+            parts.append(name)
+            top = parent
+
+        pos = self._positions[top]
+        if not parts and self.roots:
+            return None
+
+        tree = self.results[pos].tree
+        node = 0
+        for name in reversed(parts):
+            names = self._children.get((pos, node))
+            if names is None:
+                names = self._children[(pos, node)] = {
+                    tree.names[child]: child for child in tree.children(node)
+                }
+            node = names.get(name)
+            if node is None:
+                return None
+        return pos, node
+
+    def _scan_node(
+        self,
+        pos: int,
+        node: int,
+        path: str,
+        stop: Callable[[], bool] | None,
+    ) -> LiveChange:
+        tree = self.results[pos].tree
+        size, alloc, files, errors, subdirs = scan_dir_own(path, self.rules[pos])
+        present = set(subdirs)
+
+        known: dict[str, int] = {}
+        missing: list[int] = []
+        for child in tree.children(node):
+            name = tree.names[child]
+            known[name] = child
+
+            if name not in present:
+                self._removed.add((pos, child))
+                missing.append(child)
+
+        # новые (или пересозданные) подкаталоги идут в итоги родителя
+        for name in subdirs:
+            child = known.get(name)
+            if child is not None and (pos, child) not in self._removed:
+                continue
+
+            extra = scan_folder(Path(path, name), rules=self.rules[pos], stop=stop)
+            size += extra.size_bytes
+            alloc += extra.allocated_bytes
+            files += extra.file_count
+            errors += extra.error_count
+
+        return pos, node, size, alloc, files, errors, missing
@@ -1,45 +1,201 @@
 # app/worker.py
+import time
 from pathlib import Path
 
 from PySide6.QtCore import QObject, Signal, Slot
 
-from app.cache import ScanCache
+from app.cache import DEFAULT_CACHE_PATH, ScanCache
 from app.core.logger import logger
+from app.core.metrics import ScanMetrics
+from app.executors import DEFAULT_ENGINE, create_executor
+from app.analysis.duplicates import FileCandidates, find_duplicates
+from app.models import ScanResult
+from app.priority import ScanPriority
+from app.scan_rules import ScanRules
 from app.scan_service import ScanService
+from app.snapshot import list_snapshots, open_snapshot, save_snapshot
 
-CACHE_PATH = Path.cwd() / ".folder_size_cache.sqlite"
+# не чаще, чем раз в столько секунд, отправляем в GUI пачку обновлений
+STREAM_INTERVAL = 0.2
 
 
 class ScanWorker(QObject):
     progress = Signal(int)
+    # пачки готовых папок и промежуточных итогов по мере сканирования
+    results_ready = Signal(list)
+    partial = Signal(list)
+    # крупнейшие файлы (размер, путь), перед finished
+    largest_ready = Signal(list)
+    # аномальные каталоги всего дерева {путь: Anomaly}, перед finished
+    anomalies_ready = Signal(dict)
+    # DuplicateReport, если сканирование искало дубликаты, перед finished
+    duplicates_ready = Signal(object)
     finished = Signal(list)
     error = Signal(str)
 
-    def __init__(self, root_path: Path, force_rescan: bool = False) -> None:
+    def __init__(
+        self,
+        roots: list[Path],
+        force_rescan: bool = False,
+        engine: str = DEFAULT_ENGINE,
+        collect_metrics: bool = False,
+        cache: ScanCache | None = None,
+        dirty: set[str] | None = None,
+        duplicates: bool = False,
+        rules: dict[Path, ScanRules] | None = None,
+        per_device: int | None = None,
+        lazy: bool = False,
+    ) -> None:
+        """
+        roots — корни сканирования. Для одного корня finished получает
+        его папки верхнего уровня, для нескольких — итоги самих корней
+        (см. ScanService.scan_roots); results_ready и partial в обоих
+        случаях идут по папкам верхнего уровня.
+        cache — общий кеш окна; без него открывается свой на одно
+        сканирование.
+        dirty — каталоги, изменившиеся по данным наблюдателя ФС
+        (только они и будут перечитаны, см. ScanService.scan).
+        duplicates — после сканирования искать дубликаты файлов
+        (обход тогда полный, без кеша).
+        rules — правила исключения по корням (см. load_rules).
+        per_device — сколько задач одновременно читают один диск.
+        lazy — ленивый режим (см. ScanService.scan, priority): сначала
+        список папок с оценками, потом обход по приоритетам из
+        self.priority, которые GUI меняет по ходу сканирования.
+        """
         super().__init__()
-        self.root_path = root_path
+        self.roots = roots
+        self.per_device = per_device
+        self.cache = cache
+        self.dirty = dirty
+        self.duplicates = duplicates
+        self.rules = rules
         self._is_cancelled = False
         self.force_rescan = force_rescan
+        self.engine = engine
+        self.collect_metrics = collect_metrics
+        self.priority = ScanPriority() if lazy else None
+
+        self._ready: list[ScanResult] = []
+        self._partial: dict[Path, ScanResult] = {}
+        self._last_flush = 0.0
 
     @Slot()
     def run(self) -> None:
         try:
-            cache = ScanCache(CACHE_PATH)
-            service = ScanService(cache)
-
-            results = service.scan(
-                root=self.root_path,
+            cache = self.cache or ScanCache(DEFAULT_CACHE_PATH)
+            service = ScanService(
+                cache, create_executor(self.engine, per_device=self.per_device)
+            )
+            candidates = FileCandidates() if self.duplicates else None
+            options = dict(
                 on_progress=self.progress.emit,
                 is_cancelled=lambda: self._is_cancelled,
-                force_rescan=self.force_rescan
+                force_rescan=self.force_rescan,
+                on_result=self._on_result,
+                on_partial=self._on_partial,
+                metrics=ScanMetrics() if self.collect_metrics else None,
+                dirty=self.dirty,
+                files=candidates,
+                priority=self.priority,
             )
 
+            rules = self.rules or {}
+            if len(self.roots) == 1:
+                root = self.roots[0]
+                results = service.scan(root=root, rules=rules.get(root), **options)
+                folders = {root: results}
+            else:
+                results = service.scan_roots(self.roots, rules=rules, **options)
+                folders = {
+                    r.path: [r.tree.result(node) for node in r.tree.children(0)]
+                    for r in results
+                }
+
+            self._flush()
+            self.largest_ready.emit(service.largest_files)
+
+            # после обхода — снимки, аномалии и дубликаты; отмену
+            # проверяем перед каждым шагом, чтобы остановка не ждала их
+            if not self._is_cancelled:
+                # снимки (по одному на корень) пишем только для полного сканирования
+                anomalies = {}
+                for root, children in folders.items():
+                    if self._is_cancelled:
+                        break
+                    self._save_snapshot(root, children, service.full_walk)
+                    if self._is_cancelled:
+                        break
+                    anomalies.update(self._detect_anomalies(root))
+                else:
+                    self.anomalies_ready.emit(anomalies)
+
+            if candidates is not None and not self._is_cancelled:
+                report = find_duplicates(
+                    list(folders),
+                    candidates,
+                    cache,
+                    is_cancelled=lambda: self._is_cancelled,
+                    on_progress=self.progress.emit,
+                )
+                if not self._is_cancelled:
+                    self.duplicates_ready.emit(report)
+
             self.finished.emit(results)
 
         except Exception as e:
             logger.error(f"Worker crashed: {e}")
             self.error.emit(str(e))
             
+    @staticmethod
+    def _save_snapshot(root: Path, results: list[ScanResult], full: bool) -> None:
+        try:
+            save_snapshot(root, results, full=full)
+        except OSError as e:
+            logger.warning(f"Cannot save snapshot for {root}: {e}")
+
+    @staticmethod
+    def _detect_anomalies(root: Path) -> dict:
+        """Аномалии по свежему снимку корня (рост — относительно прошлого)."""
+        from app.analysis.anomalies import detect_anomalies
+
+        history = list_snapshots(root)
+        if not history:
+            return {}
+
+        try:
+            snapshot = open_snapshot(history[-1])
+            previous = open_snapshot(history[-2]) if len(history) >= 2 else None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cannot open snapshots of {root}: {e}")
+            return {}
+
+        return detect_anomalies(snapshot, previous).by_path()
+
+    def _on_result(self, result: ScanResult) -> None:
+        self._partial.pop(result.path, None)
+        self._ready.append(result)
+        self._maybe_flush()
+
+    def _on_partial(self, result: ScanResult) -> None:
+        # от одной папки достаточно последних итогов
+        self._partial[result.path] = result
+        self._maybe_flush()
+
+    def _maybe_flush(self) -> None:
+        now = time.monotonic()
+        if now - self._last_flush >= STREAM_INTERVAL:
+            self._last_flush = now
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._ready:
+            self.results_ready.emit(self._ready)
+            self._ready = []
+
+        if self._partial:
+            self.partial.emit(list(self._partial.values()))
+            self._partial = {}
+
     def cancel(self):
         self._is_cancelled = True
-        None
@@ -0,0 +1,215 @@
+# benchmarks/memory_budget.py
+"""
+Проверка пиковой памяти на патологических деревьях.
+
+    python -m benchmarks.memory_budget [--shapes wide_dir many_files ...]
+                                       [--engines serial thread ...]
+                                       [--memory-limit MB]
+
+Формы, на которых память раньше росла с шириной, а не с глубиной:
+каталог с сотнями тысяч подкаталогов, каталог с сотнями тысяч
+файлов, корень с десятками тысяч папок верхнего уровня, глубокое
+дерево с братьями на каждом уровне и каталог из жёстких ссылок
+(учёт inode). Те же формы поменьше проверяет
+tests/test_memory.py.
+
+Каждое сканирование идёт в отдельном (spawn) процессе, чтобы пики
+не накладывались; меряется прирост ru_maxrss от уже импортированного
+приложения до конца сканирования (папки не копятся, keep_results=False).
+Бюджет формы — постоянная часть плюс байты на каталог: само дерево
+каталогов (DirTree) неизбежно растёт с числом каталогов, а очередь
+обхода, разбивка по типам и запись индекса — не должны. Обычные
+файлы в бюджет не входят вовсе; жёсткие ссылки входят — каждую
+нужно сверить с уже посчитанными inode, пока каталог не сведён. Для движка process считается только главный
+процесс. При превышении — код возврата 1.
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import get_context
+from pathlib import Path
+
+from app.executors import DEFAULT_MEMORY_LIMIT
+
+# размер файла, на который ведут жёсткие ссылки формы, и сколько
+# ссылок на каждый такой файл (st_nlink ограничен ФС, у ext4 — 65000)
+LINK_SIZE = 4096
+LINKS_PER_FILE = 4
+
+# ru_maxrss в килобайтах на Linux и в байтах на macOS
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+@dataclass(frozen=True)
+class PathologicalShape:
+    name: str
+    # папки верхнего уровня корня
+    top: int = 1
+    # подкаталогов и пустых файлов в первой папке верхнего уровня
+    subdirs: int = 0
+    files: int = 0
+    # жёстких ссылок там же: по LINKS_PER_FILE на файл в LINK_SIZE байт
+    links: int = 0
+    # цепочка уровней в первой папке, на каждом siblings братьев
+    depth: int = 0
+    siblings: int = 0
+    # бюджет: постоянная часть, байты на каталог и на жёсткую ссылку
+    fixed_mb: int = 16
+    per_dir: int = 500
+    per_link: int = 300
+
+    @property
+    def dir_count(self) -> int:
+        return self.top + self.subdirs + self.depth * self.siblings
+
+    def budget(self) -> int:
+        return (
+            (self.fixed_mb << 20)
+            + self.per_dir * self.dir_count
+            + self.per_link * self.links
+        )
+
+
+SHAPES: dict[str, PathologicalShape] = {
+    shape.name: shape
+    for shape in (
+        PathologicalShape("wide_dir", subdirs=100_000),
+        PathologicalShape("many_files", files=200_000, fixed_mb=8),
+        # у каждой папки верхнего уровня ещё и свои итоги и дерево
+        PathologicalShape("wide_root", top=20_000, per_dir=1500),
+        # длина пути упирается в PATH_MAX, поэтому имена короткие; пока
+        # дерево строится, его индекс держит полные (длинные) пути
+        PathologicalShape("deep_bushy", depth=600, siblings=20, per_dir=2000),
+        PathologicalShape("hardlinks", links=100_000, fixed_mb=8),
+    )
+}
+
+
+def build_tree(root: Path, shape: PathologicalShape) -> Path:
+    """
+    Строит дерево формы shape в root/<shape.name> и возвращает путь к нему.
+    Уже построенное переиспользуется (маркер <shape.name>.complete рядом).
+    """
+    target = root / shape.name
+    marker = root / f"{shape.name}.complete"
+    if marker.exists():
+        return target
+
+    os.makedirs(target, exist_ok=True)
+    for i in range(shape.top):
+        os.makedirs(target / f"t{i}", exist_ok=True)
+
+    first = target / "t0"
+    for i in range(shape.subdirs):
+        os.makedirs(first / f"d{i}", exist_ok=True)
+    for i in range(shape.files):
+        open(first / f"f{i}", "wb").close()
+    for i in range(shape.links):
+        source = first / f"l{i - i % LINKS_PER_FILE}"
+        if i % LINKS_PER_FILE == 0:
+            source.write_bytes(b"\0" * LINK_SIZE)
+        else:
+            os.link(source, first / f"l{i}")
+
+    level = str(first)
+    for _ in range(shape.depth):
+        for i in range(shape.siblings):
+            os.makedirs(os.path.join(level, f"s{i}"), exist_ok=True)
+        level = os.path.join(level, "s0")
+
+    marker.touch()
+    return target
+
+
+def _maxrss() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT
+
+
+def _measure(tree: str, engine: str, memory_limit: int) -> tuple[int, float, int]:
+    """В отдельном процессе: (прирост пика RSS, секунды, папок)."""
+    from app.cache import ScanCache
+    from app.executors import create_executor
+    from app.scan_service import ScanService
+
+    cache_path = Path(tempfile.mkdtemp(prefix="fsv-memory-")) / "cache.sqlite"
+    service = ScanService(
+        ScanCache(cache_path), create_executor(engine, memory_limit=memory_limit)
+    )
+    folders = 0
+
+    def on_result(result) -> None:
+        nonlocal folders
+        folders += 1
+
+    before = _maxrss()
+    started = time.perf_counter()
+    service.scan(
+        Path(tree),
+        on_progress=lambda percent: None,
+        is_cancelled=lambda: False,
+        force_rescan=True,
+        on_result=on_result,
+        keep_results=False,
+    )
+    return _maxrss() - before, time.perf_counter() - started, folders
+
+
+def check_shape(
+    shape: PathologicalShape, workdir: Path, engines: list[str], memory_limit: int
+) -> list[str]:
+    tree = build_tree(workdir, shape)
+    budget = shape.budget()
+
+    failures = []
+    for engine in engines:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            growth, seconds, folders = pool.submit(
+                _measure, str(tree), engine, memory_limit
+            ).result()
+
+        print(
+            f"{shape.name:<12} {engine:<8} {growth / 2**20:7.1f} MB "
+            f"(budget {budget / 2**20:.1f} MB, {shape.dir_count} dirs, "
+            f"{shape.files + shape.links} files) {seconds:6.2f}s"
+        )
+        if folders != shape.top:
+            failures.append(f"{engine}: {folders} of {shape.top} folders scanned")
+        if growth > budget:
+            failures.append(
+                f"{engine}: {growth / 2**20:.1f} MB peak growth, budget {budget / 2**20:.1f} MB"
+            )
+    return failures
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.memory_budget")
+    parser.add_argument("--shapes", nargs="+", choices=sorted(SHAPES), default=sorted(SHAPES))
+    parser.add_argument("--engines", nargs="+", default=["serial", "thread", "asyncio"])
+    parser.add_argument("--memory-limit", type=int, default=DEFAULT_MEMORY_LIMIT >> 20, metavar="MB")
+    parser.add_argument("--workdir", type=Path, default=Path(tempfile.gettempdir()) / "fsv-bench-trees")
+    args = parser.parse_args(argv)
+
+    args.workdir.mkdir(parents=True, exist_ok=True)
+
+    failures = []
+    for name in args.shapes:
+        failures.extend(
+            f"{name}: {line}"
+            for line in check_shape(
+                SHAPES[name], args.workdir, args.engines, args.memory_limit << 20
+            )
+        )
+
+    for line in failures:
+        print(f"BUDGET EXCEEDED {line}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,372 @@
+# benchmarks/run.py
+"""
+Бенчмарки сканирования, кеша, снимков, наполнения таблицы и запуска окна.
+
+    python -m benchmarks.run [--shapes wide deep ...] [--engine thread]
+                             [--repeat 5] [--save-baseline] [--report FILE]
+
+Каждый случай запускается в отдельном процессе, чтобы пиковый RSS
+относился только к нему. Результаты сравниваются с сохранённым
+baseline.json; замедление больше --threshold даёт код возврата 1.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import importlib.util
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from benchmarks.synthetic import SHAPES, TreeShape, build_tree
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+# сколько строк кладём в модель таблицы в бенчмарке наполнения
+TABLE_ROWS = 50_000
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# дочерний процесс бенчмарка запуска: окно над деревом из argv[1],
+# печатает момент первой отрисовки и сразу выходит
+_STARTUP_SCRIPT = """
+import os, sys, time
+from pathlib import Path
+from PySide6.QtWidgets import QApplication
+from app.ui.main_window import MainWindow
+
+app = QApplication(sys.argv[:1])
+window = MainWindow([Path(sys.argv[1])], watch=False)
+
+def done():
+    print(time.time(), flush=True)
+    os._exit(0)
+
+window.first_painted.connect(done)
+window.show()
+app.exec()
+"""
+
+
+def _peak_rss_bytes(children: bool = False) -> int | None:
+    """Пиковый RSS процесса (children — самого большого из дочерних)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    pos = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[pos]
+
+
+def _measure(
+    repeat: int,
+    body: Callable[[], tuple[int, int]],
+    setup: Callable[[], None] | None = None,
+) -> dict:
+    """Гоняет body repeat раз; body возвращает (записей, байт) за прогон."""
+    samples: list[float] = []
+    entries = 0
+    size = 0
+
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+
+        started = time.perf_counter()
+        entries, size = body()
+        samples.append(time.perf_counter() - started)
+
+    median = statistics.median(samples)
+    return {
+        "p50": median,
+        "p90": _percentile(samples, 90),
+        "p99": _percentile(samples, 99),
+        "entries_per_s": entries / median if median else 0.0,
+        "bytes_per_s": size / median if median else 0.0,
+        "peak_rss": _peak_rss_bytes(),
+    }
+
+
+# ---------------------------------------------------------------------------
+# СЛУЧАИ
+# ---------------------------------------------------------------------------
+
+def _scan_case(tree: Path, shape: TreeShape, engine: str, repeat: int, warm: bool) -> dict:
+    from app.cache import ScanCache
+    from app.executors import create_executor
+    from app.scan_service import ScanService
+
+    cache_dir = tempfile.mkdtemp(prefix="fsv-bench-")
+    cache_path = Path(cache_dir) / "cache.sqlite"
+
+    def reset_cache() -> None:
+        if cache_path.exists():
+            cache_path.unlink()
+
+    def scan() -> tuple[int, int]:
+        service = ScanService(ScanCache(cache_path), create_executor(engine))
+        results = service.scan(
+            tree,
+            on_progress=lambda percent: None,
+            is_cancelled=lambda: False,
+            force_rescan=not warm,
+        )
+        return shape.entry_count, sum(r.size_bytes for r in results)
+
+    if warm:
+        reset_cache()
+        scan()
+        return _measure(repeat, scan)
+
+    return _measure(repeat, scan, setup=reset_cache)
+
+
+def _cache_case(tree: Path, shape: TreeShape, repeat: int) -> dict:
+    from app.cache import ScanCache
+    from app.scanner import scan_folder
+
+    cache_path = Path(tempfile.mkdtemp(prefix="fsv-bench-")) / "cache.sqlite"
+    cache = ScanCache(cache_path)
+
+    folders = [p for p in tree.iterdir() if p.is_dir()]
+    results = [scan_folder(p, build_tree=True) for p in folders]
+
+    def roundtrip() -> tuple[int, int]:
+        cache.save_many(results)
+        cache.get_many(folders)
+        cache.get_dir_index(folders)
+        return len(folders), 0
+
+    return _measure(repeat, roundtrip)
+
+
+def _snapshot_case(tree: Path, shape: TreeShape, repeat: int) -> dict:
+    from app.scanner import scan_folder
+    from app.snapshot import open_snapshot, write_snapshot
+
+    folders = [p for p in tree.iterdir() if p.is_dir()]
+    results = [scan_folder(p, build_tree=True) for p in folders]
+
+    path = Path(tempfile.mkdtemp(prefix="fsv-bench-")) / "snapshot.fsvs"
+    write_snapshot(path, tree, results)
+
+    def load() -> tuple[int, int]:
+        # то же, что делает окно при запуске: открыть и взять верхний уровень
+        snapshot = open_snapshot(path)
+        snapshot.results()
+        return len(snapshot.tree), path.stat().st_size
+
+    return _measure(repeat, load)
+
+
+def _table_case(repeat: int) -> dict:
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    from PySide6.QtGui import QIcon
+    from PySide6.QtWidgets import QApplication
+
+    from app.models import ScanResult
+    from app.ui.results_model import COLUMN_NAME, COLUMN_SIZE, ResultsTableModel
+
+    app = QApplication.instance() or QApplication([])
+
+    results = [
+        ScanResult(
+            path=Path(f"/bench/folder_{i}"),
+            size_bytes=(i * 7919) % 1_000_003,
+            file_count=i % 977,
+            error_count=0,
+        )
+        for i in range(TABLE_ROWS)
+    ]
+    model = ResultsTableModel(QIcon())
+
+    def populate() -> tuple[int, int]:
+        model.set_results(results)
+        model.sort(COLUMN_SIZE)
+        model.sort(COLUMN_NAME)
+        app.processEvents()
+        return TABLE_ROWS, 0
+
+    return _measure(repeat, populate)
+
+
+def _startup_case(tree: Path, shape: TreeShape, repeat: int) -> dict:
+    """
+    От запуска процесса до первой отрисовки окна с результатами из кеша
+    (импорты, QApplication, чтение кеша, первый кадр).
+    """
+    if importlib.util.find_spec("PySide6") is None:
+        raise ImportError("No module named 'PySide6'")
+
+    # кеш, правила и снимки окно ищет в текущем каталоге
+    workdir = tempfile.mkdtemp(prefix="fsv-bench-")
+    os.chdir(workdir)
+
+    from app.cache import DEFAULT_CACHE_PATH, ScanCache
+    from app.executors import create_executor
+    from app.scan_service import ScanService
+
+    ScanService(ScanCache(DEFAULT_CACHE_PATH), create_executor("thread")).scan(
+        tree,
+        on_progress=lambda percent: None,
+        is_cancelled=lambda: False,
+    )
+
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen", PYTHONPATH=str(REPO_ROOT))
+
+    def launch() -> float:
+        started = time.time()
+        output = subprocess.run(
+            [sys.executable, "-c", _STARTUP_SCRIPT, str(tree)],
+            cwd=workdir,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        return float(output.split()[-1]) - started
+
+    # не через _measure: тот засёк бы и выход процесса, а нужен
+    # только путь до первого кадра
+    samples = [launch() for _ in range(repeat)]
+    median = statistics.median(samples)
+    return {
+        "p50": median,
+        "p90": _percentile(samples, 90),
+        "p99": _percentile(samples, 99),
+        "entries_per_s": shape.entry_count / median if median else 0.0,
+        "bytes_per_s": 0.0,
+        "peak_rss": _peak_rss_bytes(children=True),
+    }
+
+
+def _run_case(name: str, args: dict) -> dict:
+    """Точка входа дочернего процесса."""
+    if name == "table_populate":
+        return _table_case(args["repeat"])
+
+    shape = SHAPES[args["shape"]]
+    tree = build_tree(Path(args["workdir"]), shape)
+
+    if name == "scan_cold":
+        return _scan_case(tree, shape, args["engine"], args["repeat"], warm=False)
+    if name == "scan_warm":
+        return _scan_case(tree, shape, args["engine"], args["repeat"], warm=True)
+    if name == "cache_roundtrip":
+        return _cache_case(tree, shape, args["repeat"])
+    if name == "snapshot_load":
+        return _snapshot_case(tree, shape, args["repeat"])
+    if name == "startup":
+        return _startup_case(tree, shape, args["repeat"])
+
+    raise ValueError(f"Unknown benchmark case: {name}")
+
+
+# ---------------------------------------------------------------------------
+# ЗАПУСК И СРАВНЕНИЕ
+# ---------------------------------------------------------------------------
+
+def _run_isolated(name: str, args: dict) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        return pool.apply(_run_case, (name, args))
+
+
+def _compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for key, current in report.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+
+        ratio = current["p50"] / previous["p50"] if previous["p50"] else 1.0
+        if ratio > 1 + threshold:
+            regressions.append(f"{key}: p50 {previous['p50']:.4f}s -> {current['p50']:.4f}s (x{ratio:.2f})")
+    return regressions
+
+
+def _format_row(key: str, stats: dict) -> str:
+    rss = stats["peak_rss"]
+    rss_text = f"{rss / (1 << 20):8.1f} MB" if rss is not None else "       n/a"
+    return (
+        f"{key:<32} p50 {stats['p50']:8.4f}s  p90 {stats['p90']:8.4f}s  "
+        f"p99 {stats['p99']:8.4f}s  {stats['entries_per_s']:12.0f} ent/s  "
+        f"{stats['bytes_per_s'] / (1 << 20):10.1f} MB/s  rss {rss_text}"
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run")
+    parser.add_argument("--shapes", nargs="+", choices=sorted(SHAPES), default=sorted(SHAPES))
+    parser.add_argument("--engine", default="thread")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workdir", type=Path, default=Path(tempfile.gettempdir()) / "fsv-bench-trees")
+    parser.add_argument("--no-table", action="store_true", help="skip the Qt table and startup benchmarks")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed p50 slowdown (0.10 = 10%%)")
+    parser.add_argument("--report", type=Path, default=None, help="write JSON report to file")
+    args = parser.parse_args(argv)
+
+    args.workdir.mkdir(parents=True, exist_ok=True)
+
+    cases: list[tuple[str, dict]] = []
+    for shape in args.shapes:
+        common = {
+            "shape": shape,
+            "engine": args.engine,
+            "repeat": args.repeat,
+            "workdir": str(args.workdir),
+        }
+        for name in ("scan_cold", "scan_warm", "cache_roundtrip", "snapshot_load"):
+            cases.append((name, common))
+        if not args.no_table:
+            cases.append(("startup", common))
+
+    if not args.no_table:
+        cases.append(("table_populate", {"repeat": args.repeat}))
+
+    report: dict[str, dict] = {}
+    for name, case_args in cases:
+        key = f"{name}[{case_args['shape']}]" if "shape" in case_args else name
+        try:
+            report[key] = _run_isolated(name, case_args)
+        except ImportError as e:
+            print(f"{key:<32} skipped ({e})")
+            continue
+        print(_format_row(key, report[key]))
+
+    if args.report is not None:
+        args.report.write_text(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        return 0
+
+    regressions = _compare(report, json.loads(args.baseline.read_text()), args.threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+# benchmarks/synthetic.py
+"""
+Генератор синтетических деревьев каталогов для бенчмарков.
+"""
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass(frozen=True)
+class TreeShape:
+    name: str
+    depth: int
+    fanout: int
+    files_per_dir: int
+    file_size: int
+    # sparse=True — файлы создаются через truncate и не занимают место
+    sparse: bool = False
+
+    @property
+    def dir_count(self) -> int:
+        return sum(self.fanout ** level for level in range(self.depth + 1))
+
+    @property
+    def file_count(self) -> int:
+        return self.dir_count * self.files_per_dir
+
+    @property
+    def entry_count(self) -> int:
+        return self.dir_count + self.file_count
+
+
+SHAPES: dict[str, TreeShape] = {
+    shape.name: shape
+    for shape in (
+        TreeShape("wide", depth=1, fanout=2000, files_per_dir=5, file_size=512),
+        TreeShape("deep", depth=200, fanout=1, files_per_dir=20, file_size=512),
+        TreeShape("tiny_files", depth=3, fanout=8, files_per_dir=200, file_size=16),
+        TreeShape("huge_files", depth=2, fanout=4, files_per_dir=2, file_size=256 << 20, sparse=True),
+        TreeShape("sparse", depth=3, fanout=6, files_per_dir=30, file_size=8 << 20, sparse=True),
+    )
+}
+
+
+def _write_files(directory: str, shape: TreeShape, payload: bytes) -> None:
+    for i in range(shape.files_per_dir):
+        file_path = os.path.join(directory, f"f{i}.bin")
+        with open(file_path, "wb") as f:
+            if shape.sparse:
+                f.truncate(shape.file_size)
+            else:
+                f.write(payload)
+
+
+def build_tree(root: Path, shape: TreeShape) -> Path:
+    """
+    Строит дерево формы shape в root/<shape.name> и возвращает путь к нему.
+    Уже построенное дерево переиспользуется (маркер <shape.name>.complete
+    рядом с деревом, чтобы не попадать в сканирование).
+    """
+    target = root / shape.name
+    marker = root / f"{shape.name}.complete"
+    if marker.exists():
+        return target
+
+    payload = b"\0" * shape.file_size if not shape.sparse else b""
+
+    level = [str(target)]
+    os.makedirs(target, exist_ok=True)
+    _write_files(str(target), shape, payload)
+
+    for _ in range(shape.depth):
+        next_level = []
+        for parent in level:
+            for i in range(shape.fanout):
+                child = os.path.join(parent, f"d{i}")
+                os.makedirs(child, exist_ok=True)
+                _write_files(child, shape, payload)
+                next_level.append(child)
+        level = next_level
+
+    marker.touch()
+    return target
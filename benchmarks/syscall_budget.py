@@ -0,0 +1,89 @@
+# benchmarks/syscall_budget.py
+"""
+Проверка бюджета системных вызовов на запись дерева.
+
+    python -m benchmarks.syscall_budget [--shapes wide tiny_files ...]
+
+Бюджет полного сканирования: один scandir на каталог, один lstat на
+файл и один stat на каталог (mtime для индекса каталогов; проверки
+symlink/junction идут по d_type без вызовов). Повторное
+(инкрементальное) сканирование неизменного дерева: один stat на
+каталог и ни одного scandir.
+Счётчики берутся из ScanMetrics; при превышении — код возврата 1.
+"""
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+from app.cache import ScanCache
+from app.core.metrics import ScanMetrics
+from app.executors import create_executor
+from app.scan_service import ScanService
+from benchmarks.synthetic import SHAPES, TreeShape, build_tree
+
+
+def _scan(tree: Path, cache_path: Path, engine: str, force: bool) -> ScanMetrics:
+    metrics = ScanMetrics()
+    service = ScanService(ScanCache(cache_path), create_executor(engine))
+    service.scan(
+        tree,
+        on_progress=lambda percent: None,
+        is_cancelled=lambda: False,
+        force_rescan=force,
+        metrics=metrics,
+    )
+    return metrics
+
+
+def check_shape(shape: TreeShape, workdir: Path, engine: str) -> list[str]:
+    tree = build_tree(workdir, shape)
+    cache_path = Path(tempfile.mkdtemp(prefix="fsv-syscalls-")) / "cache.sqlite"
+
+    # корень дерева читает ScanService, а не сканер
+    dirs = shape.dir_count - 1
+    files = shape.file_count - shape.files_per_dir
+
+    failures = []
+
+    cold = _scan(tree, cache_path, engine, force=True)
+    if cold.scandir_calls > dirs:
+        failures.append(f"cold scan: {cold.scandir_calls} scandir for {dirs} dirs")
+    if cold.stat_calls > files + dirs:
+        failures.append(f"cold scan: {cold.stat_calls} stat for {files} files + {dirs} dirs")
+
+    warm = _scan(tree, cache_path, engine, force=False)
+    if warm.scandir_calls > 0:
+        failures.append(f"warm scan: {warm.scandir_calls} scandir on unchanged tree")
+    if warm.stat_calls > dirs:
+        failures.append(f"warm scan: {warm.stat_calls} stat for {dirs} dirs")
+
+    print(
+        f"{shape.name:<12} cold: {cold.scandir_calls} scandir / {cold.stat_calls} stat, "
+        f"warm: {warm.scandir_calls} scandir / {warm.stat_calls} stat "
+        f"({dirs} dirs, {files} files)"
+    )
+    return failures
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.syscall_budget")
+    parser.add_argument("--shapes", nargs="+", choices=sorted(SHAPES), default=["wide", "deep", "tiny_files"])
+    parser.add_argument("--engine", default="thread")
+    parser.add_argument("--workdir", type=Path, default=Path(tempfile.gettempdir()) / "fsv-bench-trees")
+    args = parser.parse_args(argv)
+
+    args.workdir.mkdir(parents=True, exist_ok=True)
+
+    failures = []
+    for name in args.shapes:
+        failures.extend(f"{name}: {line}" for line in check_shape(SHAPES[name], args.workdir, args.engine))
+
+    for line in failures:
+        print(f"BUDGET EXCEEDED {line}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,52 @@
-# main.py
+import argparse
 import sys
 from pathlib import Path
 
-from PySide6.QtWidgets import QApplication
 
-from app.ui.main_window import MainWindow
+def _parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="folder_size_viewer",
+        usage="folder_size_viewer <path> [<path> ...] [--all-mounts] [--per-device N] [--watch]\n"
+        "       folder_size_viewer --cli <path> [options]",
+    )
+    parser.add_argument("paths", type=Path, nargs="*", metavar="path")
+    parser.add_argument("--all-mounts", action="store_true", help="scan all mounted filesystems")
+    parser.add_argument("--per-device", type=int, default=None, help="max concurrent scan tasks per disk")
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep watching the tree after the scan and update sizes live",
+    )
+
+    args = parser.parse_args(argv)
+    if not args.paths and not args.all_mounts:
+        parser.print_usage()
+        sys.exit(1)
+    return args
 
 
 def main() -> None:
+    # консольный режим не импортирует Qt вообще
+    if len(sys.argv) > 1 and sys.argv[1] == "--cli":
+        from app.cli import main as cli_main
+
+        sys.exit(cli_main(sys.argv[2:]))
+
+    args = _parse_args(sys.argv[1:])
+
+    from PySide6.QtWidgets import QApplication
+
+    from app.ui.main_window import MainWindow
+
     app = QApplication(sys.argv)
 
-    if len(sys.argv) < 2:
-        print("Usage: folder_size_viewer <path>")
-        sys.exit(1)
+    roots = list(args.paths)
+    if args.all_mounts:
+        from app.mounts import list_mounts
 
-    root_path = Path(sys.argv[1])
-    
+        roots.extend(list_mounts())
 
-    window = MainWindow(root_path)
+    window = MainWindow(roots, watch=args.watch, per_device=args.per_device)
     window.show()
 
     sys.exit(app.exec())
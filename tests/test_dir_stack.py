@@ -0,0 +1,97 @@
+# tests/test_dir_stack.py
+"""Стек обхода DirStack: порядок LIFO, сброс на диск и обход с ним."""
+import os
+import pickle
+from pathlib import Path
+
+import pytest
+
+from app.models import ScanOptions
+from app.scanner import scan_chunk
+from app.utils.dir_stack import BLOCK_NAMES, DirStack
+from benchmarks.synthetic import TreeShape, build_tree
+
+# несколько блоков, чтобы сброс задел и неполные, и полные блоки
+NAMES = [f"dir{i:05d}" for i in range(BLOCK_NAMES * 3 + 17)]
+
+
+def _filled(limit: int) -> tuple[DirStack, list[str]]:
+    """Стек и list с теми же каталогами, положенными так же."""
+    stack = DirStack(["/root"], limit)
+    expected = ["/root"]
+    for parent in ("/a", "/b/c", "/d"):
+        stack.push(parent, NAMES)
+        expected.extend(os.path.join(parent, name) for name in NAMES)
+    return stack, expected
+
+
+@pytest.mark.parametrize("limit", [0, 4096])
+def test_lifo_order(limit: int) -> None:
+    stack, expected = _filled(limit)
+
+    assert len(stack) == len(expected)
+    assert bool(stack.spilled) == bool(limit)
+
+    popped = []
+    while stack:
+        popped.append(stack.pop())
+    assert popped == expected[::-1]
+    assert stack.spilled == 0
+
+    with pytest.raises(IndexError):
+        stack.pop()
+
+
+def test_spill_interleaved_with_push() -> None:
+    stack = DirStack(limit=2048)
+    expected: list[str] = []
+    for round_ in range(5):
+        names = NAMES[: BLOCK_NAMES + round_ * 100]
+        stack.push(f"/r{round_}", names)
+        expected.extend(f"/r{round_}/{name}" for name in names)
+        # снимаем часть — до сброшенных блоков дойдёт не сразу
+        taken = stack.take(300)
+        assert taken == expected[-300:][::-1]
+        del expected[-300:]
+
+    assert stack.spilled
+    assert len(stack) == len(expected)
+    assert sorted(stack) == sorted(expected)
+
+    stack.discard(10)
+    del expected[-10:]
+    assert stack.take(len(stack)) == expected[::-1]
+
+
+def test_pickle_keeps_spilled_blocks() -> None:
+    stack, expected = _filled(4096)
+    assert stack.spilled
+
+    copy = pickle.loads(pickle.dumps(stack))
+
+    assert len(copy) == len(expected)
+    assert copy.take(len(copy)) == expected[::-1]
+    # исходный стек не тронут
+    assert stack.take(len(stack)) == expected[::-1]
+
+
+def test_merge_moves_everything_on_top() -> None:
+    stack, expected = _filled(4096)
+    other, other_expected = _filled(4096)
+
+    stack.merge(other)
+
+    assert len(other) == 0
+    assert stack.take(len(stack)) == (expected + other_expected)[::-1]
+
+
+def test_scan_with_spilling_stack(tmp_path: Path) -> None:
+    shape = TreeShape("stack", depth=3, fanout=6, files_per_dir=2, file_size=10)
+    tree = str(build_tree(tmp_path, shape))
+
+    full = scan_chunk([tree])
+    spilled = scan_chunk([tree], options=ScanOptions(stack_limit=512))
+
+    assert (spilled.size_bytes, spilled.file_count) == (full.size_bytes, full.file_count)
+    assert sorted(spilled.dirs) == sorted(full.dirs)
+    assert len(spilled.dirs) == shape.dir_count
@@ -0,0 +1,41 @@
+# tests/test_inode_set.py
+"""Множество inode InodeSet: рост таблицы и предел max_entries."""
+from app.utils.inode_set import InodeSet, inode_key
+
+
+def test_grows_and_keeps_keys() -> None:
+    keys = [inode_key(dev, ino) for dev in (1, 2) for ino in range(1, 5001)]
+    inodes = InodeSet(capacity=4)
+    start = len(inodes._table)
+
+    assert all(inodes.add(key) for key in keys)
+    assert len(inodes) == len(keys)
+    # таблица удваивалась и заполнена не больше чем наполовину
+    assert len(inodes._table) > start
+    assert len(inodes) <= len(inodes._table) // 2
+
+    assert not any(inodes.add(key) for key in keys)
+    assert len(inodes) == len(keys)
+    assert inodes.overflow == 0
+
+
+def test_same_inode_on_other_device_is_new() -> None:
+    inodes = InodeSet()
+
+    assert inodes.add(inode_key(1, 42))
+    assert inodes.add(inode_key(2, 42))
+    assert not inodes.add(inode_key(1, 42))
+
+
+def test_max_entries_stops_growth() -> None:
+    inodes = InodeSet(capacity=4, max_entries=100)
+
+    assert all(inodes.add(inode_key(1, ino)) for ino in range(1, 201))
+    size = len(inodes._table)
+
+    assert len(inodes) == 100
+    assert inodes.overflow == 100
+    # запомненные по-прежнему узнаются, новые считаются новыми
+    assert not inodes.add(inode_key(1, 1))
+    assert inodes.add(inode_key(1, 500))
+    assert len(inodes._table) == size
@@ -0,0 +1,77 @@
+# tests/test_memory.py
+"""
+Пик памяти (tracemalloc) на патологических деревьях — уменьшенные
+формы из benchmarks/memory_budget.py — и итоги по жёстким ссылкам.
+"""
+from pathlib import Path
+import tracemalloc
+
+import pytest
+
+from app.cache import ScanCache
+from app.executors import create_executor
+from app.scan_service import ScanService
+from benchmarks.memory_budget import LINK_SIZE, LINKS_PER_FILE, PathologicalShape, build_tree
+
+ENGINES = ["serial", "thread"]
+
+# tracemalloc видит только объекты Python, поэтому постоянная часть
+# бюджета меньше, чем у бенчмарка с RSS
+SHAPES = [
+    PathologicalShape("wide_dir", subdirs=20_000, fixed_mb=2),
+    PathologicalShape("deep_bushy", depth=200, siblings=20, fixed_mb=2),
+    PathologicalShape("hardlinks", links=20_000, fixed_mb=2),
+]
+
+
+@pytest.fixture(scope="module")
+def workdir(tmp_path_factory) -> Path:
+    return tmp_path_factory.mktemp("trees")
+
+
+def _scan(tree: Path, cache_path: Path, engine: str) -> tuple[list, int]:
+    """Сканирует tree без накопления результатов: (результаты, пик в байтах)."""
+    service = ScanService(ScanCache(cache_path), create_executor(engine))
+    results = []
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        service.scan(
+            tree,
+            on_progress=lambda percent: None,
+            is_cancelled=lambda: False,
+            force_rescan=True,
+            on_result=results.append,
+            keep_results=False,
+        )
+        peak = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return results, peak
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("shape", SHAPES, ids=lambda shape: shape.name)
+def test_peak_memory(workdir: Path, tmp_path: Path, shape: PathologicalShape, engine: str) -> None:
+    tree = build_tree(workdir, shape)
+
+    results, peak = _scan(tree, tmp_path / "cache.sqlite", engine)
+
+    assert len(results) == shape.top
+    assert peak <= shape.budget(), (
+        f"{peak / 2**20:.1f} MB peak, budget {shape.budget() / 2**20:.1f} MB"
+    )
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_hardlinks_counted_once(workdir: Path, tmp_path: Path, engine: str) -> None:
+    shape = SHAPES[-1]
+    tree = build_tree(workdir, shape)
+
+    results, _ = _scan(tree, tmp_path / "cache.sqlite", engine)
+
+    inodes = shape.links // LINKS_PER_FILE
+    assert sum(r.file_count for r in results) == inodes
+    assert sum(r.size_bytes for r in results) == inodes * LINK_SIZE
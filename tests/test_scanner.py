@@ -0,0 +1,155 @@
+# tests/test_scanner.py
+"""
+Бюджет системных вызовов и итоги сканирования на сгенерированном
+дереве, для каждого движка (см. benchmarks/syscall_budget.py), и учёт
+жёстких ссылок: при сканировании по данным наблюдателя и одинаково
+у всех движков.
+"""
+import os
+from pathlib import Path
+
+import pytest
+
+from app.cache import ScanCache
+from app.core.metrics import ScanMetrics
+from app.executors import create_executor
+from app.scan_service import ScanService
+from benchmarks.synthetic import TreeShape, build_tree
+
+ENGINES = ["serial", "thread", "process", "asyncio"]
+
+SHAPE = TreeShape("budget", depth=3, fanout=4, files_per_dir=5, file_size=100)
+
+
+def _scan(tree: Path, cache_path: Path, engine: str, force: bool):
+    metrics = ScanMetrics()
+    service = ScanService(ScanCache(cache_path), create_executor(engine))
+    results = service.scan(
+        tree,
+        on_progress=lambda percent: None,
+        is_cancelled=lambda: False,
+        force_rescan=force,
+        metrics=metrics,
+    )
+    return results, metrics
+
+
+@pytest.fixture(scope="module")
+def tree(tmp_path_factory) -> Path:
+    return build_tree(tmp_path_factory.mktemp("trees"), SHAPE)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_syscall_budget(tree: Path, tmp_path: Path, engine: str) -> None:
+    # корень дерева читает ScanService, а не сканер
+    dirs = SHAPE.dir_count - 1
+    files = SHAPE.file_count - SHAPE.files_per_dir
+    cache_path = tmp_path / "cache.sqlite"
+
+    results, cold = _scan(tree, cache_path, engine, force=True)
+    assert len(results) == SHAPE.fanout
+    assert sum(r.file_count for r in results) == files
+    assert sum(r.size_bytes for r in results) == files * SHAPE.file_size
+    assert sum(r.error_count for r in results) == 0
+    assert sum(len(r.tree) for r in results) == dirs
+
+    # один scandir на каталог, один lstat на файл и один stat на каталог
+    assert cold.scandir_calls <= dirs
+    assert cold.stat_calls <= files + dirs
+
+    results, warm = _scan(tree, cache_path, engine, force=False)
+    assert sum(r.file_count for r in results) == files
+    assert sum(r.size_bytes for r in results) == files * SHAPE.file_size
+
+    if engine == "process":
+        # пул процессов индекс каталогов в задачи не передаёт (дороже,
+        # чем перечитать) — повторный обход у него полный
+        assert warm.scandir_calls <= dirs
+        assert warm.stat_calls <= files + dirs
+    else:
+        # повторно неизменное дерево: только stat каталогов, без scandir
+        assert warm.scandir_calls == 0
+        assert warm.stat_calls <= dirs
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_hardlinks_after_dirty_rescan(tmp_path: Path, engine: str) -> None:
+    tree = tmp_path / "tree"
+    first, second = tree / "top" / "a", tree / "top" / "b"
+    first.mkdir(parents=True)
+    second.mkdir()
+    (first / "x").write_bytes(b"\0" * 100)
+    os.link(first / "x", second / "y")
+    cache = ScanCache(tmp_path / "cache.sqlite")
+
+    def scan(dirty: set[str] | None) -> tuple[int, int]:
+        service = ScanService(cache, create_executor(engine))
+        (result,) = service.scan(
+            tree,
+            on_progress=lambda percent: None,
+            is_cancelled=lambda: False,
+            force_rescan=dirty is None,
+            dirty=dirty,
+        )
+        return result.file_count, result.size_bytes
+
+    assert scan(None) == (1, 100)
+
+    # b из индекса: inode, учтённый в a, не должен посчитаться дважды
+    (first / "new").write_bytes(b"\0" * 50)
+    assert scan({str(first)}) == (2, 150)
+
+    # а без a — должен посчитаться в b
+    (first / "x").unlink()
+    assert scan({str(first)}) == (2, 150)
+
+
+def _linked_tree(root: Path) -> Path:
+    """
+    Папки верхнего уровня, файлы которых связаны жёсткими ссылками
+    с подкаталогами других папок: владелец inode зависит от порядка.
+    """
+    tree = root / "linked"
+    folders = [tree / f"top{i}" for i in range(6)]
+    for folder in folders:
+        for j in range(3):
+            (folder / f"d{j}").mkdir(parents=True)
+    for i, folder in enumerate(folders):
+        for k in range(4):
+            original = folder / f"d{k % 3}" / f"f{k}"
+            original.write_bytes(b"\0" * (100 * (i + 1) + k))
+            for shift in (1, 3):
+                other = folders[(i + shift) % len(folders)]
+                os.link(original, other / f"d{(k + shift) % 3}" / f"l{i}-{k}")
+    return tree
+
+
+def _node_sizes(tree: Path, cache_path: Path, engine: str) -> dict[str, tuple[int, int]]:
+    """Размер и число файлов каждого каталога."""
+    service = ScanService(ScanCache(cache_path), create_executor(engine))
+    results = service.scan(
+        tree,
+        on_progress=lambda percent: None,
+        is_cancelled=lambda: False,
+        force_rescan=True,
+    )
+    sizes = {}
+    for result in results:
+        dirs = result.tree
+        for node in range(len(dirs)):
+            sizes[str(dirs.path(node))] = (dirs.size[node], dirs.files[node])
+    return sizes
+
+
+@pytest.mark.parametrize("engine", ENGINES[1:])
+def test_hardlink_owner_same_for_all_engines(tmp_path: Path, engine: str) -> None:
+    tree = _linked_tree(tmp_path)
+
+    expected = _node_sizes(tree, tmp_path / "serial.sqlite", "serial")
+    # каждый inode посчитан один раз
+    top = [sizes for path, sizes in expected.items() if Path(path).parent == tree]
+    assert sum(files for _, files in top) == 6 * 4
+
+    # порядок обхода у пулов от запуска к запуску разный
+    for run in range(3):
+        assert _node_sizes(tree, tmp_path / f"{engine}{run}.sqlite", engine) == expected